@@ -0,0 +1,118 @@
+import asyncio
+from typing import AsyncIterator, Callable, Dict, Optional, Tuple
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from core.metrics import metrics
+from core.rate_limit import RateLimiter
+from core.request_context import request_tenant, request_usage
+
+# A handler turns a request payload into a stream of events for the client
+Handler = Callable[[Dict], AsyncIterator[Dict]]
+
+class IDEChannel:
+    """Multiplexes IDE requests over one WebSocket.
+
+    Client messages are ``{"id", "type", "document"?, "payload"}`` or
+    ``{"id", "type": "cancel"}``. Every event sent back carries the request id
+    and each request ends with exactly one ``done``, ``error`` or ``cancelled``
+    event. A new request for the same type and document supersedes the one in
+    flight: its task is cancelled, which aborts the outstanding LLM call.
+    Each request is admitted and charged against the connection's rate-limit
+    tenant like a separate HTTP request.
+    """
+
+    def __init__(self, websocket: WebSocket, handlers: Dict[str, Handler], rate_limiter: Optional[RateLimiter] = None):
+        self.websocket = websocket
+        self.handlers = handlers
+        self.rate_limiter = rate_limiter
+        self.tenant = request_tenant.get()
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.documents: Dict[Tuple[str, str], str] = {}
+        self._send_lock = asyncio.Lock()
+
+    async def run(self):
+        await self.websocket.accept()
+        try:
+            while True:
+                message = await self.websocket.receive_json()
+                await self._dispatch(message)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            # Nobody is left to read the results
+            for request_id in list(self.tasks):
+                self._cancel(request_id, notify=False)
+            await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+
+    async def _dispatch(self, message: Dict):
+        request_id = str(message.get("id", ""))
+        request_type = message.get("type")
+        if request_type == "cancel":
+            self._cancel(request_id)
+            return
+
+        handler = self.handlers.get(request_type)
+        if not request_id or handler is None or request_id in self.tasks:
+            await self._send(request_id, {"event": "error", "detail": f"Invalid request type {request_type!r} or id {request_id!r}"})
+            return
+
+        if self.rate_limiter is not None and self.tenant is not None:
+            decision = await self.rate_limiter.admit(self.tenant)
+            if not decision.allowed:
+                await self._send(request_id, {
+                    "event": "error",
+                    "detail": f"Rate limit exceeded ({decision.reason})",
+                    "retry_after": decision.retry_after
+                })
+                return
+
+        document = message.get("document")
+        if document:
+            previous = self.documents.get((request_type, document))
+            if previous is not None and self._cancel(previous, reason="superseded"):
+                metrics.increment("ide_requests_superseded", labels={"type": request_type})
+            self.documents[(request_type, document)] = request_id
+
+        task = asyncio.create_task(self._execute(request_id, handler, message.get("payload") or {}))
+        self.tasks[request_id] = task
+        task.add_done_callback(lambda _: self._forget(request_id, request_type, document))
+
+    async def _execute(self, request_id: str, handler: Handler, payload: Dict):
+        # Tasks run in a copy of the context, so this usage counter is per request
+        usage = {"llm_tokens": 0}
+        request_usage.set(usage)
+        try:
+            async for event in handler(payload):
+                await self._send(request_id, event)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await self._send(request_id, {"event": "error", "detail": str(e)})
+        else:
+            await self._send(request_id, {"event": "done"})
+        finally:
+            if self.rate_limiter is not None and self.tenant is not None:
+                await self.rate_limiter.charge(self.tenant, usage["llm_tokens"])
+
+    def _cancel(self, request_id: str, reason: str = "cancelled", notify: bool = True) -> bool:
+        task = self.tasks.get(request_id)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        if notify:
+            asyncio.create_task(self._send(request_id, {"event": "cancelled", "reason": reason}))
+        return True
+
+    def _forget(self, request_id: str, request_type: str, document: Optional[str]):
+        self.tasks.pop(request_id, None)
+        if document and self.documents.get((request_type, document)) == request_id:
+            del self.documents[(request_type, document)]
+
+    async def _send(self, request_id: str, event: Dict):
+        async with self._send_lock:
+            try:
+                await self.websocket.send_json({"id": request_id, **event})
+            except (WebSocketDisconnect, RuntimeError):
+                # The socket closed while the request was finishing
+                pass
@@ -1,22 +1,108 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime
+from functools import lru_cache
+from typing import List, Optional
+from fastapi import Depends, FastAPI, File, Form, HTTPException, Request, UploadFile, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
+from sqlalchemy.exc import SQLAlchemyError
 import uvicorn
 
+from app.ide_channel import IDEChannel
+from core.cancellation import CancellationMiddleware
+from core.concurrency import DeadlineExceededError, OverloadedError
+from core.config import settings
+from core.history import HistoryQueryError, HistoryStore, get_history_recorder
+from core.metrics import metrics
+from core.profiling import ProfilingMiddleware, get_profiler, is_admin
+from core.rate_limit import RateLimitMiddleware, get_rate_limiter, tenant_from_headers
+from core.serialization import content_etag, dumps, json_response, not_modified
+from core.usage_stats import UsageStatsMiddleware, UsageStatsReader, get_usage_recorder
+from services.archive_review import ArchiveError, ArchiveReviewService, get_content_hash_store, open_archive
+from services.batch_jobs import BATCH_KINDS, BatchJobService, create_batch_backend, get_batch_job_store
+from services.code_reviewer import CodeReviewerService, issues_to_columns
+from services.documentation import DocumentationService
+from services.result_cache import get_result_cache
+from services.test_generator import TestGeneratorService
+from core.request_context import RequestPriorityMiddleware, annotate_request, is_anonymous
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Write buffered quota usage before the worker exits
+    recorder = get_rate_limiter().recorder
+    if recorder is not None:
+        await recorder.flush()
+    await get_usage_recorder().flush()
+    await get_history_recorder().flush()
+
 app = FastAPI(
     title="AI Code Platform API",
     description="AI-powered code generation, testing, and review platform",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Innermost, so the 504 it sends still passes through CORS
+app.add_middleware(CancellationMiddleware)
+
+# Times each request until its last byte is sent (after any 504 from cancellation)
+app.add_middleware(UsageStatsMiddleware)
+
+# Outside cancellation so rejected requests never start an endpoint task
+app.add_middleware(RateLimitMiddleware)
+
+# Wraps rate limiting and cancellation so a profile covers the whole request
+app.add_middleware(ProfilingMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000", "http://127.0.0.1:3000", "http://localhost:3001", "*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets the web UI read the ETag it sends back in If-None-Match
+    expose_headers=["ETag"],
 )
 
+# Outermost, so every layer below sees the request's priority
+app.add_middleware(RequestPriorityMiddleware)
+
+@app.exception_handler(OverloadedError)
+async def overloaded_handler(request: Request, exc: OverloadedError):
+    """Shed load with 503 + Retry-After instead of surfacing provider errors"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"AI provider capacity exhausted, retry in {exc.retry_after}s"},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+@app.exception_handler(DeadlineExceededError)
+async def deadline_handler(request: Request, exc: DeadlineExceededError):
+    """The request ran out of time before its LLM calls could finish"""
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
+@lru_cache
+def get_code_reviewer() -> CodeReviewerService:
+    return CodeReviewerService(result_cache=get_result_cache())
+
+@lru_cache
+def get_archive_reviewer() -> ArchiveReviewService:
+    return ArchiveReviewService(get_code_reviewer(), get_content_hash_store())
+
+@lru_cache
+def get_documentation_service() -> DocumentationService:
+    return DocumentationService()
+
+@lru_cache
+def get_batch_jobs() -> BatchJobService:
+    reviewer = get_code_reviewer()
+    return BatchJobService(
+        reviewer, TestGeneratorService(), create_batch_backend(reviewer.openai_client), get_batch_job_store()
+    )
+
 class CodeGenerationRequest(BaseModel):
     description: str
     language: str
@@ -30,6 +116,27 @@ class TestGenerationRequest(BaseModel):
 class CodeReviewRequest(BaseModel):
     code: str
     language: str
+    issue_format: str = "rows"  # "rows" or "columnar"
+
+def _check_code_size(code: str):
+    """Files over MAX_CODE_SIZE are reviewed in windows; only reject what even that cannot handle"""
+    if len(code) > settings.LARGE_FILE_MAX_SIZE:
+        raise HTTPException(status_code=413, detail=f"Code exceeds the {settings.LARGE_FILE_MAX_SIZE} character limit")
+
+class BatchFile(BaseModel):
+    path: str
+    code: str
+    language: str
+
+class BatchJobRequest(BaseModel):
+    kind: str  # "review" or "tests"
+    files: List[BatchFile]
+
+class DocumentationRequest(BaseModel):
+    code: str
+    language: str
+    doc_type: str = "api"
+    path: str = ""
 
 @app.get("/")
 async def root():
@@ -39,9 +146,82 @@ async def root():
 async def health_check():
     return {"status": "healthy", "services": ["code_generator", "test_generator", "code_reviewer"]}
 
+@app.get("/api/v1/metrics")
+async def get_metrics():
+    """Expose in-process counters such as cache hit rates"""
+    return metrics.snapshot()
+
+def require_admin(request: Request):
+    if not is_admin(request.headers.get("authorization", "")):
+        raise HTTPException(status_code=403, detail="Admin API key required")
+
+@app.get("/api/v1/admin/profiles", dependencies=[Depends(require_admin)])
+async def list_profiles():
+    """Most recent request profiles, newest first"""
+    return {"profiles": [trace.summary() for trace in reversed(get_profiler().traces)]}
+
+@app.get("/api/v1/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def download_profile(profile_id: str, format: str = "speedscope"):
+    """Download a profile as speedscope JSON or collapsed stacks (for flamegraph.pl)"""
+    trace = get_profiler().get(profile_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Profile not found (it may have been evicted)")
+    if format == "collapsed":
+        return Response(content=trace.collapsed(), media_type="text/plain",
+                        headers={"Content-Disposition": f'attachment; filename="profile-{trace.id}.folded"'})
+    if format == "speedscope":
+        return Response(content=dumps(trace.speedscope()), media_type="application/json",
+                        headers={"Content-Disposition": f'attachment; filename="profile-{trace.id}.speedscope.json"'})
+    raise HTTPException(status_code=422, detail="format must be 'speedscope' or 'collapsed'")
+
+@lru_cache
+def get_usage_stats_reader() -> UsageStatsReader:
+    return UsageStatsReader()
+
+@app.get("/api/v1/stats")
+async def get_stats(hours: int = 24, reader: UsageStatsReader = Depends(get_usage_stats_reader)):
+    """Request counts, quality, latency percentiles and cache hit rates per endpoint and language, from the hourly rollups"""
+    if not 1 <= hours <= settings.STATS_MAX_HOURS:
+        raise HTTPException(status_code=422, detail=f"hours must be between 1 and {settings.STATS_MAX_HOURS}")
+    try:
+        return await asyncio.to_thread(reader.summary, hours)
+    except SQLAlchemyError:
+        raise HTTPException(status_code=503, detail="Usage statistics are unavailable")
+
+@lru_cache
+def get_history_store() -> HistoryStore:
+    return HistoryStore()
+
+@app.get("/api/v1/history/{kind}")
+async def get_history(
+    kind: str,
+    http_request: Request,
+    language: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    q: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = settings.HISTORY_PAGE_SIZE,
+    store: HistoryStore = Depends(get_history_store)
+):
+    """The caller's past generations, tests or reviews, newest first; pass next_cursor back for the next page"""
+    client = http_request.client
+    tenant = tenant_from_headers(dict(http_request.headers), client.host if client else None)
+    if is_anonymous(tenant):
+        raise HTTPException(status_code=401, detail="History requires an API key", headers={"WWW-Authenticate": "Bearer"})
+    if not 1 <= limit <= settings.HISTORY_MAX_PAGE_SIZE:
+        raise HTTPException(status_code=422, detail=f"limit must be between 1 and {settings.HISTORY_MAX_PAGE_SIZE}")
+    try:
+        return await asyncio.to_thread(store.page, kind, tenant, language, since, until, q, cursor, limit)
+    except HistoryQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SQLAlchemyError:
+        raise HTTPException(status_code=503, detail="History is unavailable")
+
 @app.post("/api/v1/generate-code")
 async def generate_code(request: CodeGenerationRequest):
     """Generate code from natural language description"""
+    annotate_request(language=request.language)
     # Demo response for hackathon
     demo_code = f"""# Generated {request.language} code for: {request.description}
 
@@ -59,6 +239,9 @@ if __name__ == "__main__":
     result = example_function()
     print(result)
 """
+    get_history_recorder().record(
+        "generations", description=request.description, language=request.language, generated_code=demo_code, confidence=0.95
+    )
     
     return {
         "success": True,
@@ -69,8 +252,16 @@ if __name__ == "__main__":
     }
 
 @app.post("/api/v1/generate-tests")
-async def generate_tests(request: TestGenerationRequest):
-    """Generate test cases for given code"""
+async def generate_tests(request: TestGenerationRequest, http_request: Request):
+    """Generate test cases for given code; a repeat request sending the ETag in If-None-Match gets 304"""
+    etag = content_etag("tests", request.code, request.language, request.test_type)
+    unchanged = not_modified(http_request, etag)
+    if unchanged is not None:
+        return unchanged
+    return json_response(await _generate_tests(request), http_request, headers={"ETag": etag})
+
+async def _generate_tests(request: TestGenerationRequest) -> dict:
+    annotate_request(language=request.language)
     demo_tests = f"""# Generated {request.test_type} tests for {request.language} code
 
 import unittest
@@ -97,6 +288,9 @@ class TestGeneratedCode(unittest.TestCase):
 if __name__ == '__main__':
     unittest.main()
 """
+    get_history_recorder().record(
+        "tests", source_code=request.code, language=request.language, test_code=demo_tests, coverage_estimate=0.85
+    )
     
     return {
         "success": True,
@@ -112,37 +306,154 @@ if __name__ == '__main__':
     }
 
 @app.post("/api/v1/review-code")
-async def review_code(request: CodeReviewRequest):
-    """Review code quality and provide suggestions"""
+async def review_code(request: CodeReviewRequest, http_request: Request, reviewer: CodeReviewerService = Depends(get_code_reviewer)):
+    """Review code quality and provide suggestions; a repeat request sending the ETag in If-None-Match gets 304"""
+    if request.issue_format not in ("rows", "columnar"):
+        raise HTTPException(status_code=422, detail="issue_format must be 'rows' or 'columnar'")
+    _check_code_size(request.code)
+    # Derived from the request, so a repeat is answered before any analysis runs. Only sent
+    # with complete results, or a client would keep a failed AI review through 304s.
+    etag = content_etag("review", request.code, request.language, request.issue_format)
+    unchanged = not_modified(http_request, etag)
+    if unchanged is not None:
+        return unchanged
+    
+    result = await reviewer.review_code(request.code, request.language)
+    annotate_request(language=request.language, quality_score=result.quality_score)
+    get_history_recorder().record(
+        "reviews", source_code=request.code, language=request.language,
+        quality_score=result.quality_score, issues_found=len(result.issues)
+    )
+    
+    # Encoded with orjson straight from the slotted dataclasses; columnar suits very large issue lists
+    return json_response({
+        "success": True,
+        "issue_format": request.issue_format,
+        "issues": issues_to_columns(result.issues) if request.issue_format == "columnar" else result.issues,
+        "suggestions": result.suggestions,
+        "quality_score": result.quality_score,
+        "security_analysis": result.security_analysis,
+        "performance_analysis": result.performance_analysis,
+        "maintainability_score": result.maintainability_score,
+        "windows": result.windows
+    }, http_request, headers=None if result.partial else {"ETag": etag})
+
+@app.post("/api/v1/review-code/stream")
+async def review_code_stream(request: CodeReviewRequest, reviewer: CodeReviewerService = Depends(get_code_reviewer)):
+    """Stream review results as NDJSON: static findings, then AI findings, then totals"""
+    _check_code_size(request.code)
+    
+    annotate_request(language=request.language)
+    
+    async def events():
+        async for event in reviewer.stream_review(request.code, request.language):
+            if event["event"] == "complete":
+                annotate_request(quality_score=event["quality_score"])
+                get_history_recorder().record(
+                    "reviews", source_code=request.code, language=request.language,
+                    quality_score=event["quality_score"], issues_found=event["issue_count"]
+                )
+            yield dumps(event) + b"\n"
+    
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@app.post("/api/v1/review-archive")
+async def review_archive(
+    archive: UploadFile = File(...),
+    project: str = Form(...),
+    ai_review: bool = Form(False),
+    reviewer: ArchiveReviewService = Depends(get_archive_reviewer)
+):
+    """Review a repository uploaded as a tar or zip, streaming NDJSON results for files changed since the last upload"""
+    # The upload is spooled to a temporary file while the form is parsed; members are read from it one at a time
+    try:
+        members = await asyncio.to_thread(open_archive, archive.file, settings.LARGE_FILE_MAX_SIZE)
+    except ArchiveError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    async def events():
+        async for event in reviewer.review_archive(members, project, ai_review):
+            yield dumps(event) + b"\n"
+    
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@app.post("/api/v1/generate-docs")
+async def generate_docs(request: DocumentationRequest, docs: DocumentationService = Depends(get_documentation_service)):
+    """Generate documentation per symbol, reusing cached docs for unchanged symbols"""
+    _check_code_size(request.code)
+    result = await docs.generate_documentation(request.code, request.language, request.doc_type, request.path)
+    annotate_request(language=request.language, cached=result.generated == 0 and result.cached > 0)
+    
     return {
         "success": True,
-        "issues": [
-            {
-                "line_number": 1,
-                "severity": "medium",
-                "category": "style",
-                "title": "Missing Type Hints",
-                "description": "Consider adding type hints for better code documentation",
-                "suggestion": "Add type annotations to function parameters and return values"
-            }
-        ],
-        "suggestions": [
-            "Add comprehensive docstrings",
-            "Include error handling",
-            "Consider using type hints",
-            "Add logging for debugging"
-        ],
-        "quality_score": 8.5,
-        "security_analysis": {
-            "total_security_issues": 0,
-            "security_score": 10
-        },
-        "performance_analysis": {
-            "performance_score": 9.0,
-            "optimization_opportunities": 1
-        },
-        "maintainability_score": 8.0
+        "documentation": result.documentation,
+        "doc_type": request.doc_type,
+        "symbols": result.symbols,
+        "generated": result.generated,
+        "cached": result.cached
     }
 
+@app.post("/api/v1/batch/jobs", status_code=202)
+async def submit_batch_job(request: BatchJobRequest, jobs: BatchJobService = Depends(get_batch_jobs)):
+    """Queue reviews or unit test generation for many files on the provider batch API (results within 24 hours)"""
+    if request.kind not in BATCH_KINDS:
+        raise HTTPException(status_code=422, detail=f"kind must be one of {', '.join(BATCH_KINDS)}")
+    if not 1 <= len(request.files) <= settings.BATCH_MAX_FILES:
+        raise HTTPException(status_code=422, detail=f"files must contain between 1 and {settings.BATCH_MAX_FILES} entries")
+    for file in request.files:
+        _check_code_size(file.code)
+    
+    return await jobs.submit(request.kind, [file.model_dump() for file in request.files])
+
+@app.get("/api/v1/batch/jobs/{job_id}")
+async def get_batch_job(job_id: str, jobs: BatchJobService = Depends(get_batch_jobs)):
+    """Job progress, polling the provider for batches that have not finished"""
+    job = await jobs.refresh(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Batch job not found (it may have expired)")
+    return job
+
+@app.get("/api/v1/batch/jobs/{job_id}/results")
+async def get_batch_job_results(job_id: str, jobs: BatchJobService = Depends(get_batch_jobs)):
+    """Stream a finished job's per-file results as NDJSON, then totals"""
+    summary = await jobs.refresh(job_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Batch job not found (it may have expired)")
+    if summary["status"] != "completed":
+        raise HTTPException(status_code=409, detail="Batch job has not finished")
+    job = await jobs.jobs.load(job_id)
+    
+    async def events():
+        async for event in jobs.results(job):
+            yield dumps(event) + b"\n"
+    
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+def _single_result(endpoint, request_model, *dependencies):
+    """Adapt a JSON endpoint into a channel handler that emits one result event"""
+    async def handler(payload: dict):
+        yield {"event": "result", **(await endpoint(request_model(**payload), *dependencies))}
+    return handler
+
+@app.websocket("/api/v1/ws")
+async def ide_channel(
+    websocket: WebSocket,
+    reviewer: CodeReviewerService = Depends(get_code_reviewer),
+    docs: DocumentationService = Depends(get_documentation_service)
+):
+    """One multiplexed connection per IDE session; newer requests for a document supersede older ones"""
+    async def review(payload: dict):
+        request = CodeReviewRequest(**payload)
+        _check_code_size(request.code)
+        async for event in reviewer.stream_review(request.code, request.language):
+            yield event
+    
+    await IDEChannel(websocket, {
+        "review": review,
+        "generate_code": _single_result(generate_code, CodeGenerationRequest),
+        "generate_tests": _single_result(_generate_tests, TestGenerationRequest),
+        "generate_docs": _single_result(generate_docs, DocumentationRequest, docs)
+    }, rate_limiter=get_rate_limiter() if settings.RATE_LIMIT_ENABLED else None).run()
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,67 @@
+import asyncio
+import logging
+from typing import Dict, Optional
+
+from core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+class BulkRecorder:
+    """Buffer records in memory and write them to the database in bulk.
+
+    Subclasses add to ``pending`` in their own ``record()`` and then call
+    ``_schedule()``; a background task hands the whole buffer to ``_write``
+    in a worker thread every flush_interval seconds. A batch that fails to
+    write is merged back by ``_requeue`` and retried on the next flush.
+    Outcomes are counted as ``<metric_prefix>_rows_written`` and
+    ``<metric_prefix>_flush_errors``.
+    """
+
+    metric_prefix = ""
+
+    def __init__(self, engine=None, flush_interval: float = 2.0, max_pending: int = 10000):
+        self._engine = engine
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.pending: Dict = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            from core.database import engine
+            self._engine = engine
+        return self._engine
+
+    async def flush(self):
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, {}
+        try:
+            await asyncio.to_thread(self._write, batch)
+        except Exception as e:
+            # Put the batch back so the next flush retries it
+            logger.warning("%s flush failed: %s", type(self).__name__, e)
+            metrics.increment(f"{self.metric_prefix}_flush_errors")
+            self._requeue(batch)
+            return
+        metrics.increment(f"{self.metric_prefix}_rows_written", self._rows(batch))
+
+    def _schedule(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while self.pending:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def _rows(self, batch: Dict) -> int:
+        return len(batch)
+
+    def _write(self, batch: Dict):
+        raise NotImplementedError
+
+    def _requeue(self, batch: Dict):
+        raise NotImplementedError
@@ -0,0 +1,70 @@
+import asyncio
+import json
+import time
+from typing import Dict, Optional
+
+from core.config import settings
+from core.metrics import metrics
+from core.request_context import request_deadline
+
+class CancellationMiddleware:
+    """Cancel a request's task tree when the client disconnects or its deadline passes.
+
+    The endpoint runs in its own task while the middleware watches the ASGI
+    receive channel for ``http.disconnect``. Cancellation unwinds every awaited
+    LLM call, releasing limiter slots and closing provider HTTP streams. The
+    deadline is also published through ``request_deadline`` so LLM calls and
+    limiter queues never wait past it. Timed-out requests get a 504.
+    """
+
+    def __init__(self, app, deadlines: Optional[Dict[str, float]] = None, default_deadline: Optional[float] = None):
+        self.app = app
+        self.deadlines = settings.REQUEST_DEADLINES if deadlines is None else deadlines
+        self.default_deadline = settings.REQUEST_DEADLINE_DEFAULT if default_deadline is None else default_deadline
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        timeout = self.deadlines.get(path, self.default_deadline) or None
+        token = request_deadline.set(time.monotonic() + timeout if timeout else None)
+        state = {"started": False, "complete": False}
+        messages = asyncio.Queue()
+
+        async def tracked_send(message):
+            if message["type"] == "http.response.start":
+                state["started"] = True
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                state["complete"] = True
+            await send(message)
+
+        async def watch_disconnect():
+            # Forward request messages to the endpoint and return once the client goes away
+            while True:
+                message = await receive()
+                await messages.put(message)
+                if message["type"] == "http.disconnect":
+                    return
+
+        endpoint = asyncio.create_task(self.app(scope, messages.get, tracked_send))
+        watcher = asyncio.create_task(watch_disconnect())
+        try:
+            done, _ = await asyncio.wait({endpoint, watcher}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if endpoint in done or (watcher in done and state["complete"]):
+                await endpoint
+                return
+
+            reason = "disconnect" if watcher in done else "deadline"
+            endpoint.cancel()
+            await asyncio.gather(endpoint, return_exceptions=True)
+            metrics.increment("requests_cancelled", labels={"path": path, "reason": reason})
+
+            if reason == "deadline" and not state["started"]:
+                body = json.dumps({"detail": f"Request exceeded its {timeout:g}s deadline"}).encode()
+                await send({"type": "http.response.start", "status": 504, "headers": [(b"content-type", b"application/json")]})
+                await send({"type": "http.response.body", "body": body})
+        finally:
+            watcher.cancel()
+            request_deadline.reset(token)
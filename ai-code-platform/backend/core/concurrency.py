@@ -0,0 +1,190 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from core.config import settings
+from core.request_context import RequestPriority, request_priority, time_remaining
+
+class OverloadedError(Exception):
+    """Raised when a limiter sheds a request instead of queueing it"""
+
+    def __init__(self, name: str, retry_after: int):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f"{name} is overloaded, retry after {retry_after}s")
+
+class DeadlineExceededError(Exception):
+    """Raised when the request's deadline passes before an LLM call can finish"""
+
+    def __init__(self, message: str = "Request deadline exceeded"):
+        super().__init__(message)
+
+def is_overload_error(error: Exception) -> bool:
+    """Rate-limit responses and timeouts signal that the provider is saturated"""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+        return True
+    if getattr(error, "status_code", None) == 429:
+        return True
+    return "Timeout" in type(error).__name__ or "RateLimit" in type(error).__name__
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit with a bounded, priority-ordered wait queue.
+
+    The limit grows by roughly one slot per limit's worth of successes and is
+    cut multiplicatively on 429s and timeouts. Interactive requests are served
+    before batch ones and may displace queued batch work when the queue is full.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: Optional[int] = None,
+        min_limit: Optional[int] = None,
+        max_limit: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        queue_timeout: Optional[float] = None,
+        backoff: float = 0.5
+    ):
+        self.name = name
+        self.min_limit = min_limit or settings.LLM_CONCURRENCY_MIN
+        self.max_limit = max_limit or settings.LLM_CONCURRENCY_MAX
+        self.limit = float(initial_limit or settings.LLM_CONCURRENCY_INITIAL)
+        self.max_queue = max_queue if max_queue is not None else settings.LLM_QUEUE_SIZE
+        self.queue_timeout = queue_timeout or settings.LLM_QUEUE_TIMEOUT
+        self.backoff = backoff
+        self.in_flight = 0
+        self.avg_latency = 1.0
+        self.shed_count = 0
+        self._waiters = []
+        self._queued = 0
+        self._sequence = itertools.count()
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    def retry_after(self) -> int:
+        """Estimate how long until a queued request would be admitted"""
+        backlog = self._queued + self.in_flight
+        return max(1, math.ceil(backlog / max(self.limit, 1.0) * self.avg_latency))
+
+    async def acquire(self, priority: Optional[RequestPriority] = None):
+        """Wait for a slot, or raise OverloadedError when the queue is full"""
+        priority = request_priority.get() if priority is None else priority
+        remaining = time_remaining()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceededError()
+
+        if self._queued == 0 and self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return
+
+        if self._queued >= self.max_queue and not self._displace(priority):
+            self.shed_count += 1
+            raise OverloadedError(self.name, self.retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._sequence), future))
+        self._queued += 1
+
+        # Never queue past the request's own deadline
+        timeout = self.queue_timeout if remaining is None else min(self.queue_timeout, remaining)
+        try:
+            done, _ = await asyncio.wait({future}, timeout=timeout)
+        except asyncio.CancelledError:
+            self._abandon(future)
+            raise
+
+        if not done:
+            self._abandon(future)
+            if timeout < self.queue_timeout:
+                raise DeadlineExceededError()
+            self.shed_count += 1
+            raise OverloadedError(self.name, self.retry_after())
+        # Propagates the OverloadedError set on displaced waiters
+        future.result()
+
+    def release(self, latency: Optional[float] = None, overloaded: bool = False, succeeded: bool = False):
+        """Return a slot and adjust the limit from the call's outcome"""
+        self.in_flight -= 1
+
+        if overloaded:
+            self.limit = max(float(self.min_limit), self.limit * self.backoff)
+        elif succeeded:
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+        if latency is not None:
+            self.avg_latency = 0.8 * self.avg_latency + 0.2 * latency
+
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self, priority: Optional[RequestPriority] = None):
+        """Hold a slot for the duration of one outbound call"""
+        await self.acquire(priority)
+        started = time.monotonic()
+        try:
+            yield
+        except (asyncio.CancelledError, GeneratorExit):
+            self.release()
+            raise
+        except Exception as e:
+            self.release(time.monotonic() - started, overloaded=is_overload_error(e))
+            raise
+        else:
+            self.release(time.monotonic() - started, succeeded=True)
+
+    def _wake(self):
+        """Hand free slots to the highest-priority waiters"""
+        while self._waiters and self.in_flight < int(self.limit):
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self._queued -= 1
+            self.in_flight += 1
+            future.set_result(None)
+
+    def _abandon(self, future: asyncio.Future):
+        """Drop a waiter that timed out or was cancelled"""
+        if future.done() and not future.cancelled() and future.exception() is None:
+            # A slot was granted just before we gave up on it
+            self.release()
+            return
+        if not future.done():
+            future.cancel()
+            self._queued -= 1
+
+    def _displace(self, priority: RequestPriority) -> bool:
+        """Shed the newest lower-priority waiter to make room, if any"""
+        victim = None
+        for entry in self._waiters:
+            if entry[2].done() or entry[0] <= int(priority):
+                continue
+            if victim is None or entry[:2] > victim[:2]:
+                victim = entry
+        if victim is None:
+            return False
+
+        victim[2].set_exception(OverloadedError(self.name, self.retry_after()))
+        self._queued -= 1
+        self.shed_count += 1
+        return True
+
+    def snapshot(self) -> Dict:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queued": self._queued,
+            "shed": self.shed_count
+        }
+
+_limiters: Dict[str, AdaptiveLimiter] = {}
+
+def get_limiter(name: str) -> AdaptiveLimiter:
+    """Return the process-wide limiter for a provider"""
+    if name not in _limiters:
+        _limiters[name] = AdaptiveLimiter(name)
+    return _limiters[name]
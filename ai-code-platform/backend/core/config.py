@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List
 import os
 
 class Settings(BaseSettings):
@@ -19,10 +19,121 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: str = ""
     ANTHROPIC_API_KEY: str = ""
     
+    # Provider Routing
+    PROVIDER_STATS_WINDOW: int = 100
+    PROVIDER_MIN_SAMPLES: int = 5
+    PROVIDER_MAX_ERROR_RATE: float = 0.5
+    PROVIDER_UNHEALTHY_COOLDOWN: float = 30.0  # seconds
+    PROVIDER_HEDGE_PERCENTILE: float = 0.95
+    PROVIDER_HEDGE_DELAY: float = 2.0  # seconds, used until enough samples exist
+    
+    # Model Tiering (tiers are tried in order; the first whose limits the input fits is used, the last takes the rest)
+    MODEL_TIERING_ENABLED: bool = True
+    MODEL_TIERS: List[Dict] = [
+        {
+            "name": "fast",
+            "models": {"openai": "gpt-3.5-turbo", "anthropic": "claude-3-haiku-20240307"},
+            "max_tokens": 2500,
+            "max_lines": 150,
+            "max_functions": 8,
+            "max_complex_functions": 0,
+            "max_findings": 0,
+            "cost_per_1k_prompt": 0.0005,
+            "cost_per_1k_completion": 0.0015
+        },
+        {
+            "name": "standard",
+            "models": {"openai": "gpt-4-turbo-preview", "anthropic": "claude-3-sonnet-20240229"},
+            "max_tokens": 4000,
+            "cost_per_1k_prompt": 0.01,
+            "cost_per_1k_completion": 0.03
+        }
+    ]
+    # Expected output per task: base + per_function * functions + per_100_lines * lines / 100, capped by the tier
+    MODEL_OUTPUT_BUDGETS: Dict[str, Dict[str, int]] = {
+        "unit_tests": {"base": 400, "per_function": 250},
+        "integration_tests": {"base": 600, "per_function": 150},
+        "review": {"base": 300, "per_function": 40, "per_100_lines": 150}
+    }
+    
+    # Outbound LLM Concurrency
+    LLM_CONCURRENCY_INITIAL: int = 8
+    LLM_CONCURRENCY_MIN: int = 1
+    LLM_CONCURRENCY_MAX: int = 64
+    LLM_QUEUE_SIZE: int = 100
+    LLM_QUEUE_TIMEOUT: float = 30.0  # seconds
+    
+    # Per-Tenant Rate Limiting (tenants are identified by their Bearer API key)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "redis"  # "redis" (shared, falls back to local on errors) or "local"
+    RATE_LIMIT_REQUESTS_PER_MINUTE: float = 120.0
+    RATE_LIMIT_REQUEST_BURST: float = 60.0
+    RATE_LIMIT_TOKENS_PER_MINUTE: float = 100000.0
+    RATE_LIMIT_TOKEN_BURST: float = 200000.0
+    RATE_LIMIT_EXEMPT_PATHS: List[str] = ["/", "/api/v1/health", "/api/v1/metrics"]
+    QUOTA_RECORDING_ENABLED: bool = True
+    QUOTA_FLUSH_INTERVAL: float = 10.0  # seconds between bulk writes of quota usage
+    
+    # Request Deadlines (seconds, per endpoint path; 0 = no deadline)
+    REQUEST_DEADLINES: Dict[str, float] = {
+        "/api/v1/generate-code": 60.0,
+        "/api/v1/generate-tests": 120.0,
+        "/api/v1/review-code": 60.0,
+        "/api/v1/generate-docs": 120.0
+    }
+    REQUEST_DEADLINE_DEFAULT: float = 0.0
+    
+    # Admin API keys (Bearer tokens) allowed to use the admin endpoints and profiling header
+    ADMIN_API_KEYS: List[str] = []
+    
+    # Request Profiling (stack sampling of individual requests, downloadable from /api/v1/admin/profiles)
+    PROFILING_ENABLED: bool = True
+    PROFILING_SAMPLE_RATE: int = 0  # profile 1 in N requests to PROFILING_PATHS; 0 = only on admin request
+    PROFILING_PATHS: List[str] = ["/api/v1/review-code", "/api/v1/review-code/stream", "/api/v1/generate-docs"]
+    PROFILING_INTERVAL: float = 0.005  # seconds between stack samples
+    PROFILING_MAX_STACK_DEPTH: int = 64
+    PROFILING_MAX_SAMPLES: int = 20000  # per trace; later samples are dropped
+    PROFILING_MAX_ACTIVE: int = 2  # concurrent profiled requests; others run unprofiled
+    PROFILING_BUFFER_SIZE: int = 32  # most recent traces kept
+    
+    # Usage Statistics (hourly rollups per endpoint and language, served by /api/v1/stats)
+    STATS_ENABLED: bool = True
+    STATS_PATHS: List[str] = [
+        "/api/v1/generate-code", "/api/v1/generate-tests", "/api/v1/review-code",
+        "/api/v1/review-code/stream", "/api/v1/generate-docs"
+    ]
+    STATS_FLUSH_INTERVAL: float = 10.0  # seconds between bulk upserts of the rollups
+    STATS_MAX_HOURS: int = 24 * 90
+    
+    # Request History (per-tenant generations, tests and reviews, served by /api/v1/history)
+    HISTORY_ENABLED: bool = True
+    HISTORY_FLUSH_INTERVAL: float = 2.0  # seconds between bulk inserts of history rows
+    HISTORY_PAGE_SIZE: int = 20
+    HISTORY_MAX_PAGE_SIZE: int = 100
+    
     # Vector Database
     PINECONE_API_KEY: str = ""
     PINECONE_ENVIRONMENT: str = "us-west1-gcp"
     
+    # Semantic Cache
+    SEMANTIC_CACHE_ENABLED: bool = True
+    SEMANTIC_CACHE_EMBEDDER: str = "hashing"  # "hashing" (offline) or "openai"
+    SEMANTIC_CACHE_DIM: int = 512
+    SEMANTIC_CACHE_THRESHOLD: float = 0.9
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 10000
+    SEMANTIC_CACHE_PATH: str = ""  # file prefix for on-disk persistence; empty keeps it in memory
+    SEMANTIC_CACHE_SAVE_INTERVAL: int = 50  # stores between saves
+    
+    # Code Retrieval Index
+    CODE_INDEX_DIR: str = ""  # per-project memory-mapped indexes; empty keeps them in memory
+    CODE_INDEX_EMBED_BATCH: int = 256
+    CODE_INDEX_MAX_CHUNK_LINES: int = 120
+    CODE_INDEX_TOP_K: int = 5
+    
+    # Responses
+    RESPONSE_COMPRESSION_MIN_BYTES: int = 1024
+    RESULT_VERSION: str = "1"  # part of every result ETag and result cache key; bump when analyzers or prompts change results
+    
     # CORS
     ALLOWED_ORIGINS: List[str] = [
         "http://localhost:3000",
@@ -31,20 +142,62 @@ class Settings(BaseSettings):
     ]
     
     # Code Analysis
-    MAX_CODE_SIZE: int = 100000  # 100KB
+    MAX_CODE_SIZE: int = 100000  # 100KB; larger files are reviewed in windows
+    LARGE_FILE_MAX_SIZE: int = 10000000  # 10MB; larger files are rejected
+    LARGE_FILE_WINDOW_BYTES: int = 32000  # target window size, cut on top-level definitions
+    LARGE_FILE_MAX_AI_WINDOWS: int = 5  # windows with the most security/complexity findings get an AI review
     SUPPORTED_LANGUAGES: List[str] = [
         "python", "javascript", "typescript", "java", 
         "cpp", "go", "rust", "csharp", "php"
     ]
     
+    # Archive Review (repositories uploaded as one tar or zip)
+    ARCHIVE_MAX_FILES: int = 50000
+    ARCHIVE_HASH_BATCH: int = 500  # reviewed files between saves of their content hashes
+    
+    # Batch Jobs (offline reviews and test generation through the provider batch API, results within 24h)
+    BATCH_BACKEND: str = "openai"  # "openai" or "local" (in-process stand-in for development and tests)
+    BATCH_LOCAL_DELAY: float = 0.0  # seconds before a local batch completes
+    BATCH_MAX_FILES: int = 10000
+    BATCH_MAX_REQUESTS: int = 50000  # per provider batch; larger jobs are split over several
+    BATCH_MAX_BYTES: int = 100 * 1024 * 1024  # serialized JSONL per provider batch (OpenAI accepts up to 200 MB)
+    BATCH_JOB_TTL: int = 7 * 24 * 3600  # seconds job state is kept in Redis
+    
     # Testing
     DEFAULT_COVERAGE_TARGET: float = 0.8
     MAX_TEST_GENERATION_TIME: int = 300  # 5 minutes
+    TEST_SANDBOX_ENABLED: bool = True
+    TEST_SANDBOX_WORKERS: int = 0  # 0 = one per CPU core
+    TEST_SANDBOX_MEMORY_MB: int = 512
+    TEST_SANDBOX_CPU_SECONDS: float = 10.0
+    TEST_SANDBOX_TIMEOUT: float = 30.0
+    TEST_SANDBOX_USER: str = "nobody"  # workers started as root run tests as this user
+    TEST_SANDBOX_MAX_OPEN_FILES: int = 64
+    TEST_SANDBOX_MAX_PROCESSES: int = 0  # processes tests may start (not enforced while running as root)
+    TEST_SANDBOX_ENV: List[str] = ["PATH", "LANG", "LC_ALL", "TZ"]  # the only variables tests can see
+    
+    # Documentation
+    DOC_CACHE_MAX_ENTRIES: int = 5000
+    DOC_SYMBOL_MAX_TOKENS: int = 800
+    DOCS_MAX_CONCURRENCY: int = 8  # symbols of one request documented at once; keep well below LLM_QUEUE_SIZE
+    
+    # Shared Result Cache (review results, shared by all workers on a host, backed by Redis)
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_PATH: str = ""  # memory-mapped table; empty uses /dev/shm
+    RESULT_CACHE_SETS: int = 1024
+    RESULT_CACHE_WAYS: int = 8
+    RESULT_CACHE_SLOT_BYTES: int = 8192  # larger results are only kept in Redis
+    RESULT_CACHE_TTL: float = 3600.0  # seconds
     
     # Code Review
     QUALITY_THRESHOLD: float = 7.0
     SECURITY_SCAN_ENABLED: bool = True
     
+    # Review Triage (skip the AI review for trivially clean code, and reuse it for code changed only in comments or formatting)
+    TRIAGE_ENABLED: bool = True
+    TRIAGE_CLEAN_MAX_LINES: int = 15  # non-blank lines
+    TRIAGE_CLEAN_MAX_SEVERITY: str = "low"  # static findings at or below this severity still count as clean
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
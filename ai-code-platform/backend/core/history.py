@@ -0,0 +1,172 @@
+import base64
+import json
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from core.bulk_recorder import BulkRecorder
+from core.config import settings
+from core.metrics import metrics
+from core.request_context import is_anonymous, request_tenant
+
+class HistoryQueryError(ValueError):
+    """A history query that cannot be served (unknown kind, bad cursor, unsupported search)"""
+
+@dataclass(frozen=True)
+class HistoryTable:
+    name: str
+    columns: Tuple[str, ...]  # written and returned, besides id, tenant_id and created_at
+    searchable: bool = False  # full-text search over description
+
+HISTORY_TABLES: Dict[str, HistoryTable] = {
+    "generations": HistoryTable("code_generations", ("language", "description", "generated_code", "confidence"), searchable=True),
+    "tests": HistoryTable("test_generations", ("language", "source_code", "test_code", "coverage_estimate")),
+    "reviews": HistoryTable("code_reviews", ("language", "source_code", "quality_score", "issues_found"))
+}
+
+def _table(kind: str) -> HistoryTable:
+    table = HISTORY_TABLES.get(kind)
+    if table is None:
+        raise HistoryQueryError(f"Unknown history kind '{kind}'")
+    return table
+
+def _utc_naive(value: datetime) -> datetime:
+    """created_at is a plain TIMESTAMP holding UTC"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    payload = json.dumps([_utc_naive(created_at).isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError):
+        raise HistoryQueryError("Invalid cursor")
+
+class HistoryRecorder(BulkRecorder):
+    """Buffer history rows and insert them in bulk.
+
+    Rows are tagged with the request's tenant and the time they were
+    recorded, then inserted per table in one executemany every
+    flush_interval seconds. Requests without a tenant (rate limiting
+    disabled) are not recorded, since history is only readable per tenant.
+    """
+
+    metric_prefix = "history"
+
+    def __init__(self, engine=None, flush_interval: Optional[float] = None, max_pending: int = 10000):
+        super().__init__(engine, flush_interval if flush_interval is not None else settings.HISTORY_FLUSH_INTERVAL, max_pending)
+        self.pending: Dict[str, List[Dict]] = {}
+
+    def record(self, kind: str, **fields):
+        tenant = request_tenant.get()
+        # Anonymous callers behind the same address would see each other's rows
+        if not settings.HISTORY_ENABLED or is_anonymous(tenant):
+            return
+        if self._rows(self.pending) >= self.max_pending:
+            metrics.increment("history_rows_dropped")
+            return
+        table = _table(kind)
+        row = {column: fields.get(column) for column in table.columns}
+        row.update(tenant_id=tenant, created_at=datetime.now(timezone.utc).replace(tzinfo=None))
+        self.pending.setdefault(kind, []).append(row)
+        self._schedule()
+
+    def _rows(self, batch: Dict[str, List[Dict]]) -> int:
+        return sum(len(rows) for rows in batch.values())
+
+    def _requeue(self, batch: Dict[str, List[Dict]]):
+        # Ahead of rows recorded since, keeping insertion order
+        for kind, rows in batch.items():
+            self.pending.setdefault(kind, [])[:0] = rows
+
+    def _write(self, batch: Dict[str, List[Dict]]):
+        from sqlalchemy import text
+
+        with self.engine.begin() as connection:
+            for kind, rows in batch.items():
+                table = HISTORY_TABLES[kind]
+                columns = ("tenant_id", "created_at") + table.columns
+                statement = f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({', '.join(':' + c for c in columns)})"
+                connection.execute(text(statement), rows)
+
+class HistoryStore:
+    """Page through a tenant's history, newest first.
+
+    Pages are cut with a keyset on ``(created_at, id)`` rather than OFFSET,
+    so every page is one range scan of the ``(tenant_id, [language,]
+    created_at, id)`` indexes from database/migrations, however deep the
+    client has paged. Search uses the GIN index on
+    ``to_tsvector('english', description)`` on PostgreSQL and falls back to
+    LIKE elsewhere.
+    """
+
+    def __init__(self, engine=None):
+        self._engine = engine
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            from core.database import engine
+            self._engine = engine
+        return self._engine
+
+    def page(self, kind: str, tenant: str, language: Optional[str] = None, since: Optional[datetime] = None,
+             until: Optional[datetime] = None, query: Optional[str] = None, cursor: Optional[str] = None,
+             limit: Optional[int] = None) -> Dict:
+        from sqlalchemy import DateTime, text
+
+        table = _table(kind)
+        limit = limit or settings.HISTORY_PAGE_SIZE
+        conditions = ["tenant_id = :tenant"]
+        params: Dict = {"tenant": tenant, "limit": limit + 1}
+        if language:
+            conditions.append("language = :language")
+            params["language"] = language
+        if since is not None:
+            conditions.append("created_at >= :since")
+            params["since"] = _utc_naive(since)
+        if until is not None:
+            conditions.append("created_at < :until")
+            params["until"] = _utc_naive(until)
+        if query:
+            if not table.searchable:
+                raise HistoryQueryError(f"Search is not supported for '{kind}'")
+            if self.engine.dialect.name == "postgresql":
+                # Same expression as the GIN index, so the planner can use it
+                conditions.append("to_tsvector('english', description) @@ websearch_to_tsquery('english', :query)")
+                params["query"] = query
+            else:
+                conditions.append("description LIKE :query")
+                params["query"] = f"%{query}%"
+        if cursor:
+            params["cursor_created_at"], params["cursor_id"] = decode_cursor(cursor)
+            conditions.append("(created_at, id) < (:cursor_created_at, :cursor_id)")
+
+        statement = text(
+            f"SELECT id, created_at, {', '.join(table.columns)} FROM {table.name} "
+            f"WHERE {' AND '.join(conditions)} ORDER BY created_at DESC, id DESC LIMIT :limit"
+        ).columns(created_at=DateTime)
+        with self.engine.connect() as connection:
+            rows = [dict(row._mapping) for row in connection.execute(statement, params)]
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+        for row in rows:
+            row["created_at"] = row["created_at"].replace(tzinfo=timezone.utc).isoformat()
+        return {"items": rows, "next_cursor": next_cursor}
+
+_recorder: Optional[HistoryRecorder] = None
+
+def get_history_recorder() -> HistoryRecorder:
+    """Return the process-wide history recorder"""
+    global _recorder
+    if _recorder is None:
+        _recorder = HistoryRecorder()
+    return _recorder
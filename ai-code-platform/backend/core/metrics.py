@@ -0,0 +1,32 @@
+from collections import defaultdict
+from typing import Callable, Dict, Optional
+
+class MetricsRegistry:
+    """In-process counters plus pluggable snapshot collectors"""
+
+    def __init__(self):
+        self._counters = defaultdict(float)
+        self._collectors: Dict[str, Callable[[], Dict]] = {}
+
+    def increment(self, name: str, value: float = 1.0, labels: Optional[Dict[str, str]] = None):
+        self._counters[self._key(name, labels)] += value
+
+    def counter(self, name: str, labels: Optional[Dict[str, str]] = None) -> float:
+        return self._counters.get(self._key(name, labels), 0.0)
+
+    def register_collector(self, name: str, collector: Callable[[], Dict]):
+        """Register a callable whose dict output is included in snapshots"""
+        self._collectors[name] = collector
+
+    def snapshot(self) -> Dict:
+        return {
+            "counters": dict(self._counters),
+            **{name: collector() for name, collector in self._collectors.items()}
+        }
+
+    def _key(self, name: str, labels: Optional[Dict[str, str]]) -> str:
+        if not labels:
+            return name
+        return name + "{" + ",".join(f"{k}={v}" for k, v in sorted(labels.items())) + "}"
+
+metrics = MetricsRegistry()
@@ -0,0 +1,257 @@
+import asyncio
+import hmac
+import itertools
+import os
+import random
+import signal
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from core.config import settings
+from core.metrics import metrics
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+# Frame label: (function, file, first line)
+Frame = Tuple[str, str, int]
+
+class ProfileTrace:
+    """Stack samples of one request, aggregated by identical stack"""
+
+    def __init__(self, trace_id: str, method: str, path: str, trigger: str, interval: float):
+        self.id = trace_id
+        self.method = method
+        self.path = path
+        self.trigger = trigger
+        self.interval = interval
+        self.started_at = time.time()
+        self.duration = 0.0
+        self.samples = 0
+        self.truncated = False
+        self.active = True
+        self.stacks: Counter = Counter()  # root-first tuple of Frames -> samples
+
+    def summary(self) -> Dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "trigger": self.trigger,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 1),
+            "samples": self.samples,
+            "truncated": self.truncated,
+            "active": self.active
+        }
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's collapsed-stack format, as read by flamegraph.pl and most flamegraph viewers"""
+        lines = []
+        for stack, count in self.stacks.copy().most_common():
+            lines.append(";".join(f"{name} ({os.path.basename(path)}:{line})" for name, path, line in stack) + f" {count}")
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self) -> Dict:
+        """speedscope.app file with one sampled profile"""
+        frames: Dict[Frame, int] = {}
+        samples = []
+        weights = []
+        for stack, count in self.stacks.copy().items():
+            samples.append([frames.setdefault(frame, len(frames)) for frame in stack])
+            weights.append(count * self.interval)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"{self.method} {self.path} ({self.id})",
+            "exporter": "ai-code-platform",
+            "shared": {"frames": [{"name": name, "file": path, "line": line} for name, path, line in frames]},
+            "profiles": [{
+                "type": "sampled",
+                "name": f"{self.method} {self.path}",
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights
+            }]
+        }
+
+# The trace of the request whose context this is; tasks created under it are sampled into it
+current_profile: ContextVar[Optional[ProfileTrace]] = ContextVar("current_profile", default=None)
+
+class SamplingProfiler:
+    """Statistical CPU profiler for individual requests.
+
+    While any trace is active, a SIGPROF interval timer fires every
+    ``interval`` seconds of process CPU time. The handler runs on the main
+    thread, where the event loop runs; it looks up the task the loop is
+    running and, if that task belongs to a profiled request, records the
+    interrupted stack. Tasks are tied to a request by a task factory that
+    checks ``current_profile`` when they are created, so work a request
+    spawns (gathered LLM calls, stream consumers) is included and other
+    requests' work is not. Code run in worker threads is not sampled, and
+    nothing is profiled when the loop is not on the main thread.
+
+    Overhead is bounded by the number of concurrent traces, the stack depth
+    walked and the samples kept per trace. Finished traces are kept in a ring
+    buffer of ``buffer_size``.
+    """
+
+    def __init__(self, interval: Optional[float] = None, max_depth: Optional[int] = None,
+                 max_samples: Optional[int] = None, max_active: Optional[int] = None,
+                 buffer_size: Optional[int] = None):
+        self.interval = interval if interval is not None else settings.PROFILING_INTERVAL
+        self.max_depth = max_depth if max_depth is not None else settings.PROFILING_MAX_STACK_DEPTH
+        self.max_samples = max_samples if max_samples is not None else settings.PROFILING_MAX_SAMPLES
+        self.max_active = max_active if max_active is not None else settings.PROFILING_MAX_ACTIVE
+        self.traces: deque = deque(maxlen=buffer_size if buffer_size is not None else settings.PROFILING_BUFFER_SIZE)
+        self.active: Dict[str, ProfileTrace] = {}
+        self._task_traces: Dict[asyncio.Task, ProfileTrace] = {}
+        self._trace_tasks: Dict[str, List[asyncio.Task]] = {}
+        self._ids = itertools.count(1)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._previous_handler = None
+        self._labels: Dict[object, Frame] = {}
+
+    def start(self, method: str, path: str, trigger: str) -> Optional[ProfileTrace]:
+        """Begin profiling the calling task; None when the concurrency limit is reached or profiling is unavailable"""
+        if threading.current_thread() is not threading.main_thread() or not hasattr(signal, "setitimer"):
+            metrics.increment("profiles_skipped", labels={"reason": "unsupported"})
+            return None
+        if len(self.active) >= self.max_active:
+            metrics.increment("profiles_skipped", labels={"reason": "limit"})
+            return None
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._install(loop)
+
+        trace = ProfileTrace(f"{os.getpid()}-{next(self._ids)}", method, path, trigger, self.interval)
+        self.active[trace.id] = trace
+        self._trace_tasks[trace.id] = []
+        self._register(asyncio.current_task(), trace)
+        self.traces.append(trace)
+        if len(self.active) == 1:
+            self._previous_handler = signal.signal(signal.SIGPROF, self._sample)
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        return trace
+
+    def stop(self, trace: ProfileTrace):
+        trace.active = False
+        trace.duration = time.time() - trace.started_at
+        self.active.pop(trace.id, None)
+        for task in self._trace_tasks.pop(trace.id, []):
+            self._task_traces.pop(task, None)
+        if not self.active:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            signal.signal(signal.SIGPROF, self._previous_handler or signal.SIG_DFL)
+        metrics.increment("profiles_captured", labels={"trigger": trace.trigger})
+
+    def get(self, trace_id: str) -> Optional[ProfileTrace]:
+        return next((trace for trace in self.traces if trace.id == trace_id), None)
+
+    def _register(self, task: Optional[asyncio.Task], trace: ProfileTrace):
+        if task is not None:
+            self._task_traces[task] = trace
+            self._trace_tasks[trace.id].append(task)
+
+    def _install(self, loop: asyncio.AbstractEventLoop):
+        """Chain a task factory that files new tasks under the creating request's trace"""
+        previous = loop.get_task_factory()
+
+        def task_factory(loop, coro, **kwargs):
+            task = previous(loop, coro, **kwargs) if previous is not None else asyncio.Task(coro, loop=loop, **kwargs)
+            trace = current_profile.get()
+            if trace is not None and trace.active:
+                self._register(task, trace)
+            return task
+
+        loop.set_task_factory(task_factory)
+        self._loop = loop
+
+    def _sample(self, signum, frame):
+        task = asyncio.current_task(self._loop) if self._loop is not None else None
+        trace = self._task_traces.get(task) if task is not None else None
+        if trace is None or not trace.active:
+            return
+        if trace.samples >= self.max_samples:
+            trace.truncated = True
+            return
+        stack = []
+        while frame is not None and len(stack) < self.max_depth:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = self._labels.setdefault(code, (code.co_name, code.co_filename, code.co_firstlineno))
+            stack.append(label)
+            frame = frame.f_back
+        stack.reverse()
+        trace.stacks[tuple(stack)] += 1
+        trace.samples += 1
+
+def is_admin(authorization: str) -> bool:
+    """Whether a Bearer token is one of ADMIN_API_KEYS"""
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    return any(hmac.compare_digest(token.strip(), key) for key in settings.ADMIN_API_KEYS)
+
+class ProfilingMiddleware:
+    """Profile a request when an admin asks for it or when it is sampled.
+
+    Admins send ``X-Profile: 1``; otherwise one in PROFILING_SAMPLE_RATE
+    requests to PROFILING_PATHS is profiled (0 disables sampling). Profiled
+    responses carry ``X-Profile-Id`` for downloading the trace.
+    """
+
+    def __init__(self, app, profiler: Optional[SamplingProfiler] = None):
+        self.app = app
+        self._profiler = profiler
+
+    @property
+    def profiler(self) -> SamplingProfiler:
+        if self._profiler is None:
+            self._profiler = get_profiler()
+        return self._profiler
+
+    def _trigger(self, scope) -> Optional[str]:
+        headers = {key.decode("latin-1").lower(): value.decode("latin-1") for key, value in scope.get("headers", [])}
+        if headers.get(PROFILE_HEADER.lower()) == "1" and is_admin(headers.get("authorization", "")):
+            return "header"
+        rate = settings.PROFILING_SAMPLE_RATE
+        paths = settings.PROFILING_PATHS
+        if rate > 0 and (not paths or scope["path"] in paths) and random.randrange(rate) == 0:
+            return "sampled"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        trigger = self._trigger(scope) if scope["type"] == "http" and settings.PROFILING_ENABLED else None
+        trace = self.profiler.start(scope.get("method", ""), scope["path"], trigger) if trigger else None
+        if trace is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": list(message.get("headers", [])) + [
+                    (PROFILE_ID_HEADER.lower().encode(), trace.id.encode())
+                ]}
+            await send(message)
+
+        token = current_profile.set(trace)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            current_profile.reset(token)
+            self.profiler.stop(trace)
+
+_profiler: Optional[SamplingProfiler] = None
+
+def get_profiler() -> SamplingProfiler:
+    """Return the process-wide profiler"""
+    global _profiler
+    if _profiler is None:
+        _profiler = SamplingProfiler()
+    return _profiler
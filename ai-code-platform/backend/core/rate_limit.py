@@ -0,0 +1,316 @@
+import hashlib
+import json
+import math
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+from core.bulk_recorder import BulkRecorder
+from core.config import settings
+from core.metrics import metrics
+from core.request_context import ANONYMOUS_TENANT_PREFIX, request_tenant, request_usage
+
+try:
+    import redis.asyncio as aioredis
+    from redis.exceptions import RedisError
+except ImportError:  # pragma: no cover - redis is in requirements.txt
+    aioredis = None
+    RedisError = OSError
+
+# Refill both of a tenant's buckets, then take the request cost (only if the
+# request bucket has it and the LLM token bucket is not in debt) or charge the
+# token cost unconditionally. Returns allowed, reason, request tokens left,
+# LLM tokens left and the milliseconds until the denied bucket recovers.
+TAKE_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local function refill(key, capacity, rate)
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    return math.min(capacity, tokens + math.max(0, now - ts) * rate)
+end
+local req_capacity, req_rate = tonumber(ARGV[1]), tonumber(ARGV[2])
+local tok_capacity, tok_rate = tonumber(ARGV[3]), tonumber(ARGV[4])
+local req_cost, tok_cost = tonumber(ARGV[5]), tonumber(ARGV[6])
+local req = refill(KEYS[1], req_capacity, req_rate)
+local tok = refill(KEYS[2], tok_capacity, tok_rate)
+local allowed, reason, retry = 1, 0, 0
+if req_cost > 0 then
+    if req < req_cost then
+        allowed, reason, retry = 0, 1, math.ceil((req_cost - req) / req_rate * 1000)
+    elseif tok <= 0 then
+        allowed, reason, retry = 0, 2, math.ceil((1 - tok) / tok_rate * 1000)
+    end
+end
+if allowed == 1 then
+    req = req - req_cost
+    tok = tok - tok_cost
+end
+redis.call('HSET', KEYS[1], 'tokens', req, 'ts', now)
+redis.call('HSET', KEYS[2], 'tokens', tok, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(req_capacity / req_rate * 1000) + 1000)
+redis.call('PEXPIRE', KEYS[2], math.ceil((tok_capacity - math.min(tok, 0)) / tok_rate * 1000) + 1000)
+return {allowed, reason, math.floor(req), math.floor(tok), retry}
+"""
+
+DENIAL_REASONS = {1: "requests", 2: "llm_tokens"}
+
+@dataclass
+class BucketConfig:
+    capacity: float
+    refill_per_second: float
+
+@dataclass
+class RateDecision:
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_seconds: int
+    retry_after: int = 0
+    reason: Optional[str] = None
+
+    def headers(self) -> Dict[str, str]:
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(max(self.remaining, 0)),
+            "X-RateLimit-Reset": str(int(time.time()) + self.reset_seconds)
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(self.retry_after)
+        return headers
+
+class LocalBucketStore:
+    """In-process token buckets with the same semantics as TAKE_SCRIPT"""
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    async def take(self, keys: List[str], args: List[float]) -> List[int]:
+        req_capacity, req_rate, tok_capacity, tok_rate, req_cost, tok_cost = args
+        now = time.time()
+        req = self._refill(keys[0], req_capacity, req_rate, now)
+        tok = self._refill(keys[1], tok_capacity, tok_rate, now)
+
+        allowed, reason, retry = 1, 0, 0
+        if req_cost > 0:
+            if req < req_cost:
+                allowed, reason, retry = 0, 1, math.ceil((req_cost - req) / req_rate * 1000)
+            elif tok <= 0:
+                allowed, reason, retry = 0, 2, math.ceil((1 - tok) / tok_rate * 1000)
+        if allowed:
+            req -= req_cost
+            tok -= tok_cost
+
+        self._buckets[keys[0]] = (req, now)
+        self._buckets[keys[1]] = (tok, now)
+        return [allowed, reason, math.floor(req), math.floor(tok), retry]
+
+    def _refill(self, key: str, capacity: float, rate: float, now: float) -> float:
+        tokens, ts = self._buckets.get(key, (capacity, now))
+        return min(capacity, tokens + max(0.0, now - ts) * rate)
+
+class RedisBucketStore:
+    """Token buckets shared by every worker and pod, updated atomically in Redis"""
+
+    def __init__(self, client):
+        self.client = client
+        self.script = client.register_script(TAKE_SCRIPT)
+
+    async def take(self, keys: List[str], args: List[float]) -> List[int]:
+        return [int(value) for value in await self.script(keys=keys, args=args)]
+
+class QuotaRecorder(BulkRecorder):
+    """Buffer per-tenant usage and write it to the database in bulk.
+
+    Usage is aggregated per tenant and minute in memory; a background task
+    flushes the buffer as one multi-row upsert every flush_interval seconds,
+    so the database sees a handful of writes per minute regardless of load.
+    """
+
+    metric_prefix = "quota"
+
+    UPSERT = """
+        INSERT INTO quota_usage (tenant_id, window_start, requests, llm_tokens)
+        VALUES (:tenant_id, :window_start, :requests, :llm_tokens)
+        ON CONFLICT (tenant_id, window_start) DO UPDATE SET
+            requests = quota_usage.requests + EXCLUDED.requests,
+            llm_tokens = quota_usage.llm_tokens + EXCLUDED.llm_tokens
+    """
+
+    def __init__(self, writer: Optional[Callable[[List[Dict]], None]] = None, flush_interval: Optional[float] = None, max_pending: int = 10000):
+        super().__init__(flush_interval=flush_interval if flush_interval is not None else settings.QUOTA_FLUSH_INTERVAL,
+                         max_pending=max_pending)
+        self.writer = writer or self._write_to_database
+        self.pending: Dict[Tuple[str, datetime], List[int]] = {}
+
+    def record(self, tenant: str, requests: int = 0, llm_tokens: int = 0):
+        window = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+        usage = self.pending.get((tenant, window))
+        if usage is None:
+            if len(self.pending) >= self.max_pending:
+                metrics.increment("quota_usage_dropped")
+                return
+            usage = self.pending[(tenant, window)] = [0, 0]
+        usage[0] += requests
+        usage[1] += llm_tokens
+        self._schedule()
+
+    def _write(self, batch: Dict[Tuple[str, datetime], List[int]]):
+        self.writer([
+            {"tenant_id": tenant, "window_start": window, "requests": usage[0], "llm_tokens": usage[1]}
+            for (tenant, window), usage in batch.items()
+        ])
+
+    def _requeue(self, batch: Dict[Tuple[str, datetime], List[int]]):
+        for key, usage in batch.items():
+            merged = self.pending.setdefault(key, [0, 0])
+            merged[0] += usage[0]
+            merged[1] += usage[1]
+
+    def _write_to_database(self, rows: List[Dict]):
+        from sqlalchemy import text
+
+        with self.engine.begin() as connection:
+            connection.execute(text(self.UPSERT), rows)
+
+class RateLimiter:
+    """Per-tenant token buckets for request count and LLM tokens.
+
+    Buckets live in Redis when it is configured and reachable, otherwise in
+    process. A request is admitted if the tenant has a request token and its
+    LLM token bucket is not in debt; the LLM tokens it used are charged
+    afterwards, so one expensive request pushes later ones back.
+    """
+
+    def __init__(
+        self,
+        store=None,
+        requests: Optional[BucketConfig] = None,
+        llm_tokens: Optional[BucketConfig] = None,
+        recorder: Optional[QuotaRecorder] = None
+    ):
+        self.local = LocalBucketStore()
+        self.store = store or self.local
+        self.requests = requests or BucketConfig(settings.RATE_LIMIT_REQUEST_BURST, settings.RATE_LIMIT_REQUESTS_PER_MINUTE / 60)
+        self.llm_tokens = llm_tokens or BucketConfig(settings.RATE_LIMIT_TOKEN_BURST, settings.RATE_LIMIT_TOKENS_PER_MINUTE / 60)
+        self.recorder = recorder
+
+    async def admit(self, tenant: str) -> RateDecision:
+        allowed, reason, remaining, _, retry_ms = await self._take(tenant, 1, 0)
+        reset_seconds = math.ceil((self.requests.capacity - remaining) / self.requests.refill_per_second)
+        decision = RateDecision(
+            allowed=bool(allowed),
+            limit=int(self.requests.capacity),
+            remaining=remaining,
+            reset_seconds=reset_seconds,
+            retry_after=max(1, math.ceil(retry_ms / 1000)) if not allowed else 0,
+            reason=DENIAL_REASONS.get(reason)
+        )
+        if decision.allowed:
+            if self.recorder is not None:
+                self.recorder.record(tenant, requests=1)
+        else:
+            metrics.increment("rate_limited_requests", labels={"reason": decision.reason})
+        return decision
+
+    async def charge(self, tenant: str, llm_tokens: int):
+        """Debit the LLM tokens a request used"""
+        if llm_tokens <= 0:
+            return
+        await self._take(tenant, 0, llm_tokens)
+        if self.recorder is not None:
+            self.recorder.record(tenant, llm_tokens=llm_tokens)
+
+    async def _take(self, tenant: str, request_cost: int, token_cost: int) -> List[int]:
+        keys = [f"ratelimit:{tenant}:requests", f"ratelimit:{tenant}:llm_tokens"]
+        args = [
+            self.requests.capacity, self.requests.refill_per_second,
+            self.llm_tokens.capacity, self.llm_tokens.refill_per_second,
+            request_cost, token_cost
+        ]
+        try:
+            return await self.store.take(keys, args)
+        except (RedisError, OSError):
+            # Keep limiting per process while Redis is unreachable
+            metrics.increment("rate_limit_store_errors")
+            return await self.local.take(keys, args)
+
+def tenant_from_headers(headers: Dict[str, str], client_host: Optional[str]) -> str:
+    """Identify the tenant by a hash of its API key, or by client address without one"""
+    authorization = headers.get("authorization", "")
+    scheme, _, api_key = authorization.partition(" ")
+    if scheme.lower() == "bearer" and api_key.strip():
+        return "key:" + hashlib.sha256(api_key.strip().encode("utf8")).hexdigest()[:32]
+    return f"{ANONYMOUS_TENANT_PREFIX}{client_host or 'unknown'}"
+
+class RateLimitMiddleware:
+    """Enforce per-tenant limits on HTTP requests and WebSocket handshakes.
+
+    Rejected HTTP requests get a 429 with ``Retry-After``; admitted ones carry
+    ``X-RateLimit-*`` headers. LLM tokens used while handling the request are
+    gathered through ``request_usage`` and charged when it finishes.
+    """
+
+    def __init__(self, app, limiter: Optional[RateLimiter] = None, exempt_paths: Optional[List[str]] = None):
+        self.app = app
+        self._limiter = limiter
+        self.exempt_paths = set(settings.RATE_LIMIT_EXEMPT_PATHS if exempt_paths is None else exempt_paths)
+
+    @property
+    def limiter(self) -> RateLimiter:
+        if self._limiter is None:
+            self._limiter = get_rate_limiter()
+        return self._limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket") or not settings.RATE_LIMIT_ENABLED or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        headers = {key.decode("latin-1").lower(): value.decode("latin-1") for key, value in scope.get("headers", [])}
+        client = scope.get("client")
+        tenant = tenant_from_headers(headers, client[0] if client else None)
+        decision = await self.limiter.admit(tenant)
+
+        if not decision.allowed:
+            if scope["type"] == "websocket":
+                # Closing before accept rejects the handshake with a 403
+                await send({"type": "websocket.close", "code": 1008})
+                return
+            body = json.dumps({"detail": f"Rate limit exceeded ({decision.reason}), retry in {decision.retry_after}s"}).encode()
+            response_headers = [(b"content-type", b"application/json")]
+            response_headers += [(k.lower().encode(), v.encode()) for k, v in decision.headers().items()]
+            await send({"type": "http.response.start", "status": 429, "headers": response_headers})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": list(message.get("headers", [])) + [
+                    (k.lower().encode(), v.encode()) for k, v in decision.headers().items()
+                ]}
+            await send(message)
+
+        usage = {"llm_tokens": 0}
+        tenant_token = request_tenant.set(tenant)
+        usage_token = request_usage.set(usage)
+        try:
+            await self.app(scope, receive, send_with_headers if scope["type"] == "http" else send)
+        finally:
+            request_usage.reset(usage_token)
+            request_tenant.reset(tenant_token)
+            await self.limiter.charge(tenant, usage["llm_tokens"])
+
+_limiter: Optional[RateLimiter] = None
+
+def get_rate_limiter() -> RateLimiter:
+    """Return the process-wide limiter, backed by Redis when REDIS_URL is set"""
+    global _limiter
+    if _limiter is None:
+        store = None
+        if aioredis is not None and settings.REDIS_URL and settings.RATE_LIMIT_BACKEND == "redis":
+            store = RedisBucketStore(aioredis.from_url(settings.REDIS_URL))
+        _limiter = RateLimiter(store=store, recorder=QuotaRecorder() if settings.QUOTA_RECORDING_ENABLED else None)
+    return _limiter
@@ -0,0 +1,65 @@
+import time
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Dict, Optional
+
+class RequestPriority(IntEnum):
+    INTERACTIVE = 0
+    BATCH = 1
+
+PRIORITY_HEADER = "X-Request-Priority"
+
+# Per-request state set by middleware and read by the provider layer
+request_priority: ContextVar[RequestPriority] = ContextVar("request_priority", default=RequestPriority.INTERACTIVE)
+# Absolute time.monotonic() deadline for the request, if the endpoint has one
+request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+# Rate-limit tenant of the request and the LLM tokens its provider calls used so far
+request_tenant: ContextVar[Optional[str]] = ContextVar("request_tenant", default=None)
+request_usage: ContextVar[Optional[Dict[str, int]]] = ContextVar("request_usage", default=None)
+# Facts about the request's result (language, quality_score, cached) for the usage statistics rollups
+request_stats: ContextVar[Optional[Dict]] = ContextVar("request_stats", default=None)
+
+ANONYMOUS_TENANT_PREFIX = "anonymous:"
+
+def is_anonymous(tenant: Optional[str]) -> bool:
+    """Whether the tenant was identified by client address rather than an API key"""
+    return tenant is None or tenant.startswith(ANONYMOUS_TENANT_PREFIX)
+
+def parse_priority(value: str) -> RequestPriority:
+    """Map a priority header value to a RequestPriority"""
+    if value and value.strip().lower() in ("batch", "ci"):
+        return RequestPriority.BATCH
+    return RequestPriority.INTERACTIVE
+
+class RequestPriorityMiddleware:
+    """Tag each request as interactive (IDE/UI) or batch (CI) for the LLM limiters.
+
+    Pure ASGI, like the other middlewares: a request whose client went away is
+    cancelled without a response, which a ``BaseHTTPMiddleware`` would turn into a 500.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.header = PRIORITY_HEADER.lower().encode("latin-1")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        value = next((v for k, v in scope.get("headers", []) if k == self.header), b"")
+        token = request_priority.set(parse_priority(value.decode("latin-1")))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_priority.reset(token)
+
+def time_remaining() -> Optional[float]:
+    """Seconds left before the current request's deadline, or None without one"""
+    deadline = request_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+def annotate_request(**fields):
+    """Attach result facts to the current request's usage statistics, if they are being recorded"""
+    stats = request_stats.get()
+    if stats is not None:
+        stats.update(fields)
@@ -0,0 +1,56 @@
+import gzip
+import hashlib
+from typing import Any, Dict, Optional
+
+import orjson
+from fastapi import Request
+from fastapi.responses import Response
+
+from core.config import settings
+
+try:
+    import brotli
+except ImportError:  # optional: gzip is used when brotli is not installed
+    brotli = None
+
+def dumps(obj: Any) -> bytes:
+    """Encode to JSON with orjson, which handles dataclasses (including slotted ones) and Enums natively"""
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+def content_etag(*parts: Any) -> str:
+    """Weak ETag for a result determined by parts (the request content) and RESULT_VERSION.
+
+    Weak because json_response sends the same result gzip, brotli or
+    uncompressed, and a strong validator has to differ per encoding.
+    """
+    digest = hashlib.sha256(dumps([settings.RESULT_VERSION, *parts])).hexdigest()
+    return f'W/"{digest[:32]}"'
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """304 with no body when If-None-Match lists the ETag (or is *), else None"""
+    header = request.headers.get("if-none-match")
+    if header is None:
+        return None
+    # If-None-Match uses the weak comparison, so W/ prefixes are ignored
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    if etag.removeprefix("W/") in tags or "*" in tags:
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
+
+def json_response(payload: Any, request: Request, status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> Response:
+    """Build a JSON response without FastAPI's jsonable_encoder pass.
+
+    Bodies above RESPONSE_COMPRESSION_MIN_BYTES are compressed with brotli or
+    gzip, whichever the client accepts (brotli preferred).
+    """
+    body = dumps(payload)
+    headers = {"Vary": "Accept-Encoding", **(headers or {})}
+    if len(body) >= settings.RESPONSE_COMPRESSION_MIN_BYTES:
+        accepted = request.headers.get("accept-encoding", "")
+        if brotli is not None and "br" in accepted:
+            body = brotli.compress(body, quality=5)
+            headers["Content-Encoding"] = "br"
+        elif "gzip" in accepted:
+            body = gzip.compress(body, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
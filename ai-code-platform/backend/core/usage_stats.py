@@ -0,0 +1,268 @@
+import time
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from core.bulk_recorder import BulkRecorder
+from core.config import settings
+from core.metrics import metrics
+from core.request_context import request_stats
+
+# Upper bounds (ms) of the latency histogram buckets; one more bucket holds everything slower
+LATENCY_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+def latency_bucket(latency_ms: float) -> int:
+    return bisect_left(LATENCY_BUCKETS_MS, latency_ms)
+
+def latency_percentile(counts: Sequence[int], fraction: float) -> Optional[float]:
+    """Estimate a latency percentile from histogram bucket counts, interpolating within the bucket"""
+    total = sum(counts)
+    if not total:
+        return None
+    target = fraction * total
+    seen = 0
+    for bucket, count in enumerate(counts):
+        if count and seen + count >= target:
+            if bucket == len(LATENCY_BUCKETS_MS):
+                return float(LATENCY_BUCKETS_MS[-1])
+            lower = LATENCY_BUCKETS_MS[bucket - 1] if bucket else 0
+            return lower + (LATENCY_BUCKETS_MS[bucket] - lower) * (target - seen) / count
+        seen += count
+    return float(LATENCY_BUCKETS_MS[-1])
+
+class UsageRollup:
+    """Aggregates for one (hour, endpoint, language)"""
+
+    __slots__ = ("requests", "cache_hits", "quality_sum", "quality_count", "latency_sum_ms", "latency_counts")
+
+    def __init__(self):
+        self.requests = 0
+        self.cache_hits = 0
+        self.quality_sum = 0.0
+        self.quality_count = 0
+        self.latency_sum_ms = 0.0
+        self.latency_counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def add(self, latency_ms: float, cached: bool, quality_score: Optional[float]):
+        self.requests += 1
+        self.cache_hits += bool(cached)
+        if quality_score is not None:
+            self.quality_sum += quality_score
+            self.quality_count += 1
+        self.latency_sum_ms += latency_ms
+        self.latency_counts[latency_bucket(latency_ms)] += 1
+
+    def merge(self, other: "UsageRollup"):
+        self.requests += other.requests
+        self.cache_hits += other.cache_hits
+        self.quality_sum += other.quality_sum
+        self.quality_count += other.quality_count
+        self.latency_sum_ms += other.latency_sum_ms
+        self.latency_counts = [a + b for a, b in zip(self.latency_counts, other.latency_counts)]
+
+    def summary(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "cache_hit_rate": round(self.cache_hits / self.requests, 4) if self.requests else None,
+            "average_quality_score": round(self.quality_sum / self.quality_count, 2) if self.quality_count else None,
+            "latency_ms": {
+                "mean": round(self.latency_sum_ms / self.requests, 1) if self.requests else None,
+                **{name: _round(latency_percentile(self.latency_counts, fraction))
+                   for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p95", 0.95), ("p99", 0.99))}
+            }
+        }
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 1)
+
+RollupKey = Tuple[datetime, str, str]
+
+class UsageRecorder(BulkRecorder):
+    """Maintain the hourly usage rollup tables incrementally.
+
+    Each finished request is added to an in-memory rollup for its hour,
+    endpoint and language; a background task upserts the buffered rollups
+    every flush_interval seconds, adding to the stored totals. Reading stats
+    then touches one row per hour, endpoint and language instead of every
+    request.
+    """
+
+    metric_prefix = "usage_stats"
+
+    ROLLUP_UPSERT = """
+        INSERT INTO usage_rollup_hourly (hour, endpoint, language, requests, cache_hits, quality_sum, quality_count, latency_sum_ms)
+        VALUES (:hour, :endpoint, :language, :requests, :cache_hits, :quality_sum, :quality_count, :latency_sum_ms)
+        ON CONFLICT (hour, endpoint, language) DO UPDATE SET
+            requests = usage_rollup_hourly.requests + EXCLUDED.requests,
+            cache_hits = usage_rollup_hourly.cache_hits + EXCLUDED.cache_hits,
+            quality_sum = usage_rollup_hourly.quality_sum + EXCLUDED.quality_sum,
+            quality_count = usage_rollup_hourly.quality_count + EXCLUDED.quality_count,
+            latency_sum_ms = usage_rollup_hourly.latency_sum_ms + EXCLUDED.latency_sum_ms
+    """
+
+    LATENCY_UPSERT = """
+        INSERT INTO usage_latency_hourly (hour, endpoint, language, bucket, requests)
+        VALUES (:hour, :endpoint, :language, :bucket, :requests)
+        ON CONFLICT (hour, endpoint, language, bucket) DO UPDATE SET
+            requests = usage_latency_hourly.requests + EXCLUDED.requests
+    """
+
+    def __init__(self, engine=None, flush_interval: Optional[float] = None, max_pending: int = 10000):
+        super().__init__(engine, flush_interval if flush_interval is not None else settings.STATS_FLUSH_INTERVAL, max_pending)
+        self.pending: Dict[RollupKey, UsageRollup] = {}
+
+    def record(self, endpoint: str, language: Optional[str], latency_ms: float, cached: bool = False,
+               quality_score: Optional[float] = None):
+        hour = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        key = (hour, endpoint, language or "unknown")
+        rollup = self.pending.get(key)
+        if rollup is None:
+            if len(self.pending) >= self.max_pending:
+                metrics.increment("usage_stats_dropped")
+                return
+            rollup = self.pending[key] = UsageRollup()
+        rollup.add(latency_ms, cached, quality_score)
+        self._schedule()
+
+    def _requeue(self, batch: Dict[RollupKey, UsageRollup]):
+        for key, rollup in batch.items():
+            self.pending.setdefault(key, UsageRollup()).merge(rollup)
+
+    def _write(self, batch: Dict[RollupKey, UsageRollup]):
+        from sqlalchemy import text
+
+        rollups = []
+        latencies = []
+        for (hour, endpoint, language), rollup in batch.items():
+            key = {"hour": hour, "endpoint": endpoint, "language": language}
+            rollups.append({
+                **key,
+                "requests": rollup.requests,
+                "cache_hits": rollup.cache_hits,
+                "quality_sum": rollup.quality_sum,
+                "quality_count": rollup.quality_count,
+                "latency_sum_ms": rollup.latency_sum_ms
+            })
+            latencies.extend({**key, "bucket": bucket, "requests": count}
+                             for bucket, count in enumerate(rollup.latency_counts) if count)
+        with self.engine.begin() as connection:
+            connection.execute(text(self.ROLLUP_UPSERT), rollups)
+            connection.execute(text(self.LATENCY_UPSERT), latencies)
+
+class UsageStatsReader:
+    """Read usage statistics from the rollup tables; cost depends on the time range, not the request volume"""
+
+    ROLLUP_QUERY = """
+        SELECT endpoint, language, SUM(requests), SUM(cache_hits), SUM(quality_sum), SUM(quality_count), SUM(latency_sum_ms)
+        FROM usage_rollup_hourly
+        WHERE hour >= :since
+        GROUP BY endpoint, language
+    """
+
+    LATENCY_QUERY = """
+        SELECT endpoint, language, bucket, SUM(requests)
+        FROM usage_latency_hourly
+        WHERE hour >= :since
+        GROUP BY endpoint, language, bucket
+    """
+
+    def __init__(self, engine=None):
+        self._engine = engine
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            from core.database import engine
+            self._engine = engine
+        return self._engine
+
+    def summary(self, hours: int = 24) -> Dict:
+        from sqlalchemy import text
+
+        since = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0) - timedelta(hours=hours - 1)
+        rollups: Dict[Tuple[str, str], UsageRollup] = {}
+        with self.engine.connect() as connection:
+            for endpoint, language, requests, cache_hits, quality_sum, quality_count, latency_sum in connection.execute(
+                text(self.ROLLUP_QUERY), {"since": since}
+            ):
+                rollup = rollups.setdefault((endpoint, language), UsageRollup())
+                rollup.requests = int(requests)
+                rollup.cache_hits = int(cache_hits)
+                rollup.quality_sum = float(quality_sum)
+                rollup.quality_count = int(quality_count)
+                rollup.latency_sum_ms = float(latency_sum)
+            for endpoint, language, bucket, count in connection.execute(text(self.LATENCY_QUERY), {"since": since}):
+                rollup = rollups.setdefault((endpoint, language), UsageRollup())
+                if 0 <= bucket < len(rollup.latency_counts):
+                    rollup.latency_counts[bucket] += int(count)
+
+        total = UsageRollup()
+        endpoints: Dict[str, UsageRollup] = {}
+        languages: Dict[str, UsageRollup] = {}
+        for (endpoint, language), rollup in rollups.items():
+            total.merge(rollup)
+            endpoints.setdefault(endpoint, UsageRollup()).merge(rollup)
+            languages.setdefault(language, UsageRollup()).merge(rollup)
+        return {
+            "since": since.isoformat(),
+            "hours": hours,
+            "totals": total.summary(),
+            "endpoints": {name: rollup.summary() for name, rollup in sorted(endpoints.items())},
+            "languages": {name: rollup.summary() for name, rollup in sorted(languages.items())}
+        }
+
+class UsageStatsMiddleware:
+    """Time requests to STATS_PATHS and add them to the usage rollups when they finish.
+
+    Endpoints and services describe the result (language, quality score,
+    cache hit) through ``annotate_request``.
+    """
+
+    def __init__(self, app, recorder: Optional[UsageRecorder] = None, paths: Optional[List[str]] = None):
+        self.app = app
+        self._recorder = recorder
+        self.paths = set(settings.STATS_PATHS if paths is None else paths)
+
+    @property
+    def recorder(self) -> UsageRecorder:
+        if self._recorder is None:
+            self._recorder = get_usage_recorder()
+        return self._recorder
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.STATS_ENABLED or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        stats: Dict = {}
+        token = request_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            request_stats.reset(token)
+            # Rejected and failed requests would skew latency and quality; they show up in metrics instead
+            if status["code"] < 400:
+                self.recorder.record(
+                    scope["path"],
+                    stats.get("language"),
+                    (time.perf_counter() - started) * 1000,
+                    cached=stats.get("cached", False),
+                    quality_score=stats.get("quality_score")
+                )
+
+_recorder: Optional[UsageRecorder] = None
+
+def get_usage_recorder() -> UsageRecorder:
+    """Return the process-wide usage recorder"""
+    global _recorder
+    if _recorder is None:
+        _recorder = UsageRecorder()
+    return _recorder
@@ -0,0 +1,204 @@
+import asyncio
+import hashlib
+import os
+import posixpath
+import tarfile
+import zipfile
+from dataclasses import dataclass
+from typing import AsyncIterator, BinaryIO, Dict, Iterator, Optional
+
+from core.config import settings
+from core.metrics import metrics
+from services.code_reviewer import CodeReviewerService, issue_to_dict
+from services.parsers import FILE_EXTENSIONS
+
+try:
+    import redis.asyncio as aioredis
+    from redis.exceptions import RedisError
+except ImportError:  # optional: hashes are kept in process when redis is not installed
+    aioredis = None
+    RedisError = OSError
+
+class ArchiveError(ValueError):
+    """The upload is not a readable tar or zip archive"""
+
+@dataclass
+class ArchiveMember:
+    path: str
+    size: int
+    language: Optional[str]
+    data: Optional[bytes] = None  # only read for supported languages within the size limit
+
+def open_archive(fileobj: BinaryIO, max_file_bytes: int) -> Iterator[ArchiveMember]:
+    """Iterate the regular files of a tar (optionally compressed) or zip archive.
+
+    Tar archives are read as a stream, one member at a time; zip archives
+    need a seekable file, which a spooled upload is. Only the current
+    member's contents are held in memory. The format is checked before
+    this returns, so a bad upload fails here rather than mid-iteration.
+    """
+    if zipfile.is_zipfile(fileobj):
+        fileobj.seek(0)
+        return _zip_members(zipfile.ZipFile(fileobj), max_file_bytes)
+    fileobj.seek(0)
+    try:
+        archive = tarfile.open(fileobj=fileobj, mode="r|*")
+    except tarfile.TarError as e:
+        raise ArchiveError(f"Unsupported archive: {e}") from e
+    return _tar_members(archive, max_file_bytes)
+
+def _member(path: str, size: int, max_file_bytes: int, read) -> ArchiveMember:
+    path = posixpath.normpath(path.lstrip("/")).removeprefix("./")
+    language = FILE_EXTENSIONS.get(os.path.splitext(path)[1].lower())
+    member = ArchiveMember(path=path, size=size, language=language)
+    if language is not None and size <= max_file_bytes:
+        member.data = read()
+    return member
+
+def _tar_members(archive: tarfile.TarFile, max_file_bytes: int) -> Iterator[ArchiveMember]:
+    with archive:
+        try:
+            for info in archive:
+                if info.isfile():
+                    yield _member(info.name, info.size, max_file_bytes, lambda: archive.extractfile(info).read())
+        except tarfile.TarError as e:
+            raise ArchiveError(f"Corrupt archive: {e}") from e
+
+def _zip_members(archive: zipfile.ZipFile, max_file_bytes: int) -> Iterator[ArchiveMember]:
+    with archive:
+        try:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    yield _member(info.filename, info.file_size, max_file_bytes, lambda: archive.read(info))
+        except zipfile.BadZipFile as e:
+            raise ArchiveError(f"Corrupt archive: {e}") from e
+
+class ContentHashStore:
+    """Content hashes of the files reviewed in earlier archive uploads, per project.
+
+    Stored as one Redis hash per project (path -> sha256) so every worker
+    sees them. Without Redis, or when it errors, an in-process dict is used.
+    """
+
+    def __init__(self, redis_client=None):
+        self.redis = redis_client
+        self.local: Dict[str, Dict[str, str]] = {}
+
+    @staticmethod
+    def key(project: str) -> str:
+        return f"acp:archive-hashes:{project}"
+
+    async def load(self, project: str) -> Dict[str, str]:
+        if self.redis is not None:
+            try:
+                stored = await self.redis.hgetall(self.key(project))
+                return {path.decode("utf8"): digest.decode("ascii") for path, digest in stored.items()}
+            except (RedisError, OSError):
+                metrics.increment("archive_hash_store_errors")
+        return dict(self.local.get(project, {}))
+
+    async def save(self, project: str, digests: Dict[str, str]):
+        if not digests:
+            return
+        if self.redis is not None:
+            try:
+                await self.redis.hset(self.key(project), mapping=digests)
+                return
+            except (RedisError, OSError):
+                metrics.increment("archive_hash_store_errors")
+        self.local.setdefault(project, {}).update(digests)
+
+class ArchiveReviewService:
+    """Review a repository uploaded as one archive, file by file.
+
+    Members are read and analyzed one at a time in a worker thread, so
+    neither the event loop nor memory scales with the repository. Files
+    whose content hash matches the previous upload of the same project are
+    skipped; new hashes are saved every ARCHIVE_HASH_BATCH files.
+    """
+
+    def __init__(self, reviewer: CodeReviewerService, hashes: Optional[ContentHashStore] = None):
+        self.reviewer = reviewer
+        self.hashes = hashes or ContentHashStore()
+
+    async def review_archive(self, members: Iterator[ArchiveMember], project: str, ai_review: bool = False) -> AsyncIterator[Dict]:
+        """Yield one event per reviewed or skipped file, then totals"""
+        # Static-only and AI reviews are tracked separately so turning on AI review re-reviews every file
+        namespace = f"{project}:{'ai' if ai_review else 'static'}"
+        previous = await self.hashes.load(namespace)
+        pending: Dict[str, str] = {}
+        totals = {"files": 0, "reviewed": 0, "unchanged": 0, "skipped": 0, "ignored": 0}
+
+        try:
+            while True:
+                member = await asyncio.to_thread(next, members, None)
+                if member is None:
+                    break
+                totals["files"] += 1
+                if totals["files"] > settings.ARCHIVE_MAX_FILES:
+                    yield {"event": "error", "detail": f"Archive has more than {settings.ARCHIVE_MAX_FILES} files"}
+                    break
+
+                if member.language is None:
+                    outcome = "ignored"
+                elif member.data is None:
+                    outcome = "skipped"
+                    yield {"event": "skipped", "path": member.path, "reason": "too_large"}
+                else:
+                    digest = hashlib.sha256(member.data).hexdigest()
+                    if previous.get(member.path) == digest:
+                        outcome = "unchanged"
+                    else:
+                        event = await self._review_member(member, ai_review)
+                        if event["event"] == "file":
+                            outcome = "reviewed"
+                            pending[member.path] = digest
+                        else:
+                            outcome = "skipped"
+                        yield event
+                totals[outcome] += 1
+                metrics.increment("archive_files", labels={"outcome": outcome})
+
+                if len(pending) >= settings.ARCHIVE_HASH_BATCH:
+                    await self.hashes.save(namespace, pending)
+                    pending = {}
+        except ArchiveError as e:
+            yield {"event": "error", "detail": str(e)}
+        finally:
+            close = getattr(members, "close", None)
+            if close is not None:
+                close()
+            await self.hashes.save(namespace, pending)
+
+        yield {"event": "complete", **totals}
+
+    async def _review_member(self, member: ArchiveMember, ai_review: bool) -> Dict:
+        try:
+            code = member.data.decode("utf8")
+        except UnicodeDecodeError:
+            return {"event": "skipped", "path": member.path, "reason": "not_utf8"}
+
+        if ai_review:
+            result = await self.reviewer.review_code(code, member.language)
+        else:
+            result = await asyncio.to_thread(self.reviewer.review_static, code, member.language)
+        return {
+            "event": "file",
+            "path": member.path,
+            "language": member.language,
+            "issues": [issue_to_dict(issue) for issue in result.issues],
+            "suggestions": result.suggestions,
+            "quality_score": result.quality_score,
+            "maintainability_score": result.maintainability_score,
+            "windows": result.windows
+        }
+
+_hash_store: Optional[ContentHashStore] = None
+
+def get_content_hash_store() -> ContentHashStore:
+    """Return the process-wide content hash store"""
+    global _hash_store
+    if _hash_store is None:
+        redis_client = aioredis.from_url(settings.REDIS_URL) if aioredis is not None and settings.REDIS_URL else None
+        _hash_store = ContentHashStore(redis_client)
+    return _hash_store
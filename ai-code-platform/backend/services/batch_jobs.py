@@ -0,0 +1,371 @@
+import asyncio
+import itertools
+import json
+import time
+import uuid
+from dataclasses import asdict
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from core.config import settings
+from core.metrics import metrics
+from services.code_reviewer import CodeReviewerService, issue_to_dict
+from services.llm_providers import BatchOutput, BatchRequest
+from services.test_generator import TestGeneratorService
+
+try:
+    import redis.asyncio as aioredis
+    from redis.exceptions import RedisError
+except ImportError:  # optional: jobs are kept in process when redis is not installed
+    aioredis = None
+    RedisError = OSError
+
+BATCH_KINDS = ("review", "tests")
+
+# Provider batch states after which the batch will not change
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+class OpenAIBatchBackend:
+    """Submit chat completions through the OpenAI Batch API.
+
+    Requests are uploaded as one JSONL file per batch and run within the
+    24h completion window at the batch discount, outside the interactive
+    rate limits. The pinned SDK has no typed batches resource, so the
+    endpoints are called through the client's generic request methods.
+    """
+
+    name = "openai"
+    ENDPOINT = "/v1/chat/completions"
+
+    def __init__(self, client, default_model: str = "gpt-4-turbo-preview"):
+        self.client = client
+        self.default_model = default_model
+
+    async def submit(self, requests: List[BatchRequest]) -> str:
+        lines = [self._line(request) for request in requests]
+        upload = await self.client.files.create(file=("batch.jsonl", "\n".join(lines).encode("utf8")), purpose="batch")
+        batch = await self.client.post(
+            "/batches",
+            body={"input_file_id": upload.id, "endpoint": self.ENDPOINT, "completion_window": "24h"},
+            cast_to=dict
+        )
+        return batch["id"]
+
+    def request_size(self, request: BatchRequest) -> int:
+        """Bytes the request adds to the uploaded JSONL file"""
+        return len(self._line(request).encode("utf8")) + 1
+
+    def _line(self, request: BatchRequest) -> str:
+        return json.dumps({
+            "custom_id": request.custom_id,
+            "method": "POST",
+            "url": self.ENDPOINT,
+            "body": {
+                "model": request.model or self.default_model,
+                "messages": [
+                    {"role": "system", "content": request.system},
+                    {"role": "user", "content": request.prefix + request.prompt}
+                ],
+                "temperature": request.temperature,
+                "max_tokens": request.max_tokens,
+                **request.options
+            }
+        })
+
+    async def status(self, batch_id: str) -> Dict:
+        batch = await self.client.get(f"/batches/{batch_id}", cast_to=dict)
+        return {"status": batch["status"], "counts": batch.get("request_counts") or {}}
+
+    async def results(self, batch_id: str) -> Dict[str, BatchOutput]:
+        batch = await self.client.get(f"/batches/{batch_id}", cast_to=dict)
+        outputs = {}
+        # Expired and cancelled batches still report the requests that finished
+        for file_id in (batch.get("output_file_id"), batch.get("error_file_id")):
+            if not file_id:
+                continue
+            content = await self.client.files.content(file_id)
+            for line in content.text.splitlines():
+                if line.strip():
+                    record = json.loads(line)
+                    outputs[record["custom_id"]] = self._output(record)
+        return outputs
+
+    def _output(self, record: Dict) -> BatchOutput:
+        response = record.get("response") or {}
+        if record.get("error") or response.get("status_code", 200) >= 400:
+            error = record.get("error") or (response.get("body") or {}).get("error") or {}
+            return BatchOutput(error=error.get("message", "batch request failed"))
+        return BatchOutput(text=response["body"]["choices"][0]["message"]["content"])
+
+class LocalBatchBackend:
+    """In-process stand-in for a provider batch API, for tests and local runs.
+
+    Batches complete ``completion_delay`` seconds after submission. Each
+    request is answered by ``responder``, or with an empty JSON review or
+    a placeholder test file by default.
+    """
+
+    name = "local"
+
+    def __init__(self, responder: Optional[Callable[[BatchRequest], str]] = None, completion_delay: float = 0.0,
+                 fail_every: int = 0):
+        self.responder = responder
+        self.completion_delay = completion_delay
+        self.fail_every = fail_every  # fail every Nth request, to exercise error handling; 0 = never
+        self.batches: Dict[str, Dict] = {}
+        self._ids = itertools.count(1)
+
+    def request_size(self, request: BatchRequest) -> int:
+        return len(json.dumps(asdict(request)).encode("utf8")) + 1
+
+    async def submit(self, requests: List[BatchRequest]) -> str:
+        batch_id = f"local-batch-{next(self._ids)}"
+        self.batches[batch_id] = {"submitted_at": time.monotonic(), "requests": list(requests)}
+        return batch_id
+
+    async def status(self, batch_id: str) -> Dict:
+        batch = self.batches.get(batch_id)
+        if batch is None:
+            return {"status": "expired", "counts": {}}
+        total = len(batch["requests"])
+        if time.monotonic() - batch["submitted_at"] < self.completion_delay:
+            return {"status": "in_progress", "counts": {"total": total, "completed": 0, "failed": 0}}
+        return {"status": "completed", "counts": {"total": total, "completed": total, "failed": 0}}
+
+    async def results(self, batch_id: str) -> Dict[str, BatchOutput]:
+        batch = self.batches.get(batch_id)
+        if batch is None:
+            return {}
+        outputs = {}
+        for index, request in enumerate(batch["requests"]):
+            if self.fail_every and (index + 1) % self.fail_every == 0:
+                outputs[request.custom_id] = BatchOutput(error=f"{self.name} simulated failure")
+            else:
+                outputs[request.custom_id] = BatchOutput(text=self._respond(request))
+        return outputs
+
+    def _respond(self, request: BatchRequest) -> str:
+        if self.responder is not None:
+            return self.responder(request)
+        if request.options.get("response_format", {}).get("type") == "json_object":
+            return '{"issues": [], "suggestions": []}'
+        return f"```\n# {self.name} batch response\n```\nGenerated by {self.name}."
+
+class BatchJobStore:
+    """Batch jobs by id, kept in Redis for BATCH_JOB_TTL so any worker can report on them.
+
+    The job record, re-saved on every poll, holds only metadata; the files'
+    code is written once to a separate Redis hash, field per file index, and
+    read back file by file for the results. Without Redis, or when it
+    errors, in-process dicts are used.
+    """
+
+    CODE_WRITE_BATCH = 100  # files per HSET command
+
+    def __init__(self, redis_client=None):
+        self.redis = redis_client
+        self.local: Dict[str, Dict] = {}
+        self.local_code: Dict[str, List[str]] = {}
+
+    @staticmethod
+    def key(job_id: str) -> str:
+        return f"acp:batch-job:{job_id}"
+
+    @staticmethod
+    def code_key(job_id: str) -> str:
+        return f"acp:batch-job:{job_id}:code"
+
+    async def save_code(self, job_id: str, codes: List[str]):
+        if self.redis is not None and codes:
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for start in range(0, len(codes), self.CODE_WRITE_BATCH):
+                        pipe.hset(self.code_key(job_id), mapping={
+                            str(index): code for index, code in enumerate(codes[start:start + self.CODE_WRITE_BATCH], start)
+                        })
+                    pipe.expire(self.code_key(job_id), settings.BATCH_JOB_TTL)
+                    await pipe.execute()
+                return
+            except (RedisError, OSError):
+                metrics.increment("batch_job_store_errors")
+        self.local_code[job_id] = list(codes)
+
+    async def load_code(self, job_id: str, index: int) -> Optional[str]:
+        if self.redis is not None:
+            try:
+                stored = await self.redis.hget(self.code_key(job_id), str(index))
+                if stored is not None:
+                    return stored.decode("utf8") if isinstance(stored, bytes) else stored
+            except (RedisError, OSError):
+                metrics.increment("batch_job_store_errors")
+        codes = self.local_code.get(job_id)
+        return codes[index] if codes is not None and index < len(codes) else None
+
+    async def load(self, job_id: str) -> Optional[Dict]:
+        if self.redis is not None:
+            try:
+                stored = await self.redis.get(self.key(job_id))
+                if stored is not None:
+                    return json.loads(stored)
+            except (RedisError, OSError):
+                metrics.increment("batch_job_store_errors")
+        return self.local.get(job_id)
+
+    async def save(self, job: Dict):
+        if self.redis is not None:
+            try:
+                await self.redis.set(self.key(job["id"]), json.dumps(job), ex=settings.BATCH_JOB_TTL)
+                return
+            except (RedisError, OSError):
+                metrics.increment("batch_job_store_errors")
+        self.local[job["id"]] = job
+
+class BatchJobService:
+    """Run reviews or unit test generation for many files through a provider batch API.
+
+    Each file's prompts are built exactly as for an interactive request
+    (including the model tier and max_tokens), tagged with
+    ``<file index>:<request index>`` and submitted in batches of at most
+    BATCH_MAX_REQUESTS requests and BATCH_MAX_BYTES of serialized input
+    (the provider limits both). Once every batch has finished, the outputs are
+    fanned back out into one CodeReviewResult or TestGenerationResult per
+    file; requests the provider did not complete are reported as failed AI
+    passes, as they would be interactively.
+    """
+
+    def __init__(self, reviewer: CodeReviewerService, test_generator: TestGeneratorService, backend,
+                 jobs: Optional[BatchJobStore] = None):
+        self.reviewer = reviewer
+        self.test_generator = test_generator
+        self.backend = backend
+        self.jobs = jobs or BatchJobStore()
+
+    async def submit(self, kind: str, files: List[Dict]) -> Dict:
+        """Build and submit the requests for files of {"path", "language", "code"}; returns the job summary"""
+        if kind not in BATCH_KINDS:
+            raise ValueError(f"kind must be one of {', '.join(BATCH_KINDS)}")
+        entries = []
+        requests: List[BatchRequest] = []
+        for index, file in enumerate(files):
+            file_requests = await asyncio.to_thread(self._requests, kind, file["code"], file["language"])
+            for number, request in enumerate(file_requests):
+                request.custom_id = f"{index}:{number}"
+            requests.extend(file_requests)
+            entries.append({"path": file["path"], "language": file["language"], "requests": len(file_requests)})
+
+        batches = []
+        for batch_requests in self._split(requests):
+            batch_id = await self.backend.submit(batch_requests)
+            batches.append({"id": batch_id, "status": "submitted", "counts": {}})
+        job_id = uuid.uuid4().hex
+        await self.jobs.save_code(job_id, [file["code"] for file in files])
+        job = {
+            "id": job_id,
+            "kind": kind,
+            "backend": self.backend.name,
+            "status": "completed" if not batches else "in_progress",
+            "created_at": time.time(),
+            "files": entries,
+            "batches": batches
+        }
+        await self.jobs.save(job)
+        metrics.increment("batch_jobs_submitted", labels={"kind": kind})
+        metrics.increment("batch_requests_submitted", len(requests), labels={"kind": kind})
+        return self.summary(job)
+
+    async def refresh(self, job_id: str) -> Optional[Dict]:
+        """Poll the provider for the job's unfinished batches; None for an unknown or expired job"""
+        job = await self.jobs.load(job_id)
+        if job is None:
+            return None
+        pending = [batch for batch in job["batches"] if batch["status"] not in TERMINAL_STATUSES]
+        if pending:
+            for batch, status in zip(pending, await asyncio.gather(*(self.backend.status(b["id"]) for b in pending))):
+                batch.update(status)
+            if all(batch["status"] in TERMINAL_STATUSES for batch in job["batches"]):
+                job["status"] = "completed"
+                metrics.increment("batch_jobs_completed", labels={"kind": job["kind"]})
+            await self.jobs.save(job)
+        return self.summary(job)
+
+    async def results(self, job: Dict) -> AsyncIterator[Dict]:
+        """Yield one event per file of a completed job, then totals"""
+        outputs: Dict[str, BatchOutput] = {}
+        for batch in job["batches"]:
+            outputs.update(await self.backend.results(batch["id"]))
+
+        failed = 0
+        for index, file in enumerate(job["files"]):
+            file_outputs = [
+                outputs.get(f"{index}:{number}") or BatchOutput(error="not completed by the batch")
+                for number in range(file["requests"])
+            ]
+            failed += sum(1 for output in file_outputs if output.text is None)
+            code = await self.jobs.load_code(job["id"], index)
+            if code is None:
+                yield {"event": "file", "path": file["path"], "language": file["language"],
+                       "error": "The file's code has expired"}
+                continue
+            yield {"event": "file", "path": file["path"], "language": file["language"],
+                   "result": await self._result(job["kind"], code, file["language"], file_outputs)}
+        yield {"event": "complete", "files": len(job["files"]), "failed_requests": failed}
+
+    def summary(self, job: Dict) -> Dict:
+        return {
+            "id": job["id"],
+            "kind": job["kind"],
+            "backend": job["backend"],
+            "status": job["status"],
+            "created_at": job["created_at"],
+            "files": len(job["files"]),
+            "requests": sum(file["requests"] for file in job["files"]),
+            "batches": job["batches"]
+        }
+
+    def _requests(self, kind: str, code: str, language: str) -> List[BatchRequest]:
+        if kind == "review":
+            return self.reviewer.batch_requests(code, language)
+        return [self.test_generator.batch_request(code, language)]
+
+    def _split(self, requests: List[BatchRequest]) -> List[List[BatchRequest]]:
+        """Group requests into provider batches within the request count and byte limits"""
+        batches: List[List[BatchRequest]] = []
+        size = 0
+        for request in requests:
+            request_size = self.backend.request_size(request)
+            if not batches or len(batches[-1]) >= settings.BATCH_MAX_REQUESTS or size + request_size > settings.BATCH_MAX_BYTES:
+                batches.append([])
+                size = 0
+            batches[-1].append(request)
+            size += request_size
+        return batches
+
+    async def _result(self, kind: str, code: str, language: str, outputs: List[BatchOutput]) -> Dict:
+        if kind == "tests":
+            return asdict(await self.test_generator.tests_from_batch(code, language, outputs[0]))
+        # Static analysis is CPU-bound; keep it off the event loop as interactive reviews of large files do
+        result = await asyncio.to_thread(self.reviewer.review_from_batch, code, language, outputs)
+        return {
+            "issues": [issue_to_dict(issue) for issue in result.issues],
+            "suggestions": result.suggestions,
+            "quality_score": result.quality_score,
+            "security_analysis": result.security_analysis,
+            "performance_analysis": result.performance_analysis,
+            "maintainability_score": result.maintainability_score,
+            "windows": result.windows
+        }
+
+_job_store: Optional[BatchJobStore] = None
+
+def get_batch_job_store() -> BatchJobStore:
+    """Return the process-wide batch job store"""
+    global _job_store
+    if _job_store is None:
+        redis_client = aioredis.from_url(settings.REDIS_URL) if aioredis is not None and settings.REDIS_URL else None
+        _job_store = BatchJobStore(redis_client)
+    return _job_store
+
+def create_batch_backend(openai_client=None):
+    """The batch backend named by BATCH_BACKEND ("openai" or the "local" stand-in)"""
+    if settings.BATCH_BACKEND == "local":
+        return LocalBatchBackend(completion_delay=settings.BATCH_LOCAL_DELAY)
+    return OpenAIBatchBackend(openai_client)
@@ -1,12 +1,20 @@
 import asyncio
+import hashlib
+import os
 from typing import Dict, List, Optional
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass
 import openai
 import anthropic
 from tree_sitter import Language, Parser
 import tree_sitter_python as tspython
 
 from core.config import settings
+from core.metrics import metrics
+from services.code_index import CodeIndex
+from services.embeddings import OpenAIEmbedder
+from services.semantic_cache import SemanticCache
+from services.llm_providers import AnthropicProvider, CompletionResult, OpenAIProvider
+from services.provider_router import ProviderRouter, ProviderUnavailableError
 
 @dataclass
 class CodeGenerationResult:
@@ -66,120 +74,152 @@ class ContextAnalyzer:
                 return child.text.decode()
         return None
 
+# Confidence and follow-up suggestions reported for each provider
+PROVIDER_PROFILES = {
+    "openai": (0.9, ["Consider adding unit tests", "Review error handling"]),
+    "anthropic": (0.85, ["Validate input parameters", "Add logging"]),
+}
+
 class CodeGeneratorService:
     def __init__(self):
         self.openai_client = openai.AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
         self.anthropic_client = anthropic.AsyncAnthropic(api_key=settings.ANTHROPIC_API_KEY)
         self.context_analyzer = ContextAnalyzer()
+        self.router = ProviderRouter([
+            OpenAIProvider(self.openai_client),
+            AnthropicProvider(self.anthropic_client)
+        ])
+        self.semantic_cache = None
+        if settings.SEMANTIC_CACHE_ENABLED:
+            embedder = OpenAIEmbedder(self.openai_client) if settings.SEMANTIC_CACHE_EMBEDDER == "openai" else None
+            self.semantic_cache = SemanticCache(embedder=embedder)
+            metrics.register_collector("semantic_cache", self.semantic_cache.stats)
+        self.code_indexes: Dict[str, CodeIndex] = {}
     
     async def generate_code(
         self,
         description: str,
         language: str,
         context: Optional[Dict] = None,
-        project_structure: Optional[Dict[str, str]] = None
+        project_structure: Optional[Dict[str, str]] = None,
+        latency_critical: bool = False,
+        project_id: Optional[str] = None
     ) -> CodeGenerationResult:
         """Generate code from natural language with context awareness"""
         
+        # Serve near-duplicate requests from the semantic cache; context-specific requests bypass it
+        lookup = None
+        if self.semantic_cache is not None and not context and not project_structure and not project_id:
+            lookup = await self.semantic_cache.lookup(description, language)
+            if lookup.payload is not None:
+                return CodeGenerationResult(**lookup.payload)
+        
         # Analyze project context if provided
         project_context = {}
         if project_structure:
             project_context = self.context_analyzer.analyze_project_structure(project_structure)
         
+        # Retrieve only the code chunks relevant to the request
+        if project_structure or project_id:
+            index = self._get_code_index(project_id) if project_id else CodeIndex()
+            if project_structure:
+                await index.update(project_structure)
+            project_context["relevant_code"] = await index.search(description, top_k=settings.CODE_INDEX_TOP_K)
+        
         # Build context-aware prompt
-        prompt = self._build_generation_prompt(description, language, context, project_context)
+        prefix, prompt = self._build_generation_prompt(description, language, context, project_context)
         
-        # Generate code using AI model
-        if language in ["python", "javascript", "typescript"]:
-            result = await self._generate_with_openai(prompt, language)
-        else:
-            result = await self._generate_with_anthropic(prompt, language)
+        # Generate code using the fastest healthy provider; the language only sets the tie-break preference
+        preferred = "openai" if language in ["python", "javascript", "typescript"] else "anthropic"
+        try:
+            completion = await self.router.complete(
+                system=f"You are an expert {language} developer. Generate high-quality, production-ready code.",
+                prompt=prompt,
+                prefix=prefix,
+                temperature=0.2,
+                max_tokens=2000,
+                preferred=preferred,
+                hedge=latency_critical
+            )
+        except ProviderUnavailableError as e:
+            raise Exception("; ".join(
+                f"{provider.label} generation failed: {str(error)}" for provider, error in e.errors
+            ))
+        
+        result = self._build_result(completion, language)
+        if lookup is not None:
+            await self.semantic_cache.store(description, language, asdict(result), lookup.vector)
         
         return result
     
-    def _build_generation_prompt(self, description: str, language: str, context: Dict, project_context: Dict) -> str:
-        """Build context-aware prompt for code generation"""
-        prompt = f"""Generate {language} code for the following requirement:
+    async def index_project(self, project_id: str, files: Dict[str, str], prune: bool = False) -> Dict:
+        """Incrementally index project files so later requests only need the project_id"""
+        return await self._get_code_index(project_id).update(files, prune=prune)
+    
+    def _get_code_index(self, project_id: str) -> CodeIndex:
+        if project_id not in self.code_indexes:
+            directory = None
+            if settings.CODE_INDEX_DIR:
+                directory = os.path.join(settings.CODE_INDEX_DIR, hashlib.sha256(project_id.encode("utf8")).hexdigest()[:32])
+            self.code_indexes[project_id] = CodeIndex(directory)
+        return self.code_indexes[project_id]
+    
+    def _build_generation_prompt(self, description: str, language: str, context: Dict, project_context: Dict) -> tuple[str, str]:
+        """Build a context-aware prompt as a (stable prefix, variable suffix) pair.
+        
+        Rules and project structure come first so repeated requests against the
+        same project share a prefix the providers can serve from their prompt
+        cache; retrieved code and the requirement itself follow.
+        """
+        prefix = f"""Generate {language} code for the requirement given at the end of this message.
+
+REQUIREMENTS:
+1. Generate clean, production-ready {language} code
+2. Follow best practices and coding standards
+3. Include proper error handling
+4. Add meaningful comments
+5. Ensure code is testable and maintainable
+6. Use existing project patterns when applicable
 
-REQUIREMENT: {description}
+Provide the code with a brief explanation of the implementation approach.
 
-CONTEXT:
+PROJECT CONTEXT:
 """
         
         if project_context.get("imports"):
-            prompt += f"Existing imports: {', '.join(project_context['imports'][:5])}\n"
+            prefix += f"Existing imports: {', '.join(project_context['imports'][:5])}\n"
         
         if project_context.get("classes"):
-            prompt += f"Existing classes: {', '.join(project_context['classes'][:5])}\n"
+            prefix += f"Existing classes: {', '.join(project_context['classes'][:5])}\n"
         
         if project_context.get("functions"):
-            prompt += f"Existing functions: {', '.join(project_context['functions'][:5])}\n"
+            prefix += f"Existing functions: {', '.join(project_context['functions'][:5])}\n"
+        
+        prompt = ""
+        for chunk in project_context.get("relevant_code", []):
+            prompt += f"\nRelevant code from {chunk['path']} (lines {chunk['start_line']}-{chunk['end_line']}):\n```{language}\n{chunk['text']}\n```\n"
         
         if context:
-            prompt += f"Additional context: {context}\n"
+            prompt += f"\nAdditional context: {context}\n"
         
-        prompt += f"""
-REQUIREMENTS:
-1. Generate clean, production-ready {language} code
-2. Follow best practices and coding standards
-3. Include proper error handling
-4. Add meaningful comments
-5. Ensure code is testable and maintainable
-6. Use existing project patterns when applicable
-
-Provide the code with a brief explanation of the implementation approach.
-"""
+        prompt += f"\nREQUIREMENT: {description}\n"
         
-        return prompt
-    
-    async def _generate_with_openai(self, prompt: str, language: str) -> CodeGenerationResult:
-        """Generate code using OpenAI GPT-4"""
-        try:
-            response = await self.openai_client.chat.completions.create(
-                model="gpt-4-turbo-preview",
-                messages=[
-                    {"role": "system", "content": f"You are an expert {language} developer. Generate high-quality, production-ready code."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.2,
-                max_tokens=2000
-            )
-            
-            content = response.choices[0].message.content
-            code, explanation = self._parse_ai_response(content)
-            
-            return CodeGenerationResult(
-                code=code,
-                explanation=explanation,
-                language=language,
-                confidence=0.9,
-                suggestions=["Consider adding unit tests", "Review error handling"]
-            )
-        except Exception as e:
-            raise Exception(f"OpenAI generation failed: {str(e)}")
+        return prefix, prompt
     
-    async def _generate_with_anthropic(self, prompt: str, language: str) -> CodeGenerationResult:
-        """Generate code using Anthropic Claude"""
-        try:
-            response = await self.anthropic_client.messages.create(
-                model="claude-3-sonnet-20240229",
-                max_tokens=2000,
-                temperature=0.2,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            
-            content = response.content[0].text
-            code, explanation = self._parse_ai_response(content)
-            
-            return CodeGenerationResult(
-                code=code,
-                explanation=explanation,
-                language=language,
-                confidence=0.85,
-                suggestions=["Validate input parameters", "Add logging"]
-            )
-        except Exception as e:
-            raise Exception(f"Anthropic generation failed: {str(e)}")
+    def _build_result(self, completion: CompletionResult, language: str) -> CodeGenerationResult:
+        """Turn a provider completion into a CodeGenerationResult"""
+        code, explanation = self._parse_ai_response(completion.text)
+        confidence, suggestions = PROVIDER_PROFILES.get(
+            completion.provider, (0.8, ["Review the generated code", "Add unit tests"])
+        )
+        
+        return CodeGenerationResult(
+            code=code,
+            explanation=explanation,
+            language=language,
+            confidence=confidence,
+            suggestions=list(suggestions)
+        )
     
     def _parse_ai_response(self, content: str) -> tuple[str, str]:
         """Parse AI response to extract code and explanation"""
@@ -0,0 +1,328 @@
+import asyncio
+import hashlib
+import heapq
+import json
+import os
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from core.config import settings
+from services.embeddings import Embedder, HashingEmbedder
+from services.parsers import get_parser, language_for_path
+
+# Node types that delimit a chunk, per grammar. Files in other languages, or whose
+# grammar is not installed (see parsers.GRAMMAR_MODULES), are split into fixed-size
+# line windows instead, as are files in which no such node is found.
+CHUNK_NODE_TYPES = {
+    "python": {"function_definition", "class_definition", "decorated_definition"},
+    "javascript": {"function_declaration", "class_declaration", "method_definition", "lexical_declaration", "export_statement"},
+    "typescript": {
+        "function_declaration", "class_declaration", "abstract_class_declaration", "interface_declaration",
+        "enum_declaration", "type_alias_declaration", "method_definition", "lexical_declaration", "export_statement"
+    },
+    "java": {"class_declaration", "interface_declaration", "enum_declaration", "method_declaration", "constructor_declaration"},
+    "go": {"function_declaration", "method_declaration", "type_declaration"},
+    "rust": {"function_item", "struct_item", "enum_item", "trait_item", "impl_item"},
+    "cpp": {"function_definition", "class_specifier", "struct_specifier", "template_declaration"},
+    "csharp": {
+        "class_declaration", "interface_declaration", "struct_declaration", "record_declaration", "enum_declaration",
+        "method_declaration", "constructor_declaration"
+    },
+    "php": {"function_definition", "class_declaration", "interface_declaration", "trait_declaration", "enum_declaration", "method_declaration"},
+}
+
+CONTAINER_NODE_TYPES = {
+    "class_definition", "class_declaration", "abstract_class_declaration", "interface_declaration", "enum_declaration",
+    "decorated_definition", "export_statement", "class_specifier", "struct_specifier", "struct_declaration",
+    "record_declaration", "trait_item", "impl_item", "trait_declaration"
+}
+
+# Scopes that only group definitions; their members are always chunked separately
+NAMESPACE_NODE_TYPES = {"namespace_definition", "namespace_declaration", "file_scoped_namespace_declaration", "mod_item"}
+
+@dataclass
+class CodeChunk:
+    path: str
+    symbol: str
+    start_line: int
+    end_line: int
+    text: str
+
+class CodeChunker:
+    """Split source files into function/class chunks using tree-sitter spans"""
+
+    def __init__(self, max_lines: Optional[int] = None, window_lines: int = 60):
+        self.max_lines = max_lines or settings.CODE_INDEX_MAX_CHUNK_LINES
+        self.window_lines = window_lines
+
+    def chunk(self, path: str, content: str, language: Optional[str] = None) -> List[CodeChunk]:
+        language = language or language_for_path(path)
+        parser = get_parser(language) if language in CHUNK_NODE_TYPES else None
+        if parser is None:
+            return self._windows(path, content.split('\n'), 0)
+
+        data = content.encode("utf8")
+        tree = parser.parse(data)
+        chunks = []
+        self._collect(tree.root_node, data, path, CHUNK_NODE_TYPES[language], chunks)
+        return chunks or self._windows(path, content.split('\n'), 0)
+
+    def _collect(self, node, data: bytes, path: str, node_types, chunks: List[CodeChunk]):
+        for child in node.children:
+            if child.type in NAMESPACE_NODE_TYPES:
+                self._collect(child.child_by_field_name("body") or child, data, path, node_types, chunks)
+                continue
+            if child.type not in node_types:
+                continue
+            start, end = child.start_point[0], child.end_point[0]
+            too_large = end - start + 1 > self.max_lines
+            if too_large and child.type in CONTAINER_NODE_TYPES:
+                # Index the members of a large class separately, keeping its header
+                before = len(chunks)
+                body = child.child_by_field_name("body") or child.child_by_field_name("definition") or child.child_by_field_name("declaration")
+                if body is not None:
+                    self._collect(body, data, path, node_types, chunks)
+                if len(chunks) > before:
+                    header = data[child.start_byte:body.start_byte].decode("utf8", "replace")
+                    chunks.insert(before, CodeChunk(path, self._symbol(child), start + 1, body.start_point[0] + 1, header))
+                    continue
+            text = data[child.start_byte:child.end_byte].decode("utf8", "replace")
+            if too_large:
+                chunks.extend(self._windows(path, text.split('\n'), start, self._symbol(child)))
+            else:
+                chunks.append(CodeChunk(path, self._symbol(child), start + 1, end + 1, text))
+
+    def _windows(self, path: str, lines: List[str], offset: int, symbol: str = "") -> List[CodeChunk]:
+        """Fixed-size line windows for unparsed files and oversized symbols"""
+        chunks = []
+        for start in range(0, len(lines), self.window_lines):
+            window = lines[start:start + self.window_lines]
+            if any(line.strip() for line in window):
+                chunks.append(CodeChunk(path, symbol, offset + start + 1, offset + start + len(window), '\n'.join(window)))
+        return chunks
+
+    def _symbol(self, node) -> str:
+        name = self._name(node)
+        if name is None:
+            for child in node.named_children:
+                name = self._name(child)
+                if name is not None:
+                    break
+        return name.text.decode("utf8", "replace") if name is not None else ""
+
+    def _name(self, node):
+        """The node naming a definition: its name field, innermost declarator (C++) or implemented type (Rust)"""
+        name = node.child_by_field_name("name")
+        if name is None and node.child_by_field_name("declarator") is not None:
+            name = node.child_by_field_name("declarator")
+            while name.child_by_field_name("declarator") is not None:
+                name = name.child_by_field_name("declarator")
+        if name is None and node.type == "impl_item":
+            name = node.child_by_field_name("type")
+        return name
+
+class CodeIndex:
+    """Incremental vector index of code chunks.
+
+    Vectors live in a memory-mapped float32 matrix (or an in-memory array when
+    no directory is given); chunk metadata and per-file content hashes are kept
+    alongside so unchanged files are never re-embedded.
+
+    Metadata is persisted as an append-only log with one record per indexed
+    or removed file, so an update writes only the files it changed. The log
+    is compacted to one record per file once superseded records outnumber
+    the live ones. Chunking and embedding run in worker threads.
+    """
+
+    LOG_NAME = "index.log"
+    COMPACT_MIN_RECORDS = 256
+
+    def __init__(self, directory: Optional[str] = None, embedder: Optional[Embedder] = None, chunker: Optional[CodeChunker] = None):
+        self.directory = directory
+        self.embedder = embedder or HashingEmbedder(settings.SEMANTIC_CACHE_DIM)
+        self.chunker = chunker or CodeChunker()
+        self.dim = self.embedder.dim
+        self.chunks: List[Optional[Dict]] = []
+        self.files: Dict[str, Dict] = {}
+        self._free: List[int] = []
+        self.vectors = None
+        self._log_records = 0
+        self._logged_capacity = 0
+        self._update_lock = asyncio.Lock()
+
+        if directory and os.path.exists(self._path(self.LOG_NAME)):
+            self._load()
+        else:
+            self.vectors = self._allocate(1024)
+
+    @property
+    def size(self) -> int:
+        return len(self.chunks) - len(self._free)
+
+    async def update(self, files: Dict[str, str], prune: bool = False) -> Dict:
+        """Re-index changed files; unchanged content hashes are skipped"""
+        # Serialised, since concurrent updates interleaving at their awaits would index a file twice
+        async with self._update_lock:
+            changed = {}
+            for path, content in files.items():
+                digest = hashlib.sha256(content.encode("utf8")).hexdigest()
+                if self.files.get(path, {}).get("hash") != digest:
+                    changed[path] = (digest, content)
+
+            # Parsing is CPU-bound, so it runs off the event loop
+            pending = await asyncio.to_thread(self._chunk_files, changed)
+
+            removed = [path for path in self.files if path not in files] if prune else []
+            for path in removed:
+                self.remove_file(path)
+
+            for path, (digest, _) in changed.items():
+                self.remove_file(path)
+                self.files[path] = {"hash": digest, "slots": []}
+
+            batch_size = settings.CODE_INDEX_EMBED_BATCH
+            for start in range(0, len(pending), batch_size):
+                batch = pending[start:start + batch_size]
+                texts = [self._embedding_text(chunk) for chunk in batch]
+                vectors = await self._embed(texts)
+                for chunk, vector in zip(batch, vectors):
+                    self.files[chunk.path]["slots"].append(self._add(chunk, vector))
+
+            if self.directory:
+                records = [{"path": path, "removed": True} for path in removed]
+                records.extend(self._file_record(path) for path in changed)
+                self._append_log(records)
+            return {"changed_files": len(changed), "removed_files": len(removed), "chunks_indexed": len(pending), "total_chunks": self.size}
+
+    def remove_file(self, path: str):
+        for slot in self.files.pop(path, {}).get("slots", []):
+            self.chunks[slot] = None
+            self.vectors[slot] = 0.0
+            self._free.append(slot)
+
+    async def search(self, query: str, top_k: int = 5, block_size: int = 16384) -> List[Dict]:
+        """Return the top_k chunks most similar to the query"""
+        if self.size == 0:
+            return []
+        query_vector = (await self.embedder.embed([query]))[0]
+        best = []
+
+        # Scan the (possibly memory-mapped) matrix block by block
+        for start in range(0, len(self.chunks), block_size):
+            scores = np.asarray(self.vectors[start:min(start + block_size, len(self.chunks))]) @ query_vector
+            count = min(top_k, len(scores))
+            for offset in np.argpartition(-scores, count - 1)[:count]:
+                slot = start + int(offset)
+                # Removed slots are zeroed, so they never score above zero
+                if scores[offset] <= 0 or self.chunks[slot] is None:
+                    continue
+                item = (float(scores[offset]), -slot)
+                if len(best) < top_k:
+                    heapq.heappush(best, item)
+                else:
+                    heapq.heappushpop(best, item)
+
+        return [{**self.chunks[-negative_slot], "score": score} for score, negative_slot in sorted(best, reverse=True)]
+
+    def save(self):
+        """Flush vectors and rewrite the metadata log with one record per file"""
+        os.makedirs(self.directory, exist_ok=True)
+        if isinstance(self.vectors, np.memmap):
+            self.vectors.flush()
+        records = [self._capacity_record()] + [self._file_record(path) for path in self.files]
+        temporary = self._path(self.LOG_NAME + ".tmp")
+        with open(temporary, "w") as f:
+            f.writelines(json.dumps(record) + "\n" for record in records)
+        os.replace(temporary, self._path(self.LOG_NAME))
+        self._log_records = len(records)
+
+    def _chunk_files(self, changed: Dict[str, Tuple[str, str]]) -> List[CodeChunk]:
+        return [chunk for path, (_, content) in changed.items() for chunk in self.chunker.chunk(path, content)]
+
+    async def _embed(self, texts: List[str]) -> np.ndarray:
+        # The offline embedder is CPU-bound; remote embedders already yield while waiting
+        if isinstance(self.embedder, HashingEmbedder):
+            return await asyncio.to_thread(self.embedder.embed_sync, texts)
+        return await self.embedder.embed(texts)
+
+    def _append_log(self, records: List[Dict]):
+        """Append file records, after the vectors they point at are on disk"""
+        if not records:
+            return
+        if isinstance(self.vectors, np.memmap):
+            self.vectors.flush()
+        if len(self.vectors) != self._logged_capacity:
+            records.insert(0, self._capacity_record())
+        with open(self._path(self.LOG_NAME), "a") as f:
+            f.writelines(json.dumps(record) + "\n" for record in records)
+        self._log_records += len(records)
+        if self._log_records > max(self.COMPACT_MIN_RECORDS, 2 * (len(self.files) + 1)):
+            self.save()
+
+    def _capacity_record(self) -> Dict:
+        self._logged_capacity = len(self.vectors)
+        return {"dim": self.dim, "capacity": len(self.vectors)}
+
+    def _file_record(self, path: str) -> Dict:
+        slots = self.files[path]["slots"]
+        return {"path": path, "hash": self.files[path]["hash"], "slots": slots, "chunks": [self.chunks[slot] for slot in slots]}
+
+    def _add(self, chunk: CodeChunk, vector: np.ndarray) -> int:
+        if self._free:
+            slot = self._free.pop()
+            self.chunks[slot] = asdict(chunk)
+        else:
+            slot = len(self.chunks)
+            if slot == len(self.vectors):
+                self.vectors = self._allocate(len(self.vectors) * 2)
+            self.chunks.append(asdict(chunk))
+        self.vectors[slot] = vector
+        return slot
+
+    def _allocate(self, capacity: int):
+        """Create (or grow) vector storage, memory-mapped when a directory is set"""
+        if not self.directory:
+            vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+            if self.vectors is not None:
+                vectors[:len(self.vectors)] = self.vectors
+            return vectors
+
+        os.makedirs(self.directory, exist_ok=True)
+        if isinstance(self.vectors, np.memmap):
+            self.vectors.flush()
+        with open(self._path("vectors.f32"), "ab") as f:
+            f.truncate(capacity * self.dim * 4)
+        return np.memmap(self._path("vectors.f32"), dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def _load(self):
+        """Replay the metadata log; a record cut short by a crash ends it"""
+        capacity = dim = 0
+        with open(self._path(self.LOG_NAME)) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                self._log_records += 1
+                if "capacity" in record:
+                    capacity, dim = record["capacity"], record["dim"]
+                    continue
+                for slot in self.files.pop(record["path"], {}).get("slots", []):
+                    self.chunks[slot] = None
+                if record.get("removed"):
+                    continue
+                self.files[record["path"]] = {"hash": record["hash"], "slots": record["slots"]}
+                for slot, chunk in zip(record["slots"], record["chunks"]):
+                    self.chunks.extend([None] * (slot + 1 - len(self.chunks)))
+                    self.chunks[slot] = chunk
+        self._free = [slot for slot, chunk in enumerate(self.chunks) if chunk is None]
+        self._logged_capacity = capacity
+        self.vectors = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode="r+", shape=(capacity, dim))
+
+    def _embedding_text(self, chunk: CodeChunk) -> str:
+        return f"{chunk.path} {chunk.symbol}\n{chunk.text}"
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
@@ -1,12 +1,24 @@
 import ast
 import re
+import json
 import asyncio
-from typing import Dict, List, Optional, Tuple
+import heapq
+import io
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Union
 from dataclasses import dataclass
 from enum import Enum
 import openai
 
 from core.config import settings
+from core.request_context import annotate_request
+from services.llm_providers import BatchOutput, BatchRequest, OpenAIProvider
+from services.model_tiers import ComplexityProfile, get_model_tier_policy
+from services.parsers import get_language, get_parser
+from services.result_cache import ResultCache
+from services.source import SourceDocument
+from services.triage import ReviewTriage
+from services.windowing import iter_windows
+from services.rule_packs import RULE_PACKS, RULES
 
 class IssueSeverity(Enum):
     LOW = "low"
@@ -22,7 +34,8 @@ class IssueCategory(Enum):
     STYLE = "style"
     BEST_PRACTICE = "best_practice"
 
-@dataclass
+# Slotted: a large file can produce thousands of issues per review
+@dataclass(slots=True)
 class CodeIssue:
     line_number: int
     severity: IssueSeverity
@@ -32,7 +45,57 @@ class CodeIssue:
     suggestion: str
     code_snippet: str
 
-@dataclass
+def issue_to_dict(issue: CodeIssue) -> Dict:
+    """JSON-friendly form of a CodeIssue"""
+    return {
+        "line_number": issue.line_number,
+        "severity": issue.severity.value,
+        "category": issue.category.value,
+        "title": issue.title,
+        "description": issue.description,
+        "suggestion": issue.suggestion,
+        "code_snippet": issue.code_snippet
+    }
+
+def issue_from_dict(data: Dict) -> CodeIssue:
+    """CodeIssue from its issue_to_dict form"""
+    return CodeIssue(
+        line_number=data["line_number"],
+        severity=IssueSeverity(data["severity"]),
+        category=IssueCategory(data["category"]),
+        title=data["title"],
+        description=data["description"],
+        suggestion=data["suggestion"],
+        code_snippet=data["code_snippet"]
+    )
+
+# Issue fields whose values repeat across a review and are dictionary-encoded in columnar form
+DICTIONARY_FIELDS = ("severity", "category", "title", "description", "suggestion")
+
+def issues_to_columns(issues: List[CodeIssue]) -> Dict:
+    """Column-oriented form of an issue list for large reviews.
+
+    Each repeated string field is sent once per distinct value in
+    ``dictionaries`` and as integer codes in ``columns``.
+    """
+    columns = {
+        "line_number": [issue.line_number for issue in issues],
+        "code_snippet": [issue.code_snippet for issue in issues]
+    }
+    dictionaries = {}
+    for name in DICTIONARY_FIELDS:
+        codes: Dict[str, int] = {}
+        column = []
+        for issue in issues:
+            value = getattr(issue, name)
+            if isinstance(value, Enum):
+                value = value.value
+            column.append(codes.setdefault(value, len(codes)))
+        columns[name] = column
+        dictionaries[name] = list(codes)
+    return {"count": len(issues), "columns": columns, "dictionaries": dictionaries}
+
+@dataclass(slots=True)
 class SecurityFinding:
     vulnerability_type: str
     severity: IssueSeverity
@@ -40,7 +103,7 @@ class SecurityFinding:
     description: str
     remediation: str
 
-@dataclass
+@dataclass(slots=True)
 class CodeReviewResult:
     issues: List[CodeIssue]
     suggestions: List[str]
@@ -48,6 +111,8 @@ class CodeReviewResult:
     security_analysis: Dict
     performance_analysis: Dict
     maintainability_score: float
+    windows: Optional[Dict] = None  # large-file mode: window count and the line ranges given an AI review
+    partial: bool = False  # an AI review call failed, so the result is not cached anywhere
 
 class StaticAnalyzer:
     def __init__(self):
@@ -73,13 +138,14 @@ class StaticAnalyzer:
             ]
         }
     
-    def analyze_python_code(self, code: str) -> List[CodeIssue]:
+    def analyze_python_code(self, source: Union[str, SourceDocument]) -> List[CodeIssue]:
         """Perform static analysis on Python code"""
         issues = []
-        lines = code.split('\n')
+        doc = SourceDocument.of(source)
+        lines = doc.lines
         
         try:
-            tree = ast.parse(code)
+            tree = ast.parse(doc.data)
             issues.extend(self._analyze_ast(tree, lines))
         except SyntaxError as e:
             issues.append(CodeIssue(
@@ -89,17 +155,17 @@ class StaticAnalyzer:
                 title="Syntax Error",
                 description=f"Syntax error: {e.msg}",
                 suggestion="Fix the syntax error",
-                code_snippet=lines[e.lineno - 1] if e.lineno and e.lineno <= len(lines) else ""
+                code_snippet=doc.line(e.lineno or 0)
             ))
         
         # Security analysis
-        issues.extend(self._analyze_security(code, lines))
+        issues.extend(self._analyze_security(lines))
         
         # Performance analysis
-        issues.extend(self._analyze_performance(code, lines))
+        issues.extend(self._analyze_performance(lines))
         
         # Style analysis
-        issues.extend(self._analyze_style(code, lines))
+        issues.extend(self._analyze_style(lines))
         
         return issues
     
@@ -142,7 +208,7 @@ class StaticAnalyzer:
         
         return issues
     
-    def _analyze_security(self, code: str, lines: List[str]) -> List[CodeIssue]:
+    def _analyze_security(self, lines: List[str]) -> List[CodeIssue]:
         """Analyze code for security vulnerabilities"""
         issues = []
         
@@ -163,7 +229,7 @@ class StaticAnalyzer:
         
         return issues
     
-    def _analyze_performance(self, code: str, lines: List[str]) -> List[CodeIssue]:
+    def _analyze_performance(self, lines: List[str]) -> List[CodeIssue]:
         """Analyze code for performance issues"""
         issues = []
         
@@ -188,7 +254,7 @@ class StaticAnalyzer:
         
         return issues
     
-    def _analyze_style(self, code: str, lines: List[str]) -> List[CodeIssue]:
+    def _analyze_style(self, lines: List[str]) -> List[CodeIssue]:
         """Analyze code style issues"""
         issues = []
         
@@ -250,10 +316,234 @@ class StaticAnalyzer:
         }
         return suggestions.get(issue_type, "Consider optimizing this code section")
 
+class RuleEngine:
+    """Static rules for non-Python languages, expressed as tree-sitter queries.
+
+    Each rule pack is compiled once per grammar; a review is one parse and one
+    captures() pass over the tree.
+    """
+    
+    SQL_PATTERN = re.compile(r'\b(select\b.+\bfrom|insert\s+into|update\b.+\bset|delete\s+from)\b', re.IGNORECASE | re.DOTALL)
+    
+    def __init__(self, max_complexity: int = 10):
+        self.max_complexity = max_complexity
+        self.queries = {}
+        for language, source in RULE_PACKS.items():
+            grammar = get_language(language)
+            if grammar is not None:
+                self.queries[language] = grammar.query(source)
+    
+    def supports(self, language: str) -> bool:
+        return language in self.queries
+    
+    def analyze(self, source: Union[str, SourceDocument], language: str) -> List[CodeIssue]:
+        """Run the language's rule pack over the code"""
+        query = self.queries.get(language)
+        if query is None:
+            return []
+        
+        doc = SourceDocument.of(source)
+        tree = get_parser(language).parse(doc.data)
+        lines = doc.lines
+        issues = []
+        sql_lines = set()
+        # Open functions as [node, complexity]; captures are visited in document order
+        functions = []
+        
+        captures = sorted(query.captures(tree.root_node), key=lambda c: (c[0].start_byte, -c[0].end_byte))
+        for node, name in captures:
+            if name.startswith("_"):
+                continue
+            while functions and node.start_byte >= functions[-1][0].end_byte:
+                self._check_complexity(*functions.pop(), lines, issues)
+            
+            if name == "function":
+                functions.append([node, 1])
+            elif name == "branch":
+                if functions:
+                    functions[-1][1] += 1
+            elif name == "catch.body":
+                if node.named_child_count == 0:
+                    issues.append(self._issue(node, lines, IssueSeverity.MEDIUM, IssueCategory.BEST_PRACTICE,
+                        "Empty Catch Block", "Exception is caught and silently ignored",
+                        "Handle, log or rethrow the exception"))
+            elif name.startswith("sql."):
+                line = node.start_point[0]
+                if line not in sql_lines and self.SQL_PATTERN.search(node.text.decode("utf8", "replace")):
+                    sql_lines.add(line)
+                    issues.append(self._issue(node, lines, IssueSeverity.HIGH, IssueCategory.SECURITY,
+                        "Potential Sql Injection", "SQL query is built from dynamic string content",
+                        "Use parameterized queries or ORM methods"))
+            elif name.startswith("rule."):
+                severity, category, title, description, suggestion = RULES[name[5:]]
+                issues.append(self._issue(node, lines, IssueSeverity(severity), IssueCategory(category),
+                    title, description, suggestion))
+        
+        while functions:
+            self._check_complexity(*functions.pop(), lines, issues)
+        
+        return sorted(issues, key=lambda issue: issue.line_number)
+    
+    def _check_complexity(self, node, complexity: int, lines: List[str], issues: List[CodeIssue]):
+        if complexity > self.max_complexity:
+            name = node.child_by_field_name("name")
+            label = name.text.decode("utf8", "replace") if name is not None else "<anonymous>"
+            issues.append(self._issue(node, lines, IssueSeverity.MEDIUM, IssueCategory.MAINTAINABILITY,
+                "High Complexity Function", f"Function '{label}' has complexity {complexity}",
+                "Consider breaking down into smaller functions"))
+    
+    def _issue(self, node, lines: List[str], severity: IssueSeverity, category: IssueCategory,
+               title: str, description: str, suggestion: str) -> CodeIssue:
+        line = node.start_point[0]
+        return CodeIssue(
+            line_number=line + 1,
+            severity=severity,
+            category=category,
+            title=title,
+            description=description,
+            suggestion=suggestion,
+            code_snippet=lines[line] if line < len(lines) else ""
+        )
+
+REVIEW_RESPONSE_SCHEMA = """{
+  "issues": [
+    {
+      "line_number": <integer>,
+      "severity": "low" | "medium" | "high" | "critical",
+      "category": "bug" | "security" | "performance" | "maintainability" | "style" | "best_practice",
+      "title": <short string>,
+      "description": <string>,
+      "suggestion": <string>,
+      "code_snippet": <string>
+    }
+  ],
+  "suggestions": [<string>]
+}"""
+
+class StreamingIssueParser:
+    """Incrementally parse a JSON review response into CodeIssue objects.
+
+    Chunks are scanned once; each object in the top-level "issues" array is
+    decoded as soon as its closing brace arrives.
+    """
+    
+    def __init__(self, code: Union[str, SourceDocument] = ""):
+        self.code_lines = SourceDocument.of(code).lines if code else []
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = -1
+        self._last_string = None
+        self._issues_depth = None
+        self._object_start = -1
+    
+    def feed(self, chunk: str) -> List[CodeIssue]:
+        """Consume a chunk of the response and return newly completed issues"""
+        self._text += chunk
+        text = self._text
+        issues = []
+        
+        for i in range(self._pos, len(text)):
+            char = text[i]
+            
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_string = text[self._string_start + 1:i]
+                continue
+            
+            if char == '"':
+                self._in_string = True
+                self._string_start = i
+            elif char == '{':
+                if self._issues_depth is not None and self._depth == self._issues_depth:
+                    self._object_start = i
+                self._depth += 1
+            elif char == '}':
+                self._depth -= 1
+                if self._object_start >= 0 and self._depth == self._issues_depth:
+                    issue = self._decode_issue(text[self._object_start:i + 1])
+                    if issue:
+                        issues.append(issue)
+                    self._object_start = -1
+            elif char == '[':
+                if self._depth == 1 and self._last_string == "issues":
+                    self._issues_depth = 2
+                self._depth += 1
+            elif char == ']':
+                self._depth -= 1
+                if self._issues_depth is not None and self._depth == 1:
+                    self._issues_depth = None
+        
+        self._pos = len(text)
+        return issues
+    
+    def finish(self) -> Dict:
+        """Decode the complete response to collect the trailing suggestions"""
+        start = self._text.find('{')
+        end = self._text.rfind('}')
+        try:
+            data = json.loads(self._text[start:end + 1] if start >= 0 else self._text)
+        except json.JSONDecodeError:
+            return {"suggestions": ["AI review response was not valid JSON"]}
+        
+        suggestions = data.get("suggestions", []) if isinstance(data, dict) else []
+        return {"suggestions": [str(s) for s in suggestions if s]}
+    
+    def _decode_issue(self, raw: str) -> Optional[CodeIssue]:
+        """Convert a single JSON issue object into a CodeIssue"""
+        try:
+            data = json.loads(raw)
+        except json.JSONDecodeError:
+            return None
+        if not isinstance(data, dict):
+            return None
+        
+        try:
+            line_number = int(data.get("line_number") or 0)
+        except (TypeError, ValueError):
+            line_number = 0
+        
+        try:
+            severity = IssueSeverity(str(data.get("severity", "")).lower())
+        except ValueError:
+            severity = IssueSeverity.MEDIUM
+        
+        try:
+            category = IssueCategory(str(data.get("category", "")).lower())
+        except ValueError:
+            category = IssueCategory.BEST_PRACTICE
+        
+        code_snippet = data.get("code_snippet") or ""
+        if not code_snippet and 0 < line_number <= len(self.code_lines):
+            code_snippet = self.code_lines[line_number - 1].strip()
+        
+        return CodeIssue(
+            line_number=line_number,
+            severity=severity,
+            category=category,
+            title=data.get("title") or "AI Review Finding",
+            description=data.get("description") or "",
+            suggestion=data.get("suggestion") or "Review and address this finding",
+            code_snippet=code_snippet
+        )
+
 class CodeReviewerService:
-    def __init__(self):
+    def __init__(self, result_cache: Optional[ResultCache] = None):
         self.openai_client = openai.AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+        self.provider = OpenAIProvider(self.openai_client)
+        self.tiers = get_model_tier_policy()
         self.static_analyzer = StaticAnalyzer()
+        self.rule_engine = RuleEngine()
+        self.result_cache = result_cache
+        self.triage = ReviewTriage(result_cache)
     
     async def review_code(
         self,
@@ -263,20 +553,273 @@ class CodeReviewerService:
         standards: Optional[Dict] = None
     ) -> CodeReviewResult:
         """Perform comprehensive code review"""
+        # Shares stream_review's cache entries, so either endpoint answers a repeat of the other
+        cache_key = None
+        if self.result_cache is not None:
+            cache_key = ResultCache.key("review", self.provider.key, code, language, context, standards)
+            cached = await self.result_cache.get(cache_key)
+            if cached is not None:
+                annotate_request(cached=True)
+                return self._result_from_events(cached["events"])
         
-        # Static analysis
-        static_issues = []
-        if language == "python":
-            static_issues = self.static_analyzer.analyze_python_code(code)
+        doc = SourceDocument(code)
         
-        # AI-powered review
-        ai_review = await self._ai_code_review(code, language, context, standards)
+        # Static analysis
+        static_issues, ai_targets, windows = self._plan_review(doc, language)
+        
+        triage = await self._triage(doc, language, static_issues, context, standards)
+        if triage.skip_ai:
+            ai_issues = [issue_from_dict(issue) for issue in triage.issues]
+            result = self._build_review_result(static_issues + ai_issues, list(triage.suggestions), doc, windows)
+        else:
+            # AI-powered review
+            reviews = await asyncio.gather(*(
+                self._ai_code_review(target, language, context, standards, self._target_profile(offset, target, static_issues))
+                for offset, target in ai_targets
+            ))
+            
+            result = self._merge_ai_reviews(doc, static_issues, ai_targets, reviews, windows)
+            if any(review.get("failed") for review in reviews):
+                # Not remembered, so the next request retries the AI review
+                result.partial = True
+                return result
+            # The merged issue list starts with the static findings
+            ai_issues = result.issues[len(static_issues):]
+            await self.triage.remember(triage, doc, [issue_to_dict(issue) for issue in ai_issues], result.suggestions)
+        
+        if cache_key is not None:
+            events = [self._static_event(static_issues, doc, windows)]
+            events.extend({"event": "issue", "issue": issue_to_dict(issue)} for issue in ai_issues)
+            events.append(self._complete_event(result))
+            await self.result_cache.set(cache_key, {"events": events})
+        return result
+    
+    def batch_requests(
+        self,
+        code: str,
+        language: str,
+        context: Optional[Dict] = None,
+        standards: Optional[Dict] = None
+    ) -> List[BatchRequest]:
+        """The AI review of the code as provider batch requests, one per review target (see review_from_batch)"""
+        doc = SourceDocument(code)
+        static_issues, ai_targets, _ = self._plan_review(doc, language)
+        requests = []
+        for offset, target in ai_targets:
+            profile = self._target_profile(offset, target, static_issues)
+            options = self.tiers.call_options(self.provider, "review", profile, self.tiers.select(profile))
+            prefix, prompt = self._build_review_prompt(target.text, language, context, standards)
+            requests.append(BatchRequest(
+                custom_id=str(len(requests)),
+                system=self._review_system(language),
+                prompt=prompt,
+                prefix=prefix,
+                temperature=0.1,
+                max_tokens=options["max_tokens"],
+                model=options.get("model"),
+                options={"response_format": {"type": "json_object"}}
+            ))
+        return requests
+    
+    def review_from_batch(self, code: str, language: str, outputs: List[BatchOutput]) -> CodeReviewResult:
+        """Combine static analysis with the batch outputs for the requests from batch_requests, in the same order"""
+        doc = SourceDocument(code)
+        static_issues, ai_targets, windows = self._plan_review(doc, language)
+        reviews = [
+            self._parse_ai_review(output.text, target) if output.text is not None
+            else {"issues": [], "suggestions": [f"AI review failed: {output.error}"]}
+            for (_, target), output in zip(ai_targets, outputs)
+        ]
+        return self._merge_ai_reviews(doc, static_issues, ai_targets, reviews, windows)
+    
+    def _merge_ai_reviews(self, doc: SourceDocument, static_issues: List[CodeIssue], ai_targets: List[Tuple[int, SourceDocument]],
+                          reviews: List[Dict], windows: Optional[Dict]) -> CodeReviewResult:
+        """Move each target's AI findings onto file line numbers and score them with the static findings"""
+        all_issues = list(static_issues)
+        suggestions = []
+        for (offset, _), ai_review in zip(ai_targets, reviews):
+            for issue in ai_review.get("issues", []):
+                issue.line_number += offset
+                all_issues.append(issue)
+            suggestions.extend(s for s in ai_review.get("suggestions", []) if s not in suggestions)
         
-        # Combine results
-        all_issues = static_issues + ai_review.get("issues", [])
+        return self._build_review_result(all_issues, suggestions, doc, windows)
+    
+    def review_static(self, code: str, language: str) -> CodeReviewResult:
+        """Score the local analyzers' findings alone, without an AI pass (windowed for large files)"""
+        doc = SourceDocument(code)
+        static_issues, _, windows = self._plan_review(doc, language)
+        return self._build_review_result(static_issues, [], doc, windows)
+    
+    async def stream_review(
+        self,
+        code: str,
+        language: str,
+        context: Optional[Dict] = None,
+        standards: Optional[Dict] = None
+    ) -> AsyncIterator[Dict]:
+        """Yield review events: static findings first, AI findings as they arrive, then totals"""
+        cache_key = None
+        if self.result_cache is not None:
+            cache_key = ResultCache.key("review", self.provider.key, code, language, context, standards)
+            cached = await self.result_cache.get(cache_key)
+            if cached is not None:
+                annotate_request(cached=True)
+                for event in cached["events"]:
+                    yield event
+                return
+        
+        doc = SourceDocument(code)
+        static_issues, ai_targets, windows = self._plan_review(doc, language)
+        events = [self._static_event(static_issues, doc, windows)]
+        yield events[-1]
+        
+        ai_issues = []
+        suggestions = []
+        failed = False
+        triage = await self._triage(doc, language, static_issues, context, standards)
+        if triage.skip_ai:
+            ai_targets = []
+            suggestions = list(triage.suggestions)
+            for issue in triage.issues:
+                ai_issues.append(issue_from_dict(issue))
+                events.append({"event": "issue", "issue": issue})
+                yield events[-1]
+        try:
+            for offset, target in ai_targets:
+                parser = StreamingIssueParser(target)
+                profile = self._target_profile(offset, target, static_issues)
+                async for issue in self.stream_ai_review(target, language, context, standards, parser, profile):
+                    issue.line_number += offset
+                    ai_issues.append(issue)
+                    events.append({"event": "issue", "issue": issue_to_dict(issue)})
+                    yield events[-1]
+                suggestions.extend(s for s in parser.finish()["suggestions"] if s not in suggestions)
+        except Exception as e:
+            failed = True
+            suggestions.append(f"AI review failed: {str(e)}")
+        
+        result = self._build_review_result(static_issues + ai_issues, suggestions, doc, windows)
+        events.append(self._complete_event(result))
+        yield events[-1]
+        
+        # Failed reviews are not cached so the next request retries the AI review
+        if not failed:
+            await self.triage.remember(triage, doc, [issue_to_dict(issue) for issue in ai_issues], result.suggestions)
+        if cache_key is not None and not failed:
+            await self.result_cache.set(cache_key, {"events": events})
+    
+    def _static_event(self, static_issues: List[CodeIssue], doc: SourceDocument, windows: Optional[Dict]) -> Dict:
+        event = {
+            "event": "static",
+            "issues": [issue_to_dict(issue) for issue in static_issues],
+            "quality_score": self._calculate_quality_score(static_issues, doc)
+        }
+        if windows is not None:
+            event["windows"] = windows
+        return event
+    
+    def _complete_event(self, result: CodeReviewResult) -> Dict:
+        return {
+            "event": "complete",
+            "issue_count": len(result.issues),
+            "suggestions": result.suggestions,
+            "quality_score": result.quality_score,
+            "security_analysis": result.security_analysis,
+            "performance_analysis": result.performance_analysis,
+            "maintainability_score": result.maintainability_score
+        }
+    
+    def _result_from_events(self, events: List[Dict]) -> CodeReviewResult:
+        """Rebuild a review result from the events of a cached review"""
+        static, *found, complete = events
+        return CodeReviewResult(
+            issues=[issue_from_dict(issue) for issue in static["issues"]] + [issue_from_dict(event["issue"]) for event in found],
+            suggestions=complete["suggestions"],
+            quality_score=complete["quality_score"],
+            security_analysis=complete["security_analysis"],
+            performance_analysis=complete["performance_analysis"],
+            maintainability_score=complete["maintainability_score"],
+            windows=static.get("windows")
+        )
+    
+    async def _triage(self, doc: SourceDocument, language: str, static_issues: List[CodeIssue],
+                      context: Optional[Dict], standards: Optional[Dict]):
+        """Triage the AI review of static-analyzed code, reporting reuse of an earlier review as a cache hit"""
+        # Earlier reviews are only kept in the result cache, so only its users need the provider key
+        key_parts = (self.provider.key, context, standards) if self.result_cache is not None else ()
+        triage = await self.triage.check(doc, language, static_issues, *key_parts)
+        if triage.reason == "unchanged":
+            annotate_request(cached=True)
+        return triage
+    
+    def _plan_review(self, doc: SourceDocument, language: str) -> Tuple[List[CodeIssue], List[Tuple[int, SourceDocument]], Optional[Dict]]:
+        """Static findings, the (line offset, code) pairs to send for AI review, and the window summary.
+        
+        Files up to MAX_CODE_SIZE are reviewed whole; larger ones in windows.
+        """
+        if len(doc) <= settings.MAX_CODE_SIZE:
+            return self._static_analysis(doc, language), [(0, doc)], None
+        return self._windowed_static_analysis(doc, language)
+    
+    def _static_analysis(self, doc: SourceDocument, language: str) -> List[CodeIssue]:
+        """Run the fast, local analyzers"""
+        if language == "python":
+            return self.static_analyzer.analyze_python_code(doc)
+        return self.rule_engine.analyze(doc, language)
+    
+    def _windowed_static_analysis(self, doc: SourceDocument, language: str) -> Tuple[List[CodeIssue], List[Tuple[int, SourceDocument]], Dict]:
+        """Analyze a large file one window at a time and stitch the findings back onto file line numbers.
         
+        Only the current window and the few highest-priority candidates for
+        AI review are held at once.
+        """
+        issues = []
+        # Min-heap of (priority, -start_line, window), so the lowest priority is dropped first
+        candidates = []
+        count = 0
+        for window in iter_windows(io.StringIO(doc.text), language, settings.LARGE_FILE_WINDOW_BYTES):
+            count += 1
+            window_issues = self._static_analysis(window.document(), language)
+            if window.partial:
+                # Cutting mid-definition causes syntax errors that are not in the file
+                window_issues = [issue for issue in window_issues if issue.title != "Syntax Error"]
+            for issue in window_issues:
+                issue.line_number += window.line_offset
+            issues.extend(window_issues)
+            
+            priority = self._window_priority(window_issues)
+            if priority:
+                heapq.heappush(candidates, (priority, -window.start_line, window))
+                if len(candidates) > settings.LARGE_FILE_MAX_AI_WINDOWS:
+                    heapq.heappop(candidates)
+        
+        selected = sorted((window for _, _, window in candidates), key=lambda window: window.start_line)
+        summary = {
+            "count": count,
+            "ai_reviewed": [[window.start_line, window.end_line] for window in selected]
+        }
+        issues.sort(key=lambda issue: issue.line_number)
+        return issues, [(window.line_offset, window.document()) for window in selected], summary
+    
+    def _target_profile(self, offset: int, target: SourceDocument, static_issues: List[CodeIssue]) -> ComplexityProfile:
+        """Complexity of one AI review target, from the static findings on its lines"""
+        end = offset + target.line_count
+        return ComplexityProfile.from_static_issues(
+            target, [issue for issue in static_issues if offset < issue.line_number <= end]
+        )
+    
+    def _window_priority(self, issues: List[CodeIssue]) -> int:
+        """Worth of an AI review for a window: security hits first, then complex functions"""
+        security = sum(1 for issue in issues if issue.category == IssueCategory.SECURITY)
+        complexity = sum(1 for issue in issues if issue.title == "High Complexity Function")
+        return security * 10 + complexity
+    
+    def _build_review_result(self, all_issues: List[CodeIssue], suggestions: List[str], doc: SourceDocument,
+                             windows: Optional[Dict] = None) -> CodeReviewResult:
+        """Score the combined findings"""
         # Calculate quality score
-        quality_score = self._calculate_quality_score(all_issues, code)
+        quality_score = self._calculate_quality_score(all_issues, doc)
         
         # Security analysis
         security_analysis = self._analyze_security_comprehensive(all_issues)
@@ -286,23 +829,71 @@ class CodeReviewerService:
         
         return CodeReviewResult(
             issues=all_issues,
-            suggestions=ai_review.get("suggestions", []),
+            suggestions=suggestions,
             quality_score=quality_score,
             security_analysis=security_analysis,
             performance_analysis=performance_analysis,
-            maintainability_score=self._calculate_maintainability_score(all_issues, code)
+            maintainability_score=self._calculate_maintainability_score(all_issues, doc),
+            windows=windows
         )
     
-    async def _ai_code_review(self, code: str, language: str, context: Dict, standards: Dict) -> Dict:
+    async def _ai_code_review(self, code: Union[str, SourceDocument], language: str, context: Dict, standards: Dict,
+                              profile: Optional[ComplexityProfile] = None) -> Dict:
         """Perform AI-powered code review"""
-        prompt = f"""Perform a comprehensive code review for the following {language} code:
-
-CODE:
-```{language}
-{code}
-```
+        doc = SourceDocument.of(code)
+        parser = StreamingIssueParser(doc)
+        issues = []
+        
+        try:
+            async for issue in self.stream_ai_review(doc, language, context, standards, parser, profile):
+                issues.append(issue)
+        except Exception as e:
+            return {"issues": issues, "suggestions": [f"AI review failed: {str(e)}"], "failed": True}
+        
+        return {"issues": issues, "suggestions": parser.finish()["suggestions"]}
+    
+    async def stream_ai_review(
+        self,
+        code: Union[str, SourceDocument],
+        language: str,
+        context: Optional[Dict] = None,
+        standards: Optional[Dict] = None,
+        parser: Optional["StreamingIssueParser"] = None,
+        profile: Optional[ComplexityProfile] = None
+    ) -> AsyncIterator[CodeIssue]:
+        """Stream AI review findings as soon as each issue object is complete.
+        
+        The model and output budget come from the code's complexity profile,
+        taken from the static findings (analyzed here when not given).
+        """
+        doc = SourceDocument.of(code)
+        parser = parser or StreamingIssueParser(doc)
+        if profile is None:
+            profile = ComplexityProfile.from_static_issues(doc, self._static_analysis(doc, language))
+        prefix, prompt = self._build_review_prompt(doc.text, language, context, standards)
+        
+        stream = self.tiers.stream(
+            self.provider,
+            "review",
+            profile,
+            system=self._review_system(language),
+            prompt=prompt,
+            prefix=prefix,
+            temperature=0.1,
+            response_format={"type": "json_object"}
+        )
+        
+        async for delta in stream:
+            for issue in parser.feed(delta):
+                yield issue
+    
+    def _review_system(self, language: str) -> str:
+        return f"You are a senior {language} code reviewer with expertise in security, performance, and best practices. Respond only with JSON."
+    
+    def _build_review_prompt(self, code: str, language: str, context: Dict, standards: Dict) -> tuple[str, str]:
+        """Build the review prompt as a (stable prefix, variable suffix) pair requesting structured JSON output"""
+        prefix = f"""Perform a comprehensive code review of the {language} code given at the end of this message.
 
-CONTEXT: {context or "No additional context provided"}
 STANDARDS: {standards or "Use industry best practices"}
 
 Please analyze for:
@@ -314,71 +905,31 @@ Please analyze for:
 6. Error handling
 7. Testing considerations
 
-Provide specific, actionable feedback with line numbers where applicable.
-Format your response as structured feedback with clear categories.
+Respond with a single JSON object matching this schema and nothing else:
+{REVIEW_RESPONSE_SCHEMA}
+
+List "issues" first. Use the 1-based line number of the code the finding refers to.
 """
-        
-        try:
-            response = await self.openai_client.chat.completions.create(
-                model="gpt-4-turbo-preview",
-                messages=[
-                    {"role": "system", "content": f"You are a senior {language} code reviewer with expertise in security, performance, and best practices."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.1,
-                max_tokens=2500
-            )
-            
-            # Parse AI response into structured format
-            return self._parse_ai_review(response.choices[0].message.content)
-        except Exception as e:
-            return {"issues": [], "suggestions": [f"AI review failed: {str(e)}"]}
+        prompt = f"""
+CONTEXT: {context or "No additional context provided"}
+
+CODE:
+```{language}
+{code}
+```
+"""
+        return prefix, prompt
     
-    def _parse_ai_review(self, content: str) -> Dict:
-        """Parse AI review response into structured format"""
-        # This is a simplified parser - in practice, you'd want more sophisticated parsing
-        lines = content.split('\n')
-        issues = []
-        suggestions = []
-        
-        current_section = None
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-            
-            if "suggestion" in line.lower() or "recommend" in line.lower():
-                suggestions.append(line)
-            elif any(keyword in line.lower() for keyword in ["issue", "problem", "concern", "vulnerability"]):
-                # Try to extract line number if present
-                line_match = re.search(r'line\s+(\d+)', line, re.IGNORECASE)
-                line_number = int(line_match.group(1)) if line_match else 1
-                
-                # Determine severity and category based on keywords
-                severity = IssueSeverity.MEDIUM
-                category = IssueCategory.BEST_PRACTICE
-                
-                if any(word in line.lower() for word in ["critical", "severe", "security"]):
-                    severity = IssueSeverity.HIGH
-                    category = IssueCategory.SECURITY
-                elif any(word in line.lower() for word in ["performance", "slow", "inefficient"]):
-                    category = IssueCategory.PERFORMANCE
-                
-                issues.append(CodeIssue(
-                    line_number=line_number,
-                    severity=severity,
-                    category=category,
-                    title="AI Review Finding",
-                    description=line,
-                    suggestion="Review and address this finding",
-                    code_snippet=""
-                ))
-        
-        return {"issues": issues, "suggestions": suggestions}
+    def _parse_ai_review(self, content: str, code: Union[str, SourceDocument] = "") -> Dict:
+        """Parse a complete AI review response into structured format"""
+        parser = StreamingIssueParser(code)
+        issues = parser.feed(content)
+        return {"issues": issues, "suggestions": parser.finish()["suggestions"]}
     
-    def _calculate_quality_score(self, issues: List[CodeIssue], code: str) -> float:
+    def _calculate_quality_score(self, issues: List[CodeIssue], code: Union[str, SourceDocument]) -> float:
         """Calculate overall code quality score (0-10)"""
-        if not code.strip():
+        doc = SourceDocument.of(code)
+        if doc.is_blank():
             return 0.0
         
         # Base score
@@ -396,11 +947,10 @@ Format your response as structured feedback with clear categories.
                 score -= 0.5
         
         # Bonus for good practices (simplified)
-        lines = code.split('\n')
-        if any('"""' in line or "'''" in line for line in lines):
+        if '"""' in doc.text or "'''" in doc.text:
             score += 0.5  # Has docstrings
         
-        if 'try:' in code and 'except' in code:
+        if 'try:' in doc.text and 'except' in doc.text:
             score += 0.3  # Has error handling
         
         return max(0.0, min(10.0, score))
@@ -438,7 +988,7 @@ Format your response as structured feedback with clear categories.
             ]
         }
     
-    def _calculate_maintainability_score(self, issues: List[CodeIssue], code: str) -> float:
+    def _calculate_maintainability_score(self, issues: List[CodeIssue], code: Union[str, SourceDocument]) -> float:
         """Calculate maintainability score"""
         maintainability_issues = [
             issue for issue in issues 
@@ -450,7 +1000,7 @@ Format your response as structured feedback with clear categories.
             base_score -= 0.5
         
         # Factor in code length and complexity
-        lines = len([line for line in code.split('\n') if line.strip()])
+        lines = sum(1 for line in SourceDocument.of(code).lines if line.strip())
         if lines > 500:
             base_score -= 1.0
         
@@ -1,30 +1,198 @@
-from dataclasses import dataclass
+import ast
+import asyncio
+import hashlib
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
 import openai
 from core.config import settings
+from core.concurrency import DeadlineExceededError, OverloadedError
+from services.code_index import CodeChunker
+from services.llm_providers import OpenAIProvider
+
+@dataclass
+class DocSymbol:
+    name: str
+    kind: str
+    start_line: int
+    end_line: int
+    source: str
 
 @dataclass
 class DocumentationResult:
     documentation: str
+    symbols: List[Dict] = field(default_factory=list)
+    generated: int = 0
+    cached: int = 0
+
+class SymbolExtractor:
+    """Split a module into independently documented symbols.
+
+    Python uses the ast module; a class is represented by its header and
+    method signatures so that editing one method body only invalidates that
+    method. Other languages use the tree-sitter chunker.
+    """
+
+    def __init__(self, chunker: Optional[CodeChunker] = None):
+        self.chunker = chunker or CodeChunker()
+
+    def extract(self, code: str, language: str, path: str = "") -> List[DocSymbol]:
+        symbols = None
+        if language == "python":
+            symbols = self._python_symbols(code)
+        if symbols is None:
+            symbols = [
+                DocSymbol(chunk.symbol or f"lines {chunk.start_line}-{chunk.end_line}", "symbol" if chunk.symbol else "section",
+                          chunk.start_line, chunk.end_line, chunk.text)
+                for chunk in self.chunker.chunk(path, code, language)
+            ]
+        if not symbols and code.strip():
+            symbols = [DocSymbol("module", "module", 1, code.count('\n') + 1, code)]
+        return symbols
+
+    def _python_symbols(self, code: str) -> Optional[List[DocSymbol]]:
+        try:
+            tree = ast.parse(code)
+        except SyntaxError:
+            # tree-sitter tolerates syntax errors, so let the chunker handle it
+            return None
+
+        lines = code.split('\n')
+        symbols = []
+        for node in tree.body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                symbols.append(self._node_symbol(node, node.name, "function", lines))
+            elif isinstance(node, ast.ClassDef):
+                methods = [n for n in node.body if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))]
+                symbols.append(self._class_symbol(node, methods, lines))
+                for method in methods:
+                    symbols.append(self._node_symbol(method, f"{node.name}.{method.name}", "method", lines))
+        return symbols
+
+    def _node_symbol(self, node, name: str, kind: str, lines: List[str]) -> DocSymbol:
+        start = node.decorator_list[0].lineno if node.decorator_list else node.lineno
+        end = node.end_lineno or node.lineno
+        return DocSymbol(name, kind, start, end, '\n'.join(lines[start - 1:end]))
+
+    def _class_symbol(self, node: ast.ClassDef, methods: List, lines: List[str]) -> DocSymbol:
+        """Class header and attributes plus method signatures, without method bodies"""
+        start = node.decorator_list[0].lineno if node.decorator_list else node.lineno
+        end = node.end_lineno or node.lineno
+        if not methods:
+            return DocSymbol(node.name, "class", start, end, '\n'.join(lines[start - 1:end]))
+
+        first_method = methods[0].decorator_list[0].lineno if methods[0].decorator_list else methods[0].lineno
+        parts = lines[start - 1:first_method - 1]
+        for method in methods:
+            parts.extend(lines[method.lineno - 1:method.body[0].lineno - 1] or [lines[method.lineno - 1]])
+        return DocSymbol(node.name, "class", start, end, '\n'.join(parts))
+
+class SymbolDocCache:
+    """LRU cache of generated documentation keyed by a hash of the symbol's source"""
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries or settings.DOC_CACHE_MAX_ENTRIES
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, symbol: DocSymbol, language: str, doc_type: str) -> str:
+        material = "\0".join([language, doc_type, symbol.kind, symbol.name, symbol.source])
+        return hashlib.sha256(material.encode("utf8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        documentation = self._entries.get(key)
+        if documentation is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return documentation
+
+    def put(self, key: str, documentation: str):
+        self._entries[key] = documentation
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
 
 class DocumentationService:
     def __init__(self):
         self.openai_client = openai.AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-    
-    async def generate_documentation(self, code: str, language: str, doc_type: str = "api"):
-        prompt = f"Generate {doc_type} documentation for this {language} code:\n\n{code}"
-        
-        try:
-            response = await self.openai_client.chat.completions.create(
-                model="gpt-4-turbo-preview",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.1,
-                max_tokens=1500
-            )
-            
-            return DocumentationResult(
-                documentation=response.choices[0].message.content
-            )
-        except Exception as e:
-            return DocumentationResult(
-                documentation=f"# Documentation Generation Failed\n\nError: {str(e)}"
-            )
\ No newline at end of file
+        self.provider = OpenAIProvider(self.openai_client)
+        self.extractor = SymbolExtractor()
+        self.cache = SymbolDocCache()
+        self.max_concurrency = settings.DOCS_MAX_CONCURRENCY
+
+    async def generate_documentation(self, code: str, language: str, doc_type: str = "api", path: str = ""):
+        """Document a module symbol by symbol, regenerating only symbols whose source changed"""
+        symbols = self.extractor.extract(code, language, path)
+        keys = [self.cache.key(symbol, language, doc_type) for symbol in symbols]
+        sections = [self.cache.get(key) for key in keys]
+        pending = [i for i, section in enumerate(sections) if section is None]
+
+        outline = '\n'.join(f"- {symbol.kind} {symbol.name}" for symbol in symbols)
+        # A large module must not fill the provider's wait queue on its own and get shed
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def document(symbol: DocSymbol) -> str:
+            async with semaphore:
+                return await self._document_symbol(symbol, language, doc_type, outline)
+
+        results = await asyncio.gather(*(document(symbols[i]) for i in pending), return_exceptions=True)
+
+        interrupted = None
+        generated = 0
+        for i, result in zip(pending, results):
+            if isinstance(result, (OverloadedError, DeadlineExceededError)):
+                interrupted = result
+            elif isinstance(result, Exception):
+                sections[i] = f"_Documentation generation failed: {str(result)}_"
+            else:
+                sections[i] = result
+                self.cache.put(keys[i], result)
+                generated += 1
+        if interrupted is not None:
+            # Symbols that did succeed are cached, so a retry only pays for the rest
+            raise interrupted
+
+        title = path or f"{language.capitalize()} module"
+        body = '\n\n'.join(f"## `{symbol.name}`\n\n{section.strip()}" for symbol, section in zip(symbols, sections))
+
+        return DocumentationResult(
+            documentation=f"# {title}\n\n{body}\n" if symbols else f"# {title}\n\nNo code to document.\n",
+            symbols=[
+                {**{k: v for k, v in asdict(symbol).items() if k != "source"}, "cached": i not in pending}
+                for i, symbol in enumerate(symbols)
+            ],
+            generated=generated,
+            cached=len(symbols) - len(pending)
+        )
+
+    async def _document_symbol(self, symbol: DocSymbol, language: str, doc_type: str, outline: str) -> str:
+        # Every symbol of a module shares the instructions and outline, so they go in the cacheable prefix
+        prefix = f"""Generate {doc_type} documentation for one symbol of a {language} module.
+Describe its purpose, parameters, return values, raised errors and a short usage example where relevant.
+Respond in Markdown without a top-level heading.
+
+MODULE OUTLINE:
+{outline}
+"""
+        prompt = f"""
+Document the {symbol.kind} `{symbol.name}`.
+
+SOURCE (lines {symbol.start_line}-{symbol.end_line}):
+```{language}
+{symbol.source}
+```"""
+
+        completion = await self.provider.complete(
+            system="You are a technical writer documenting source code.",
+            prompt=prompt,
+            prefix=prefix,
+            temperature=0.1,
+            max_tokens=settings.DOC_SYMBOL_MAX_TOKENS
+        )
+        return completion.text
\ No newline at end of file
@@ -0,0 +1,94 @@
+import re
+import zlib
+from typing import List
+
+import numpy as np
+
+# Words that carry no meaning in a code-generation request. Verbs stay: "write a
+# file" and "create a file" ask for different code.
+STOPWORDS = {
+    "a", "an", "the", "to", "of", "for", "in", "on", "and", "or", "that", "which", "with",
+    "me", "my", "please", "function", "method", "code", "program", "script", "some", "given",
+    "should", "can", "is"
+}
+
+TOKEN_PATTERN = re.compile(r"[A-Za-z0-9_]+")
+# Splits snake_case and camelCase identifiers into words
+IDENTIFIER_PARTS = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+")
+
+class Embedder:
+    """Turns text into L2-normalised float32 vectors"""
+    dim = 0
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        raise NotImplementedError
+
+class HashingEmbedder(Embedder):
+    """Offline feature-hashing embedder over word and character n-grams.
+
+    Needs no model or network access, which makes it suitable for the local
+    cache and for tests; near-duplicate requests share most features. Word
+    bigrams weigh as much as words, so swapping arguments ("celsius to
+    fahrenheit" and back) moves a request well below the cache threshold.
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        return self.embed_sync(texts)
+
+    def embed_sync(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                digest = zlib.crc32(feature.encode("utf8"))
+                sign = 1.0 if digest & 0x80000000 else -1.0
+                vectors[row, digest % self.dim] += sign * weight
+        return _normalize(vectors)
+
+    def _features(self, text: str):
+        tokens = [self._stem(t) for t in self._tokenize(text) if t not in STOPWORDS]
+        for token in tokens:
+            yield "w:" + token, 1.0
+            padded = f"#{token}#"
+            for i in range(len(padded) - 2):
+                yield "c:" + padded[i:i + 3], 0.25
+        for first, second in zip(tokens, tokens[1:]):
+            yield f"b:{first}_{second}", 1.0
+
+    def _tokenize(self, text: str) -> List[str]:
+        tokens = []
+        for word in TOKEN_PATTERN.findall(text):
+            parts = IDENTIFIER_PARTS.findall(word)
+            tokens.extend(part.lower() for part in parts)
+            if len(parts) > 1:
+                tokens.append(word.lower())
+        return tokens
+
+    def _stem(self, token: str) -> str:
+        for suffix in ("ing", "ed", "es", "s"):
+            if len(token) > len(suffix) + 2 and token.endswith(suffix):
+                return token[:-len(suffix)]
+        return token
+
+class OpenAIEmbedder(Embedder):
+    """Embeddings from the OpenAI embeddings endpoint, sent in batches"""
+
+    def __init__(self, client, model: str = "text-embedding-3-small", dim: int = 1536, batch_size: int = 256):
+        self.client = client
+        self.model = model
+        self.dim = dim
+        self.batch_size = batch_size
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        rows = []
+        for start in range(0, len(texts), self.batch_size):
+            response = await self.client.embeddings.create(model=self.model, input=texts[start:start + self.batch_size])
+            rows.extend(item.embedding for item in response.data)
+        return _normalize(np.asarray(rows, dtype=np.float32).reshape(len(texts), -1))
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
@@ -0,0 +1,279 @@
+import asyncio
+import random
+import time
+from typing import AsyncIterator, Callable, Dict, Optional
+from dataclasses import dataclass, field
+
+from core.concurrency import AdaptiveLimiter, DeadlineExceededError, get_limiter
+from core.metrics import metrics
+from core.request_context import request_usage, time_remaining
+
+@dataclass
+class CompletionResult:
+    text: str
+    provider: str
+    model: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+
+@dataclass
+class BatchRequest:
+    """One completion to run through a provider's batch API instead of the interactive path"""
+    custom_id: str
+    system: str
+    prompt: str
+    prefix: str = ""
+    temperature: float = 0.2
+    max_tokens: int = 2000
+    model: Optional[str] = None  # the backend's default model when not set
+    options: Dict = field(default_factory=dict)
+
+@dataclass
+class BatchOutput:
+    """The completion text of a batched request, or why there is none"""
+    text: Optional[str] = None
+    error: Optional[str] = None
+
+class LLMProvider:
+    """Base class for chat-completion backends used by the services"""
+    name = "base"
+    label = "Base"
+
+    def __init__(self, model: str, limiter: Optional[AdaptiveLimiter] = None):
+        self.model = model
+        self._limiter = limiter
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}:{self.model}"
+
+    @property
+    def limiter(self) -> AdaptiveLimiter:
+        if self._limiter is None:
+            self._limiter = get_limiter(self.name)
+        return self._limiter
+
+    async def complete(
+        self,
+        system: str,
+        prompt: str,
+        temperature: float = 0.2,
+        max_tokens: int = 2000,
+        prefix: str = "",
+        **options
+    ) -> CompletionResult:
+        """Run one completion inside the provider's concurrency limit and the request's deadline.
+
+        ``prefix`` is the stable part of the user message (rules, project
+        context) and is sent ahead of ``prompt`` so providers can serve it from
+        their prompt cache. ``model`` overrides the provider's model for this
+        call (used by model tiering).
+        """
+        started = time.monotonic()
+        try:
+            async with self.limiter.slot():
+                try:
+                    result = await asyncio.wait_for(
+                        self._complete(system, prompt, temperature, max_tokens, prefix=prefix, **options), time_remaining()
+                    )
+                except asyncio.TimeoutError:
+                    remaining = time_remaining()
+                    if remaining is not None and remaining <= 0:
+                        raise DeadlineExceededError() from None
+                    raise
+        except (asyncio.CancelledError, DeadlineExceededError) as e:
+            self._record_abandoned(e, started)
+            raise
+        self._record_usage(result)
+        return result
+
+    async def _complete(self, system: str, prompt: str, temperature: float, max_tokens: int, prefix: str = "", **options) -> CompletionResult:
+        raise NotImplementedError
+
+    def _record_usage(self, result: CompletionResult):
+        """Count prompt tokens and how many of them were served from the provider's prompt cache"""
+        labels = {"provider": self.name}
+        metrics.increment("llm_prompt_tokens", result.prompt_tokens, labels=labels)
+        metrics.increment("llm_cached_prompt_tokens", result.cached_tokens, labels=labels)
+        usage = request_usage.get()
+        if usage is not None:
+            # Charged to the tenant's LLM token bucket when the request finishes
+            usage["llm_tokens"] += result.prompt_tokens + result.completion_tokens
+
+    def _record_abandoned(self, error: BaseException, started: float):
+        """Count provider time spent on results nobody will read"""
+        labels = {"provider": self.name, "reason": "deadline" if isinstance(error, DeadlineExceededError) else "cancelled"}
+        metrics.increment("llm_calls_abandoned", labels=labels)
+        metrics.increment("llm_abandoned_seconds", time.monotonic() - started, labels=labels)
+
+class OpenAIProvider(LLMProvider):
+    name = "openai"
+    label = "OpenAI"
+
+    def __init__(self, client, model: str = "gpt-4-turbo-preview", limiter: Optional[AdaptiveLimiter] = None):
+        super().__init__(model, limiter)
+        self.client = client
+
+    async def _complete(self, system: str, prompt: str, temperature: float, max_tokens: int, prefix: str = "", **options) -> CompletionResult:
+        """Run a chat completion against OpenAI"""
+        model = options.pop("model", None) or self.model
+        # OpenAI caches the longest previously seen prompt prefix automatically
+        response = await self.client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": system},
+                {"role": "user", "content": prefix + prompt}
+            ],
+            temperature=temperature,
+            max_tokens=max_tokens,
+            **options
+        )
+
+        return self._result(response.choices[0].message.content, model, getattr(response, "usage", None))
+
+    def _result(self, text: str, model: str, usage) -> CompletionResult:
+        return CompletionResult(
+            text=text,
+            provider=self.name,
+            model=model,
+            prompt_tokens=_token_count(usage, "prompt_tokens"),
+            completion_tokens=_token_count(usage, "completion_tokens"),
+            cached_tokens=_token_count(getattr(usage, "prompt_tokens_details", None), "cached_tokens")
+        )
+
+    async def stream(
+        self,
+        system: str,
+        prompt: str,
+        temperature: float = 0.2,
+        max_tokens: int = 2000,
+        prefix: str = "",
+        **options
+    ) -> AsyncIterator[str]:
+        """Stream completion text deltas, holding a limiter slot until the stream ends.
+
+        The final chunk carries the token usage, which is recorded like that
+        of complete once the stream has been read to the end.
+        """
+        started = time.monotonic()
+        model = options.pop("model", None) or self.model
+        # Passed through extra_body: the pinned client predates the stream_options argument
+        extra_body = {**options.pop("extra_body", {}), "stream_options": {"include_usage": True}}
+        try:
+            async with self.limiter.slot():
+                stream = await self.client.chat.completions.create(
+                    model=model,
+                    messages=[
+                        {"role": "system", "content": system},
+                        {"role": "user", "content": prefix + prompt}
+                    ],
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    stream=True,
+                    extra_body=extra_body,
+                    **options
+                )
+
+                usage = None
+                try:
+                    async for chunk in stream:
+                        usage = getattr(chunk, "usage", None) or usage
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            yield delta
+                    self._record_usage(self._result("", model, usage))
+                finally:
+                    # Closing the response aborts generation when the consumer goes away
+                    response = getattr(stream, "response", None)
+                    if response is not None:
+                        await response.aclose()
+        except (asyncio.CancelledError, GeneratorExit, DeadlineExceededError) as e:
+            self._record_abandoned(e, started)
+            raise
+
+class AnthropicProvider(LLMProvider):
+    name = "anthropic"
+    label = "Anthropic"
+    PROMPT_CACHING_BETA = "prompt-caching-2024-07-31"
+
+    def __init__(self, client, model: str = "claude-3-sonnet-20240229", limiter: Optional[AdaptiveLimiter] = None):
+        super().__init__(model, limiter)
+        self.client = client
+
+    async def _complete(self, system: str, prompt: str, temperature: float, max_tokens: int, prefix: str = "", **options) -> CompletionResult:
+        """Run a messages request against Anthropic"""
+        # A cache breakpoint after the last stable block lets repeat requests reuse system and prefix
+        system_blocks = [{"type": "text", "text": system}]
+        content = [{"type": "text", "text": prompt}]
+        if prefix:
+            content.insert(0, {"type": "text", "text": prefix})
+        (content[0] if prefix else system_blocks[-1])["cache_control"] = {"type": "ephemeral"}
+        model = options.pop("model", None) or self.model
+
+        response = await self.client.messages.create(
+            model=model,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            system=system_blocks,
+            messages=[{"role": "user", "content": content}],
+            extra_headers={"anthropic-beta": self.PROMPT_CACHING_BETA},
+            **options
+        )
+
+        usage = getattr(response, "usage", None)
+        return CompletionResult(
+            text=response.content[0].text,
+            provider=self.name,
+            model=model,
+            # Anthropic reports cached and cache-written tokens separately from input_tokens
+            prompt_tokens=sum(_token_count(usage, field) for field in ("input_tokens", "cache_read_input_tokens", "cache_creation_input_tokens")),
+            completion_tokens=_token_count(usage, "output_tokens"),
+            cached_tokens=_token_count(usage, "cache_read_input_tokens")
+        )
+
+class LocalProvider(LLMProvider):
+    """In-process stand-in provider with configurable latency and failures"""
+    label = "Local"
+
+    def __init__(
+        self,
+        name: str = "local",
+        model: str = "local-stand-in",
+        latency: float = 0.01,
+        jitter: float = 0.0,
+        failure_rate: float = 0.0,
+        responder: Optional[Callable[[str], str]] = None,
+        limiter: Optional[AdaptiveLimiter] = None
+    ):
+        super().__init__(model, limiter or AdaptiveLimiter(name))
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.responder = responder
+        self.calls = 0
+
+    async def _complete(self, system: str, prompt: str, temperature: float, max_tokens: int, prefix: str = "", **options) -> CompletionResult:
+        """Return a canned completion after a simulated delay"""
+        self.calls += 1
+        await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise RuntimeError(f"{self.name} simulated failure")
+
+        text = self.responder(prompt) if self.responder else f"```\n# {self.name} response\n```\nGenerated by {self.name}."
+        return CompletionResult(
+            text=text,
+            provider=self.name,
+            model=options.get("model") or self.model,
+            prompt_tokens=len(prefix.split()) + len(prompt.split()),
+            completion_tokens=len(text.split())
+        )
+
+def _token_count(usage, field: str) -> int:
+    """Read a token count from a provider usage object, tolerating missing data"""
+    value = getattr(usage, field, 0) if usage is not None else 0
+    return value if isinstance(value, int) else 0
@@ -0,0 +1,161 @@
+import re
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional
+
+from core.config import settings
+from core.metrics import metrics
+from services.llm_providers import CompletionResult
+from services.provider_router import ProviderStats
+from services.source import SourceDocument
+
+# Cyclomatic complexity above which a function counts as complex (StaticAnalyzer flags the same)
+COMPLEX_FUNCTION_THRESHOLD = 10
+
+DECLARATION_PATTERN = re.compile(r"\s*(?:async\s+def|def|class|function|func|fn)\s+\w")
+
+@dataclass(frozen=True)
+class ComplexityProfile:
+    """Size and complexity of the code a prompt is about, from analysis the services already ran"""
+    lines: int
+    functions: int
+    complex_functions: int = 0
+    findings: int = 0  # static security findings
+
+    @classmethod
+    def from_analysis(cls, analysis: Dict, code) -> "ComplexityProfile":
+        """From TestAnalyzer.analyze_code_structure output"""
+        functions = analysis.get("functions", [])
+        return cls(
+            lines=sum(1 for line in SourceDocument.of(code).lines if line.strip()),
+            functions=len(functions) + len(analysis.get("classes", [])),
+            complex_functions=sum(1 for function in functions if function.get("complexity", 0) > COMPLEX_FUNCTION_THRESHOLD)
+        )
+
+    @classmethod
+    def from_static_issues(cls, code, issues: List) -> "ComplexityProfile":
+        """From the StaticAnalyzer/RuleEngine findings for the code"""
+        doc = SourceDocument.of(code)
+        return cls(
+            lines=sum(1 for line in doc.lines if line.strip()),
+            functions=sum(1 for line in doc.lines if DECLARATION_PATTERN.match(line)),
+            complex_functions=sum(1 for issue in issues if issue.title == "High Complexity Function"),
+            findings=sum(1 for issue in issues if issue.category.value == "security")
+        )
+
+@dataclass(frozen=True)
+class ModelTier:
+    """A model choice per provider, the inputs it is trusted with and its output cap"""
+    name: str
+    models: Dict[str, str]  # provider name -> model
+    max_tokens: int
+    max_lines: Optional[int] = None
+    max_functions: Optional[int] = None
+    max_complex_functions: Optional[int] = None
+    max_findings: Optional[int] = None
+    cost_per_1k_prompt: float = 0.0  # USD
+    cost_per_1k_completion: float = 0.0
+
+    def accepts(self, profile: ComplexityProfile) -> bool:
+        limits = (
+            (self.max_lines, profile.lines),
+            (self.max_functions, profile.functions),
+            (self.max_complex_functions, profile.complex_functions),
+            (self.max_findings, profile.findings)
+        )
+        return all(limit is None or value <= limit for limit, value in limits)
+
+    def cost(self, prompt_tokens: int, completion_tokens: int) -> float:
+        return (prompt_tokens * self.cost_per_1k_prompt + completion_tokens * self.cost_per_1k_completion) / 1000
+
+class ModelTierPolicy:
+    """Pick a model and an output budget for each LLM call from the input's complexity.
+
+    Tiers are tried in order and the first whose limits the input fits is
+    used; the last tier takes everything else. ``max_tokens`` is estimated
+    per task from the number of functions and lines (MODEL_OUTPUT_BUDGETS)
+    and capped by the tier. Calls, latency, tokens and estimated cost are
+    counted per tier and task.
+    """
+
+    def __init__(self, tiers: Optional[List[Dict]] = None, budgets: Optional[Dict[str, Dict[str, int]]] = None,
+                 enabled: Optional[bool] = None):
+        self.tiers = [ModelTier(**tier) for tier in (tiers if tiers is not None else settings.MODEL_TIERS)]
+        if not self.tiers:
+            raise ValueError("At least one model tier is required")
+        self.budgets = budgets if budgets is not None else settings.MODEL_OUTPUT_BUDGETS
+        self.enabled = enabled if enabled is not None else settings.MODEL_TIERING_ENABLED
+        self.stats = {tier.name: ProviderStats(settings.PROVIDER_STATS_WINDOW) for tier in self.tiers}
+
+    def select(self, profile: ComplexityProfile) -> ModelTier:
+        if self.enabled:
+            for tier in self.tiers[:-1]:
+                if tier.accepts(profile):
+                    return tier
+        return self.tiers[-1]
+
+    def max_tokens(self, task: str, profile: ComplexityProfile, tier: ModelTier) -> int:
+        budget = self.budgets.get(task, {})
+        base = budget.get("base", tier.max_tokens)
+        estimate = base + budget.get("per_function", 0) * profile.functions + budget.get("per_100_lines", 0) * profile.lines // 100
+        return max(min(base, tier.max_tokens), min(estimate, tier.max_tokens))
+
+    def call_options(self, provider, task: str, profile: ComplexityProfile, tier: ModelTier) -> Dict:
+        """max_tokens, plus the tier's model for this provider when it names one"""
+        options = {"max_tokens": self.max_tokens(task, profile, tier)}
+        model = tier.models.get(getattr(provider, "name", ""))
+        if model:
+            options["model"] = model
+        return options
+
+    async def complete(self, provider, task: str, profile: ComplexityProfile, **kwargs) -> CompletionResult:
+        tier = self.select(profile)
+        started = time.monotonic()
+        try:
+            result = await provider.complete(**self.call_options(provider, task, profile, tier), **kwargs)
+        except Exception:
+            self.record_failure(tier, task)
+            raise
+        self.record(tier, task, time.monotonic() - started, result.prompt_tokens, result.completion_tokens)
+        return result
+
+    async def stream(self, provider, task: str, profile: ComplexityProfile, **kwargs) -> AsyncIterator[str]:
+        """Stream a completion on the selected tier; streams report no usage, so tokens are estimated from characters"""
+        tier = self.select(profile)
+        started = time.monotonic()
+        characters = 0
+        try:
+            async for delta in provider.stream(**self.call_options(provider, task, profile, tier), **kwargs):
+                characters += len(delta)
+                yield delta
+        except Exception:
+            self.record_failure(tier, task)
+            raise
+        prompt_characters = sum(len(kwargs.get(part, "")) for part in ("system", "prefix", "prompt"))
+        self.record(tier, task, time.monotonic() - started, prompt_characters // 4, characters // 4)
+
+    def record(self, tier: ModelTier, task: str, seconds: float, prompt_tokens: int, completion_tokens: int):
+        labels = {"tier": tier.name, "task": task}
+        metrics.increment("llm_tier_calls", labels=labels)
+        metrics.increment("llm_tier_seconds", seconds, labels=labels)
+        metrics.increment("llm_tier_prompt_tokens", prompt_tokens, labels=labels)
+        metrics.increment("llm_tier_completion_tokens", completion_tokens, labels=labels)
+        metrics.increment("llm_tier_cost_usd", tier.cost(prompt_tokens, completion_tokens), labels=labels)
+        self.stats[tier.name].record_success(seconds)
+
+    def record_failure(self, tier: ModelTier, task: str):
+        metrics.increment("llm_tier_errors", labels={"tier": tier.name, "task": task})
+        self.stats[tier.name].record_failure()
+
+    def snapshot(self) -> Dict:
+        return {tier.name: self.stats[tier.name].snapshot() for tier in self.tiers}
+
+_policy: Optional[ModelTierPolicy] = None
+
+def get_model_tier_policy() -> ModelTierPolicy:
+    """Return the process-wide tiering policy, reporting per-tier latency in /api/v1/metrics"""
+    global _policy
+    if _policy is None:
+        _policy = ModelTierPolicy()
+        metrics.register_collector("model_tiers", _policy.snapshot)
+    return _policy
@@ -0,0 +1,72 @@
+import importlib
+import threading
+from typing import Dict, Optional
+
+from tree_sitter import Language, Parser
+
+# Grammar package and language function per language; grammars that aren't installed are skipped
+GRAMMAR_MODULES = {
+    "python": ("tree_sitter_python", "language"),
+    "javascript": ("tree_sitter_javascript", "language"),
+    "typescript": ("tree_sitter_typescript", "language_typescript"),
+    "java": ("tree_sitter_java", "language"),
+    "cpp": ("tree_sitter_cpp", "language"),
+    "go": ("tree_sitter_go", "language"),
+    "rust": ("tree_sitter_rust", "language"),
+    "csharp": ("tree_sitter_c_sharp", "language"),
+    "php": ("tree_sitter_php", "language_php"),
+}
+
+FILE_EXTENSIONS = {
+    ".py": "python",
+    ".js": "javascript",
+    ".jsx": "javascript",
+    ".mjs": "javascript",
+    ".ts": "typescript",
+    ".tsx": "typescript",
+    ".java": "java",
+    ".cpp": "cpp",
+    ".cc": "cpp",
+    ".h": "cpp",
+    ".hpp": "cpp",
+    ".go": "go",
+    ".rs": "rust",
+    ".cs": "csharp",
+    ".php": "php",
+}
+
+_languages: Dict[str, Optional[Language]] = {}
+# Parsers are not safe to share between threads (files are chunked in worker threads)
+_local = threading.local()
+
+def get_language(language: str) -> Optional[Language]:
+    """Load (once) the tree-sitter grammar for a language, if available"""
+    if language not in _languages:
+        module_name, function_name = GRAMMAR_MODULES.get(language, (None, None))
+        try:
+            module = importlib.import_module(module_name) if module_name else None
+        except ImportError:
+            module = None
+        _languages[language] = Language(getattr(module, function_name)(), language) if module else None
+    return _languages[language]
+
+def get_parser(language: str) -> Optional[Parser]:
+    """Return this thread's parser for a language, or None when no grammar is installed"""
+    parsers = getattr(_local, "parsers", None)
+    if parsers is None:
+        parsers = _local.parsers = {}
+    if language not in parsers:
+        grammar = get_language(language)
+        if grammar is None:
+            return None
+        parser = Parser()
+        parser.set_language(grammar)
+        parsers[language] = parser
+    return parsers[language]
+
+def language_for_path(path: str) -> Optional[str]:
+    """Guess the language of a file from its extension"""
+    for extension, language in FILE_EXTENSIONS.items():
+        if path.endswith(extension):
+            return language
+    return None
@@ -0,0 +1,210 @@
+import asyncio
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from core.config import settings
+from core.concurrency import DeadlineExceededError, OverloadedError
+from services.llm_providers import CompletionResult, LLMProvider
+
+class ProviderUnavailableError(Exception):
+    """Raised when every candidate provider failed"""
+
+    def __init__(self, errors: List[Tuple[LLMProvider, Exception]]):
+        self.errors = errors
+        super().__init__("; ".join(f"{provider.label} request failed: {error}" for provider, error in errors))
+
+class ProviderStats:
+    """Rolling latency and error statistics for one provider/model"""
+
+    def __init__(self, window: int = 100):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.last_failure = 0.0
+        self.hedges_won = 0
+
+    def record_success(self, latency: float):
+        self.latencies.append(latency)
+        self.outcomes.append(True)
+
+    def record_censored(self, latency: float):
+        """A call abandoned after latency seconds: it would have taken at least that long"""
+        self.latencies.append(latency)
+
+    def record_failure(self):
+        self.outcomes.append(False)
+        self.last_failure = time.monotonic()
+
+    @property
+    def samples(self) -> int:
+        return len(self.latencies)
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Return the q-th latency percentile (0-1) over the window"""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(q * len(ordered)))
+        return ordered[index]
+
+    def snapshot(self) -> Dict:
+        return {
+            "samples": self.samples,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "error_rate": round(self.error_rate, 3),
+            "hedges_won": self.hedges_won
+        }
+
+class ProviderRouter:
+    """Route completions to the fastest healthy provider, optionally hedging"""
+
+    def __init__(
+        self,
+        providers: List[LLMProvider],
+        window: Optional[int] = None,
+        min_samples: Optional[int] = None,
+        max_error_rate: Optional[float] = None,
+        unhealthy_cooldown: Optional[float] = None,
+        hedge_percentile: Optional[float] = None,
+        default_hedge_delay: Optional[float] = None
+    ):
+        self.providers = list(providers)
+        self.min_samples = min_samples if min_samples is not None else settings.PROVIDER_MIN_SAMPLES
+        self.max_error_rate = max_error_rate if max_error_rate is not None else settings.PROVIDER_MAX_ERROR_RATE
+        self.unhealthy_cooldown = unhealthy_cooldown if unhealthy_cooldown is not None else settings.PROVIDER_UNHEALTHY_COOLDOWN
+        self.hedge_percentile = hedge_percentile if hedge_percentile is not None else settings.PROVIDER_HEDGE_PERCENTILE
+        self.default_hedge_delay = default_hedge_delay if default_hedge_delay is not None else settings.PROVIDER_HEDGE_DELAY
+        window = window or settings.PROVIDER_STATS_WINDOW
+        self.stats = {provider.key: ProviderStats(window) for provider in self.providers}
+
+    def is_healthy(self, provider: LLMProvider) -> bool:
+        """A provider is unhealthy while its error rate is high and it failed recently"""
+        stats = self.stats[provider.key]
+        if stats.error_rate <= self.max_error_rate:
+            return True
+        return time.monotonic() - stats.last_failure > self.unhealthy_cooldown
+
+    def rank(self, preferred: Optional[str] = None) -> List[LLMProvider]:
+        """Order providers: measured healthy by p50, then unmeasured, then unhealthy"""
+        ordered = sorted(self.providers, key=lambda p: p.name != preferred)
+
+        def sort_key(item):
+            position, provider = item
+            stats = self.stats[provider.key]
+            if not self.is_healthy(provider):
+                return (2, stats.error_rate, position)
+            if stats.samples < self.min_samples:
+                return (1, 0.0, position)
+            return (0, stats.percentile(0.5), position)
+
+        return [provider for _, provider in sorted(enumerate(ordered), key=sort_key)]
+
+    def hedge_delay(self, provider: LLMProvider) -> float:
+        """Delay before hedging, taken from the provider's latency percentile"""
+        stats = self.stats[provider.key]
+        if stats.samples < self.min_samples:
+            return self.default_hedge_delay
+        return stats.percentile(self.hedge_percentile)
+
+    async def complete(
+        self,
+        system: str,
+        prompt: str,
+        temperature: float = 0.2,
+        max_tokens: int = 2000,
+        preferred: Optional[str] = None,
+        hedge: bool = False,
+        prefix: str = ""
+    ) -> CompletionResult:
+        """Complete a prompt, failing over (or hedging) across providers"""
+        candidates = self.rank(preferred)
+        errors = []
+        kwargs = {"system": system, "prompt": prompt, "temperature": temperature, "max_tokens": max_tokens, "prefix": prefix}
+
+        while candidates:
+            primary = candidates.pop(0)
+            if hedge and candidates:
+                secondary = candidates.pop(0)
+                result = await self._hedged(primary, secondary, errors, kwargs)
+            else:
+                result = await self._attempt(primary, errors, kwargs)
+            if result is not None:
+                return result
+            if errors and isinstance(errors[-1][1], DeadlineExceededError):
+                # Out of time: another provider cannot help
+                raise errors[-1][1]
+
+        # Every provider shed the request: surface backpressure rather than a failure
+        if errors and all(isinstance(error, OverloadedError) for _, error in errors):
+            raise min((error for _, error in errors), key=lambda error: error.retry_after)
+        raise ProviderUnavailableError(errors)
+
+    async def _call(self, provider: LLMProvider, kwargs: Dict) -> CompletionResult:
+        """Call one provider and record its latency or failure"""
+        stats = self.stats[provider.key]
+        started = time.monotonic()
+        try:
+            result = await provider.complete(**kwargs)
+        except (asyncio.CancelledError, OverloadedError, DeadlineExceededError):
+            raise
+        except Exception:
+            stats.record_failure()
+            raise
+        stats.record_success(time.monotonic() - started)
+        return result
+
+    async def _attempt(self, provider: LLMProvider, errors: List, kwargs: Dict) -> Optional[CompletionResult]:
+        try:
+            return await self._call(provider, kwargs)
+        except Exception as e:
+            errors.append((provider, e))
+            return None
+
+    async def _hedged(self, primary: LLMProvider, secondary: LLMProvider, errors: List, kwargs: Dict) -> Optional[CompletionResult]:
+        """Start primary, add secondary after the hedge delay; first success wins"""
+        tasks = {asyncio.create_task(self._call(primary, kwargs)): primary}
+        starts = {primary.key: time.monotonic()}
+        won = False
+
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay(primary))
+            for task in done:
+                provider = tasks.pop(task)
+                if task.exception() is None:
+                    won = True
+                    return task.result()
+                errors.append((provider, task.exception()))
+
+            tasks[asyncio.create_task(self._call(secondary, kwargs))] = secondary
+            starts[secondary.key] = time.monotonic()
+
+            while tasks:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    provider = tasks.pop(task)
+                    if task.exception() is None:
+                        if provider is secondary:
+                            self.stats[provider.key].hedges_won += 1
+                        won = True
+                        return task.result()
+                    errors.append((provider, task.exception()))
+            return None
+        finally:
+            # Cancel the losing (or abandoned) request
+            now = time.monotonic()
+            for task, provider in tasks.items():
+                task.cancel()
+                if won:
+                    # Sample the loser's latency as the time it had taken so far, so a provider
+                    # that keeps losing hedges is not ranked on its rare fast completions
+                    self.stats[provider.key].record_censored(now - starts[provider.key])
+
+    def snapshot(self) -> Dict:
+        return {provider.key: self.stats[provider.key].snapshot() for provider in self.providers}
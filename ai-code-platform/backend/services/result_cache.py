@@ -0,0 +1,284 @@
+import fcntl
+import glob
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from core.config import settings
+from core.metrics import metrics
+
+try:
+    import redis.asyncio as aioredis
+    from redis.exceptions import RedisError
+except ImportError:  # pragma: no cover - redis is in requirements.txt
+    aioredis = None
+    RedisError = OSError
+
+class SharedMemoryCache:
+    """Fixed-size, set-associative hash table in a memory-mapped file.
+
+    Every worker process on a host maps the same file (``/dev/shm`` by
+    default), so an entry written by one worker is a hit for all of them.
+    A key hashes to one set of ``ways`` slots; each set has its own byte-range
+    lock and CLOCK hand, and eviction gives recently read entries a second
+    chance. Values that do not fit in a slot are not stored.
+
+    get and set are called from the event loop, so they never wait for a
+    set another worker has locked: a busy set is a miss, or a skipped store.
+
+    The table lives at ``<path>.<sets>x<ways>x<slot_size>.v<VERSION>``, so a
+    worker started with a different geometry creates its own file instead of
+    resizing one that running workers have mapped (which would SIGBUS them).
+    """
+
+    MAGIC = b"ACPC"
+    VERSION = 1
+    HEADER = struct.Struct("<4sIIII")  # magic, version, sets, ways, slot_size
+    SLOT = struct.Struct("<16sBId")  # key digest, referenced bit, value length, expires_at
+    DATA_OFFSET = 64
+    EMPTY = bytes(16)
+
+    def __init__(self, path: str, sets: Optional[int] = None, ways: Optional[int] = None, slot_size: Optional[int] = None):
+        sets = sets or settings.RESULT_CACHE_SETS
+        ways = ways or settings.RESULT_CACHE_WAYS
+        slot_size = slot_size or settings.RESULT_CACHE_SLOT_BYTES
+        if slot_size <= self.SLOT.size:
+            raise ValueError(f"slot_size must exceed the {self.SLOT.size}-byte slot header")
+        self.base_path = path
+        self.path = f"{path}.{sets}x{ways}x{slot_size}.v{self.VERSION}"
+        self.sets = sets
+        self.ways = ways
+        self.slot_size = slot_size
+        self.max_value_size = slot_size - self.SLOT.size
+        # Set i's CLOCK hand lives at hands_offset + i, which is also the byte locked for that set
+        self.hands_offset = self.DATA_OFFSET
+        self.slots_offset = self.hands_offset + (sets + 63) // 64 * 64
+        self.size = self.slots_offset + sets * ways * slot_size
+        # POSIX record locks are per process, so threads in one worker also serialise here
+        self._thread_lock = threading.Lock()
+
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            self._initialize()
+            self.mm = mmap.mmap(self.fd, self.size)
+        except BaseException:
+            os.close(self.fd)
+            raise
+
+    def get(self, key: str) -> Optional[bytes]:
+        digest, set_index = self._locate(key)
+        now = time.time()
+        with self._locked(set_index, fcntl.LOCK_SH, blocking=False) as locked:
+            if not locked:
+                return None
+            for offset in self._set_slots(set_index):
+                stored, _, length, expires_at = self.SLOT.unpack_from(self.mm, offset)
+                if stored != digest:
+                    continue
+                if expires_at and expires_at < now:
+                    return None
+                # A racy single-byte write is fine: the bit is only a hint for eviction
+                self.mm[offset + 16] = 1
+                start = offset + self.SLOT.size
+                return bytes(self.mm[start:start + length])
+        return None
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        """Store a value, evicting within its set; returns False if it is too large or its set is busy"""
+        if len(value) > self.max_value_size:
+            metrics.increment("result_cache_oversized")
+            return False
+        digest, set_index = self._locate(key)
+        expires_at = time.time() + ttl if ttl else 0.0
+        with self._locked(set_index, fcntl.LOCK_EX, blocking=False) as locked:
+            if not locked:
+                return False
+            offset = self._find_slot(set_index, digest)
+            # New entries start unreferenced so one-off results are evicted before re-read ones
+            self.SLOT.pack_into(self.mm, offset, digest, 0, len(value), expires_at)
+            start = offset + self.SLOT.size
+            self.mm[start:start + len(value)] = value
+        return True
+
+    def delete(self, key: str):
+        digest, set_index = self._locate(key)
+        with self._locked(set_index, fcntl.LOCK_EX):
+            for offset in self._set_slots(set_index):
+                if self.mm[offset:offset + 16] == digest:
+                    self.SLOT.pack_into(self.mm, offset, self.EMPTY, 0, 0, 0.0)
+
+    def stats(self) -> Dict:
+        """Occupancy from an unlocked scan; approximate while other workers write"""
+        now = time.time()
+        entries = 0
+        for set_index in range(self.sets):
+            for offset in self._set_slots(set_index):
+                stored, _, _, expires_at = self.SLOT.unpack_from(self.mm, offset)
+                if stored != self.EMPTY and not (expires_at and expires_at < now):
+                    entries += 1
+        return {"entries": entries, "capacity": self.sets * self.ways, "bytes": self.size}
+
+    def close(self):
+        self.mm.close()
+        os.close(self.fd)
+
+    def _initialize(self):
+        """Create the table, or attach to one another worker already created"""
+        fcntl.lockf(self.fd, fcntl.LOCK_EX, self.DATA_OFFSET, 0)
+        try:
+            header = os.pread(self.fd, self.HEADER.size, 0)
+            expected = self.HEADER.pack(self.MAGIC, self.VERSION, self.sets, self.ways, self.slot_size)
+            if header == expected and os.fstat(self.fd).st_size == self.size:
+                return
+            # A new file: the name fixes the geometry, so it never shrinks under another worker's mapping
+            os.ftruncate(self.fd, self.size)
+            os.pwrite(self.fd, expected, 0)
+            self._remove_other_geometries()
+        finally:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN, self.DATA_OFFSET, 0)
+
+    def _remove_other_geometries(self):
+        """Unlink tables of earlier geometries; workers still mapping one keep it until they exit"""
+        for other in glob.glob(glob.escape(self.base_path) + ".*x*x*.v*"):
+            if other != self.path:
+                try:
+                    os.unlink(other)
+                except FileNotFoundError:
+                    pass
+
+    def _locate(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf8"), digest_size=16).digest()
+        return digest, int.from_bytes(digest[:8], "little") % self.sets
+
+    def _set_slots(self, set_index: int):
+        base = self.slots_offset + set_index * self.ways * self.slot_size
+        return range(base, base + self.ways * self.slot_size, self.slot_size)
+
+    def _find_slot(self, set_index: int, digest: bytes) -> int:
+        """Slot for a key: its existing slot, an empty or expired one, or the CLOCK victim"""
+        now = time.time()
+        slots = list(self._set_slots(set_index))
+        free = None
+        for offset in slots:
+            stored, _, _, expires_at = self.SLOT.unpack_from(self.mm, offset)
+            if stored == digest:
+                return offset
+            if free is None and (stored == self.EMPTY or (expires_at and expires_at < now)):
+                free = offset
+        if free is not None:
+            return free
+
+        hand_offset = self.hands_offset + set_index
+        hand = self.mm[hand_offset] % self.ways
+        while self.mm[slots[hand] + 16]:
+            # Second chance: clear the referenced bit and move on
+            self.mm[slots[hand] + 16] = 0
+            hand = (hand + 1) % self.ways
+        self.mm[hand_offset] = (hand + 1) % self.ways
+        metrics.increment("result_cache_evictions")
+        return slots[hand]
+
+    @contextmanager
+    def _locked(self, set_index: int, mode: int, blocking: bool = True):
+        """Lock a set, yielding whether the lock was taken; only a non-blocking attempt can fail"""
+        if not self._thread_lock.acquire(blocking):
+            metrics.increment("result_cache_lock_busy")
+            yield False
+            return
+        try:
+            try:
+                fcntl.lockf(self.fd, mode if blocking else mode | fcntl.LOCK_NB, 1, self.hands_offset + set_index)
+            except (BlockingIOError, PermissionError):
+                # lockf reports a lock held by another process as EAGAIN or EACCES
+                metrics.increment("result_cache_lock_busy")
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN, 1, self.hands_offset + set_index)
+        finally:
+            self._thread_lock.release()
+
+class ResultCache:
+    """Two-tier cache for review and analysis results.
+
+    Lookups try the host-local shared-memory table first and fall back to
+    Redis, copying Redis hits into shared memory so the next lookup on this
+    host skips the network round trip. Either tier may be absent, and Redis
+    errors are counted and treated as misses.
+    """
+
+    def __init__(self, local: Optional[SharedMemoryCache] = None, redis_client=None, ttl: Optional[float] = None):
+        self.local = local
+        self.redis = redis_client
+        self.ttl = ttl if ttl is not None else settings.RESULT_CACHE_TTL
+
+    @staticmethod
+    def key(namespace: str, *parts) -> str:
+        """Cache key for a result determined by parts and RESULT_VERSION, so results
+        cached before an analyzer or prompt change are never served after it"""
+        material = json.dumps([settings.RESULT_VERSION, *parts], sort_keys=True, default=str)
+        return f"acp:{namespace}:{hashlib.sha256(material.encode('utf8')).hexdigest()}"
+
+    async def get(self, key: str) -> Optional[Dict]:
+        namespace = key.split(":")[1]
+        if self.local is not None:
+            value = self.local.get(key)
+            if value is not None:
+                metrics.increment("result_cache_hits", labels={"namespace": namespace, "tier": "shared_memory"})
+                return json.loads(value)
+
+        if self.redis is not None:
+            try:
+                value = await self.redis.get(key)
+            except (RedisError, OSError):
+                metrics.increment("result_cache_errors", labels={"tier": "redis"})
+                value = None
+            if value is not None:
+                metrics.increment("result_cache_hits", labels={"namespace": namespace, "tier": "redis"})
+                if self.local is not None:
+                    self.local.set(key, value, self.ttl)
+                return json.loads(value)
+
+        metrics.increment("result_cache_misses", labels={"namespace": namespace})
+        return None
+
+    async def set(self, key: str, payload: Dict):
+        value = json.dumps(payload).encode("utf8")
+        if self.local is not None:
+            self.local.set(key, value, self.ttl)
+        if self.redis is not None:
+            try:
+                await self.redis.set(key, value, ex=int(self.ttl) if self.ttl else None)
+            except (RedisError, OSError):
+                metrics.increment("result_cache_errors", labels={"tier": "redis"})
+
+    def stats(self) -> Dict:
+        return {
+            "shared_memory": self.local.stats() if self.local is not None else None,
+            "redis": self.redis is not None
+        }
+
+_cache: Optional[ResultCache] = None
+
+def get_result_cache() -> Optional[ResultCache]:
+    """Return the process-wide result cache, or None when disabled"""
+    global _cache
+    if _cache is None and settings.RESULT_CACHE_ENABLED:
+        path = settings.RESULT_CACHE_PATH
+        if not path:
+            directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+            path = os.path.join(directory, "ai-code-platform-results")
+        local = SharedMemoryCache(path)
+        redis_client = aioredis.from_url(settings.REDIS_URL) if aioredis is not None and settings.REDIS_URL else None
+        _cache = ResultCache(local, redis_client)
+        metrics.register_collector("result_cache", _cache.stats)
+    return _cache
@@ -0,0 +1,108 @@
+"""Tree-sitter rule packs for the static review engine.
+
+Each pack is a single query per grammar so a file is analysed in one pass.
+Capture names drive the engine:
+
+- ``@function``: a function-like node; complexity is counted per function
+- ``@branch``: a decision point attributed to the innermost function
+- ``@catch.body``: the block of an exception handler, flagged when empty
+- ``@sql.concat`` / ``@sql.interpolated`` / ``@sql.format``: string building
+  that is reported when the text looks like SQL
+- ``@rule.<name>``: reported directly using ``RULES[<name>]``
+"""
+
+# name -> (severity, category, title, description, suggestion)
+RULES = {
+    "catch_all": ("medium", "best_practice", "Catch-All Exception Handler",
+                  "Handler catches every exception type", "Catch the specific exceptions this code can raise"),
+    "eval": ("high", "security", "Use of eval",
+             "Evaluating dynamic code can execute attacker-controlled input", "Avoid eval; parse or dispatch explicitly"),
+    "inner_html": ("high", "security", "Potential Xss",
+                   "Assigning to innerHTML can inject markup", "Use textContent or sanitize the HTML"),
+    "unwrap": ("low", "bug", "Unchecked unwrap",
+               "unwrap/expect panics on error values", "Propagate the error with ? or handle it explicitly"),
+    "unsafe": ("medium", "security", "Unsafe Block",
+               "Unsafe code bypasses the borrow checker", "Minimise and document unsafe blocks"),
+    "panic": ("low", "best_practice", "Call to panic",
+              "panic aborts the goroutine instead of returning an error", "Return an error to the caller"),
+    "unsafe_c_string": ("high", "security", "Unsafe C String Function",
+                        "Function does not bound the destination buffer", "Use bounded alternatives such as snprintf or std::string"),
+}
+
+LOGICAL_OPERATORS = '["&&" "||"]'
+
+JAVASCRIPT_QUERY = """
+[(function_declaration) (function_expression) (arrow_function) (method_definition) (generator_function_declaration)] @function
+[(if_statement) (for_statement) (for_in_statement) (while_statement) (do_statement) (switch_case) (catch_clause) (ternary_expression)] @branch
+(binary_expression operator: ["&&" "||" "??"]) @branch
+(catch_clause body: (statement_block) @catch.body)
+(binary_expression left: [(string) (template_string)] operator: "+") @sql.concat
+(binary_expression operator: "+" right: [(string) (template_string)]) @sql.concat
+(template_string (template_substitution)) @sql.interpolated
+(call_expression function: (identifier) @_fn (#eq? @_fn "eval")) @rule.eval
+(assignment_expression left: (member_expression property: (property_identifier) @_prop (#eq? @_prop "innerHTML"))) @rule.inner_html
+"""
+
+RULE_PACKS = {
+    "javascript": JAVASCRIPT_QUERY,
+    "typescript": JAVASCRIPT_QUERY,
+    "java": f"""
+[(method_declaration) (constructor_declaration) (lambda_expression)] @function
+[(if_statement) (for_statement) (enhanced_for_statement) (while_statement) (do_statement) (switch_label) (catch_clause) (ternary_expression)] @branch
+(binary_expression operator: {LOGICAL_OPERATORS}) @branch
+(catch_clause (catch_formal_parameter (catch_type (type_identifier) @_type (#match? @_type "^(Exception|Throwable|RuntimeException)$")))) @rule.catch_all
+(catch_clause body: (block) @catch.body)
+(binary_expression left: (string_literal) operator: "+") @sql.concat
+(binary_expression operator: "+" right: (string_literal)) @sql.concat
+(method_invocation name: (identifier) @_method (#match? @_method "^(format|formatted)$")) @sql.format
+""",
+    "go": f"""
+[(function_declaration) (method_declaration) (func_literal)] @function
+[(if_statement) (for_statement) (expression_case) (type_case) (communication_case)] @branch
+(binary_expression operator: {LOGICAL_OPERATORS}) @branch
+(binary_expression left: [(interpreted_string_literal) (raw_string_literal)] operator: "+") @sql.concat
+(binary_expression operator: "+" right: [(interpreted_string_literal) (raw_string_literal)]) @sql.concat
+(call_expression function: (selector_expression field: (field_identifier) @_fn (#match? @_fn "^Sprint"))) @sql.format
+(call_expression function: (identifier) @_fn (#eq? @_fn "panic")) @rule.panic
+""",
+    "rust": f"""
+[(function_item) (closure_expression)] @function
+[(if_expression) (for_expression) (while_expression) (loop_expression) (match_arm)] @branch
+(binary_expression operator: {LOGICAL_OPERATORS}) @branch
+(macro_invocation macro: (identifier) @_macro (#eq? @_macro "format")) @sql.format
+(call_expression function: (field_expression field: (field_identifier) @_method (#match? @_method "^(unwrap|expect)$"))) @rule.unwrap
+(unsafe_block) @rule.unsafe
+""",
+    "cpp": f"""
+[(function_definition) (lambda_expression)] @function
+[(if_statement) (for_statement) (for_range_loop) (while_statement) (do_statement) (case_statement) (catch_clause) (conditional_expression)] @branch
+(binary_expression operator: {LOGICAL_OPERATORS}) @branch
+(catch_clause parameters: (parameter_list "...")) @rule.catch_all
+(catch_clause body: (compound_statement) @catch.body)
+(binary_expression left: (string_literal) operator: "+") @sql.concat
+(binary_expression operator: "+" right: (string_literal)) @sql.concat
+(call_expression function: (identifier) @_fn (#match? @_fn "^(sprintf|snprintf)$")) @sql.format
+(call_expression function: (identifier) @_fn (#match? @_fn "^(strcpy|strcat|gets|sprintf)$")) @rule.unsafe_c_string
+""",
+    "csharp": """
+[(method_declaration) (constructor_declaration) (local_function_statement) (lambda_expression)] @function
+[(if_statement) (for_statement) (foreach_statement) (while_statement) (do_statement) (switch_section) (catch_clause) (conditional_expression)] @branch
+(binary_expression operator: ["&&" "||" "??"]) @branch
+(catch_clause (catch_declaration type: (identifier) @_type (#match? @_type "^(Exception|SystemException)$"))) @rule.catch_all
+(catch_clause body: (block) @catch.body)
+(binary_expression left: (string_literal) operator: "+") @sql.concat
+(binary_expression operator: "+" right: (string_literal)) @sql.concat
+(interpolated_string_expression) @sql.interpolated
+""",
+    "php": """
+[(function_definition) (method_declaration) (anonymous_function_creation_expression) (arrow_function)] @function
+[(if_statement) (else_if_clause) (for_statement) (foreach_statement) (while_statement) (do_statement) (case_statement) (catch_clause) (conditional_expression)] @branch
+(binary_expression operator: ["&&" "||" "and" "or"]) @branch
+(catch_clause type: (type_list (named_type (name) @_type (#match? @_type "^(Exception|Throwable)$")))) @rule.catch_all
+(catch_clause body: (compound_statement) @catch.body)
+(binary_expression left: [(string) (encapsed_string)] operator: ".") @sql.concat
+(binary_expression operator: "." right: [(string) (encapsed_string)]) @sql.concat
+(encapsed_string (variable_name)) @sql.interpolated
+(function_call_expression function: (name) @_fn (#match? @_fn "^(eval|exec|system|shell_exec|passthru)$")) @rule.eval
+""",
+}
@@ -0,0 +1,192 @@
+import json
+import os
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from core.config import settings
+from core.metrics import metrics
+from services.embeddings import Embedder, HashingEmbedder
+
+# Words naming the kind of output asked for. Requests of different kinds never share
+# entries, since "write tests for X" and "implement X" otherwise embed almost alike.
+TASK_KINDS = {
+    "tests": {"test", "tests", "unittest", "unittests", "pytest", "spec", "specs"},
+    "refactor": {"refactor", "refactoring", "rewrite", "restructure", "cleanup"},
+    "fix": {"fix", "debug", "repair", "bugfix"},
+    "docs": {"document", "documentation", "docstring", "docstrings", "comment", "comments"},
+    "optimize": {"optimize", "optimise", "speedup", "faster"},
+    "explain": {"explain", "describe"}
+}
+
+WORD_PATTERN = re.compile(r"[a-z]+")
+
+def request_kind(description: str) -> str:
+    """The kind of output a description asks for; "implement" when it names none"""
+    words = set(WORD_PATTERN.findall(description.lower()))
+    for kind, markers in TASK_KINDS.items():
+        if words & markers:
+            return kind
+    return "implement"
+
+class LocalVectorIndex:
+    """Exact cosine-similarity index over a preallocated NumPy matrix"""
+
+    def __init__(self, dim: int, capacity: int = 1024):
+        self.dim = dim
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.valid = np.zeros(capacity, dtype=bool)
+        self.size = 0
+        self._free: List[int] = []
+
+    def add(self, vector: np.ndarray) -> int:
+        """Insert a normalised vector and return its slot"""
+        if self._free:
+            slot = self._free.pop()
+        else:
+            if self.size == len(self.vectors):
+                self._grow()
+            slot = self.size
+            self.size += 1
+        self.vectors[slot] = vector
+        self.valid[slot] = True
+        return slot
+
+    def remove(self, slot: int):
+        self.valid[slot] = False
+        self._free.append(slot)
+
+    def search(self, vector: np.ndarray, top_k: int = 1) -> List[Tuple[int, float]]:
+        """Return (slot, cosine similarity) pairs for the nearest vectors"""
+        if self.size == 0:
+            return []
+        scores = self.vectors[:self.size] @ vector
+        scores[~self.valid[:self.size]] = -np.inf
+        top_k = min(top_k, self.size)
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        ordered = candidates[np.argsort(-scores[candidates])]
+        return [(int(slot), float(scores[slot])) for slot in ordered if np.isfinite(scores[slot])]
+
+    def _grow(self):
+        capacity = len(self.vectors) * 2
+        vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+        vectors[:self.size] = self.vectors[:self.size]
+        valid = np.zeros(capacity, dtype=bool)
+        valid[:self.size] = self.valid[:self.size]
+        self.vectors, self.valid = vectors, valid
+
+@dataclass
+class CacheLookup:
+    payload: Optional[Dict]
+    score: float
+    vector: np.ndarray
+
+class SemanticCache:
+    """Nearest-neighbour cache of generation results keyed on description embeddings.
+
+    Entries are partitioned by language and request kind (see request_kind) so
+    a Python answer is never served for Go, nor an implementation for a request
+    for tests. The least recently used entry is evicted once max_entries is
+    reached.
+    """
+
+    def __init__(
+        self,
+        embedder: Optional[Embedder] = None,
+        threshold: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        path: Optional[str] = None,
+        save_interval: Optional[int] = None
+    ):
+        self.embedder = embedder or HashingEmbedder(settings.SEMANTIC_CACHE_DIM)
+        self.threshold = threshold if threshold is not None else settings.SEMANTIC_CACHE_THRESHOLD
+        self.max_entries = max_entries or settings.SEMANTIC_CACHE_MAX_ENTRIES
+        self.path = path if path is not None else settings.SEMANTIC_CACHE_PATH
+        self.save_interval = save_interval or settings.SEMANTIC_CACHE_SAVE_INTERVAL
+        self.indexes: Dict[str, LocalVectorIndex] = {}
+        self.entries: "OrderedDict[Tuple[str, int], Dict]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._unsaved = 0
+
+        if self.path and os.path.exists(self.path + ".json"):
+            self.load()
+
+    async def lookup(self, description: str, language: str) -> CacheLookup:
+        """Find the closest cached result above the similarity threshold"""
+        vector = (await self.embedder.embed([description]))[0]
+        partition = self._partition(description, language)
+        index = self.indexes.get(partition)
+        matches = index.search(vector, top_k=1) if index else []
+
+        if matches and matches[0][1] >= self.threshold:
+            key = (partition, matches[0][0])
+            self.entries.move_to_end(key)
+            self.hits += 1
+            metrics.increment("semantic_cache_hits", labels={"language": language})
+            return CacheLookup(payload=self.entries[key]["payload"], score=matches[0][1], vector=vector)
+
+        self.misses += 1
+        metrics.increment("semantic_cache_misses", labels={"language": language})
+        return CacheLookup(payload=None, score=matches[0][1] if matches else 0.0, vector=vector)
+
+    async def store(self, description: str, language: str, payload: Dict, vector: Optional[np.ndarray] = None):
+        """Cache a result, evicting the least recently used entry when full"""
+        if vector is None:
+            vector = (await self.embedder.embed([description]))[0]
+
+        while len(self.entries) >= self.max_entries:
+            (old_partition, old_slot), _ = self.entries.popitem(last=False)
+            self.indexes[old_partition].remove(old_slot)
+            self.evictions += 1
+
+        partition = self._partition(description, language)
+        index = self.indexes.setdefault(partition, LocalVectorIndex(self.embedder.dim))
+        slot = index.add(vector)
+        self.entries[(partition, slot)] = {"description": description, "payload": payload}
+
+        self._unsaved += 1
+        if self.path and self._unsaved >= self.save_interval:
+            self.save()
+
+    def _partition(self, description: str, language: str) -> str:
+        return f"{language}:{request_kind(description)}"
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+    def save(self):
+        """Persist vectors (.npz) and entries (.json) to the configured path"""
+        arrays = {partition: index.vectors[:index.size] for partition, index in self.indexes.items()}
+        np.savez(self.path + ".npz", **arrays)
+        entries = [
+            {"partition": partition, "slot": slot, **entry}
+            for (partition, slot), entry in self.entries.items()
+        ]
+        with open(self.path + ".json", "w") as f:
+            json.dump(entries, f)
+        self._unsaved = 0
+
+    def load(self):
+        """Restore a cache written by save(), keeping LRU order"""
+        with open(self.path + ".json") as f:
+            entries = json.load(f)
+        arrays = np.load(self.path + ".npz")
+
+        for entry in entries:
+            partition = entry.pop("partition")
+            old_slot = entry.pop("slot")
+            index = self.indexes.setdefault(partition, LocalVectorIndex(self.embedder.dim))
+            slot = index.add(arrays[partition][old_slot])
+            self.entries[(partition, slot)] = entry
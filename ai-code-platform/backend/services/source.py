@@ -0,0 +1,92 @@
+import re
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+from typing import List, Optional, Union
+
+class SourceDocument:
+    """The code of one request, shared by every analyzer that looks at it.
+
+    The text is split into lines and encoded to UTF-8 at most once, on first
+    use. Line-start offsets (characters and bytes) are built lazily and map
+    offsets back to 1-based line numbers by binary search; ``line_view``
+    slices the UTF-8 buffer without copying.
+    """
+
+    __slots__ = ("text", "_data", "_lines", "_line_starts", "_byte_line_starts")
+
+    def __init__(self, text: str):
+        self.text = text
+        self._data: Optional[bytes] = None
+        self._lines: Optional[List[str]] = None
+        self._line_starts: Optional[array] = None
+        self._byte_line_starts: Optional[array] = None
+
+    @classmethod
+    def of(cls, source: Union[str, "SourceDocument"]) -> "SourceDocument":
+        """Wrap a string, or return an existing document unchanged"""
+        return source if isinstance(source, SourceDocument) else cls(source or "")
+
+    @property
+    def data(self) -> bytes:
+        """UTF-8 encoding of the text, as tree-sitter expects"""
+        if self._data is None:
+            self._data = self.text.encode("utf8")
+        return self._data
+
+    @property
+    def lines(self) -> List[str]:
+        """The text split on newlines; do not mutate"""
+        if self._lines is None:
+            self._lines = self.text.split('\n')
+        return self._lines
+
+    @property
+    def line_count(self) -> int:
+        return len(self.lines)
+
+    def line(self, number: int) -> str:
+        """Line by 1-based number, or "" when out of range"""
+        return self.lines[number - 1] if 0 < number <= len(self.lines) else ""
+
+    def line_view(self, number: int) -> memoryview:
+        """UTF-8 bytes of a 1-based line as a zero-copy view (without the newline)"""
+        starts = self.byte_line_starts
+        if not 0 < number <= len(starts):
+            return memoryview(b"")
+        end = starts[number] - 1 if number < len(starts) else len(self.data)
+        return memoryview(self.data)[starts[number - 1]:end]
+
+    @property
+    def line_starts(self) -> array:
+        """Character offset at which each line starts"""
+        if self._line_starts is None:
+            self._line_starts = array('Q', accumulate((len(line) + 1 for line in self.lines[:-1]), initial=0))
+        return self._line_starts
+
+    @property
+    def byte_line_starts(self) -> array:
+        """Byte offset in ``data`` at which each line starts"""
+        if self._byte_line_starts is None:
+            starts = array('Q', [0])
+            starts.extend(match.end() for match in re.finditer(b'\n', self.data))
+            self._byte_line_starts = starts
+        return self._byte_line_starts
+
+    def line_of_offset(self, offset: int) -> int:
+        """1-based line containing a character offset"""
+        return bisect_right(self.line_starts, offset)
+
+    def line_of_byte(self, offset: int) -> int:
+        """1-based line containing a byte offset into ``data``"""
+        return bisect_right(self.byte_line_starts, offset)
+
+    def offset_of_line(self, number: int) -> int:
+        """Character offset of the start of a 1-based line"""
+        return self.line_starts[number - 1]
+
+    def is_blank(self) -> bool:
+        return not self.text.strip()
+
+    def __len__(self) -> int:
+        return len(self.text)
@@ -1,12 +1,20 @@
 import ast
 import asyncio
-from typing import Dict, List, Optional
+import re
+from typing import Dict, List, Optional, Tuple, Union
 from dataclasses import dataclass
 import openai
 from tree_sitter import Language, Parser
 import tree_sitter_python as tspython
 
 from core.config import settings
+from core.concurrency import DeadlineExceededError, OverloadedError
+from services.llm_providers import BatchOutput, BatchRequest, OpenAIProvider
+from services.model_tiers import ComplexityProfile, get_model_tier_policy
+from services.source import SourceDocument
+from services.test_runner import MODULE_NAME, SandboxResult, get_sandbox_pool
+
+CODE_BLOCK_PATTERN = re.compile(r"```[\w+-]*\n(.*?)```", re.DOTALL)
 
 @dataclass
 class TestGenerationResult:
@@ -15,6 +23,7 @@ class TestGenerationResult:
     mocks: List[str]
     test_count: int
     estimated_coverage: float
+    validation: Optional[Dict] = None
 
 class TestAnalyzer:
     def __init__(self):
@@ -22,19 +31,20 @@ class TestAnalyzer:
         self.parser = Parser()
         self.parser.set_language(self.PY_LANGUAGE)
     
-    def analyze_code_structure(self, code: str, language: str) -> Dict:
+    def analyze_code_structure(self, code: Union[str, SourceDocument], language: str) -> Dict:
         """Analyze code structure to identify testable components"""
+        doc = SourceDocument.of(code)
         if language == "python":
-            return self._analyze_python_code(code)
+            return self._analyze_python_code(doc)
         elif language in ["javascript", "typescript"]:
-            return self._analyze_js_code(code)
+            return self._analyze_js_code(doc)
         else:
-            return self._generic_analysis(code)
+            return self._generic_analysis(doc)
     
-    def _analyze_python_code(self, code: str) -> Dict:
+    def _analyze_python_code(self, doc: SourceDocument) -> Dict:
         """Analyze Python code structure"""
         try:
-            tree = ast.parse(code)
+            tree = ast.parse(doc.data)
             analysis = {
                 "functions": [],
                 "classes": [],
@@ -75,14 +85,13 @@ class TestAnalyzer:
         except Exception as e:
             return {"error": str(e), "functions": [], "classes": [], "imports": []}
     
-    def _analyze_js_code(self, code: str) -> Dict:
+    def _analyze_js_code(self, doc: SourceDocument) -> Dict:
         """Basic JavaScript/TypeScript analysis"""
-        lines = code.split('\n')
         functions = []
         classes = []
         imports = []
         
-        for i, line in enumerate(lines):
+        for i, line in enumerate(doc.lines):
             line = line.strip()
             if line.startswith('function ') or 'function(' in line:
                 func_name = self._extract_js_function_name(line)
@@ -101,9 +110,9 @@ class TestAnalyzer:
             "complexity": len(functions) + len(classes)
         }
     
-    def _generic_analysis(self, code: str) -> Dict:
+    def _generic_analysis(self, doc: SourceDocument) -> Dict:
         """Generic code analysis for unsupported languages"""
-        lines = code.split('\n')
+        lines = doc.lines
         return {
             "functions": [],
             "classes": [],
@@ -143,6 +152,8 @@ class TestAnalyzer:
 class TestGeneratorService:
     def __init__(self):
         self.openai_client = openai.AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+        self.provider = OpenAIProvider(self.openai_client)
+        self.tiers = get_model_tier_policy()
         self.analyzer = TestAnalyzer()
     
     async def generate_tests(
@@ -165,33 +176,78 @@ class TestGeneratorService:
         else:
             tests = await self._generate_comprehensive_tests(code, language, analysis)
         
+        return await self._finish_tests(code, language, analysis, tests, coverage_target)
+    
+    def batch_request(self, code: str, language: str) -> BatchRequest:
+        """Unit test generation for the code as a provider batch request (see tests_from_batch)"""
+        analysis = self.analyzer.analyze_code_structure(code, language)
+        system, prefix, prompt = self._unit_test_prompt(code, language, analysis)
+        profile = ComplexityProfile.from_analysis(analysis, code)
+        options = self.tiers.call_options(self.provider, "unit_tests", profile, self.tiers.select(profile))
+        return BatchRequest(
+            custom_id="0",
+            system=system,
+            prompt=prompt,
+            prefix=prefix,
+            temperature=0.1,
+            max_tokens=options["max_tokens"],
+            model=options.get("model")
+        )
+    
+    async def tests_from_batch(self, code: str, language: str, output: BatchOutput, coverage_target: float = 0.8) -> TestGenerationResult:
+        """Validate and score the unit tests a batch produced for the request from batch_request"""
+        analysis = self.analyzer.analyze_code_structure(code, language)
+        tests = output.text if output.text is not None else f"# Error generating tests: {output.error}\n# Please check your API configuration"
+        return await self._finish_tests(code, language, analysis, tests, coverage_target)
+    
+    async def _finish_tests(self, code: str, language: str, analysis: Dict, tests: str, coverage_target: float) -> TestGenerationResult:
+        """Add mocks, run the tests in the sandbox where supported and report coverage"""
         # Generate mocks for dependencies
         mocks = self._generate_mocks(analysis)
         
+        # Run the generated tests in the sandbox to measure real coverage
+        validation = None
+        if language == "python" and settings.TEST_SANDBOX_ENABLED:
+            validation = await get_sandbox_pool().run(code, self._extract_test_code(tests))
+        
         # Calculate coverage analysis
-        coverage_analysis = self._analyze_coverage(analysis, coverage_target)
+        coverage_analysis = self._analyze_coverage(analysis, coverage_target, validation)
         
         return TestGenerationResult(
             tests=tests,
             coverage_analysis=coverage_analysis,
             mocks=mocks,
-            test_count=len(analysis.get("functions", [])) + len(analysis.get("classes", [])),
-            estimated_coverage=min(coverage_target, 0.95)
+            test_count=validation.passed + validation.failed if validation else len(analysis.get("functions", [])) + len(analysis.get("classes", [])),
+            estimated_coverage=validation.line_coverage if validation else min(coverage_target, 0.95),
+            validation=validation.to_dict() if validation else None
         )
     
     async def _generate_unit_tests(self, code: str, language: str, analysis: Dict) -> str:
         """Generate unit tests for individual functions and methods"""
-        prompt = f"""Generate comprehensive unit tests for the following {language} code:
-
-CODE:
-```{language}
-{code}
-```
-
-ANALYSIS:
-- Functions: {len(analysis.get('functions', []))}
-- Classes: {len(analysis.get('classes', []))}
-- Complexity: {analysis.get('complexity', 0)}
+        system, prefix, prompt = self._unit_test_prompt(code, language, analysis)
+        
+        try:
+            # Simple code goes to a faster model, and the output budget follows the number of functions
+            completion = await self.tiers.complete(
+                self.provider,
+                "unit_tests",
+                ComplexityProfile.from_analysis(analysis, code),
+                system=system,
+                prompt=prompt,
+                prefix=prefix,
+                temperature=0.1
+            )
+            
+            return completion.text
+        except (OverloadedError, DeadlineExceededError):
+            raise
+        except Exception as e:
+            return f"# Error generating tests: {str(e)}\n# Please check your API configuration"
+    
+    def _unit_test_prompt(self, code: str, language: str, analysis: Dict) -> Tuple[str, str, str]:
+        """System message, stable prefix and variable prompt for unit test generation"""
+        # Fixed instructions first so they form a prefix the provider can cache
+        prefix = f"""Generate comprehensive unit tests for the {language} code given at the end of this message.
 
 REQUIREMENTS:
 1. Test all public functions and methods
@@ -200,34 +256,26 @@ REQUIREMENTS:
 4. Use appropriate testing framework ({self._get_test_framework(language)})
 5. Include setup and teardown if needed
 6. Add descriptive test names and comments
-7. Achieve high code coverage
+7. Achieve high code coverage{self._import_requirement(language, 8)}
 
 Generate complete, runnable test code with proper imports and structure.
 """
-        
-        try:
-            response = await self.openai_client.chat.completions.create(
-                model="gpt-4-turbo-preview",
-                messages=[
-                    {"role": "system", "content": f"You are an expert test engineer specializing in {language} testing."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.1,
-                max_tokens=3000
-            )
-            
-            return response.choices[0].message.content
-        except Exception as e:
-            return f"# Error generating tests: {str(e)}\n# Please check your API configuration"
-    
-    async def _generate_integration_tests(self, code: str, language: str, analysis: Dict) -> str:
-        """Generate integration tests for component interactions"""
-        prompt = f"""Generate integration tests for the following {language} code:
+        prompt = f"""
+ANALYSIS:
+- Functions: {len(analysis.get('functions', []))}
+- Classes: {len(analysis.get('classes', []))}
+- Complexity: {analysis.get('complexity', 0)}
 
 CODE:
 ```{language}
 {code}
 ```
+"""
+        return f"You are an expert test engineer specializing in {language} testing.", prefix, prompt
+    
+    async def _generate_integration_tests(self, code: str, language: str, analysis: Dict) -> str:
+        """Generate integration tests for component interactions"""
+        prefix = f"""Generate integration tests for the {language} code given at the end of this message.
 
 Focus on:
 1. Testing interactions between components
@@ -235,23 +283,31 @@ Focus on:
 3. API endpoints (if applicable)
 4. External service integrations
 5. End-to-end workflows
-6. Data flow validation
+6. Data flow validation{self._import_requirement(language, 7)}
 
 Use appropriate testing tools and frameworks for {language}.
+"""
+        prompt = f"""
+CODE:
+```{language}
+{code}
+```
 """
         
         try:
-            response = await self.openai_client.chat.completions.create(
-                model="gpt-4-turbo-preview",
-                messages=[
-                    {"role": "system", "content": f"You are an expert integration test engineer for {language}."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.1,
-                max_tokens=2500
+            completion = await self.tiers.complete(
+                self.provider,
+                "integration_tests",
+                ComplexityProfile.from_analysis(analysis, code),
+                system=f"You are an expert integration test engineer for {language}.",
+                prompt=prompt,
+                prefix=prefix,
+                temperature=0.1
             )
             
-            return response.choices[0].message.content
+            return completion.text
+        except (OverloadedError, DeadlineExceededError):
+            raise
         except Exception as e:
             return f"# Error generating integration tests: {str(e)}"
     
@@ -281,19 +337,33 @@ Use appropriate testing tools and frameworks for {language}.
 @patch('{import_name}')
 def mock_{import_name.replace('.', '_')}():
     mock = MagicMock()
-    mock.return_value = {{"status": "success", "data": {{}}}
+    mock.return_value = {{"status": "success", "data": {{}}}}
     return mock
 """
                 mocks.append(mock_code.strip())
         
         return mocks
     
-    def _analyze_coverage(self, analysis: Dict, target: float) -> Dict:
-        """Analyze potential test coverage"""
+    def _import_requirement(self, language: str, number: int) -> str:
+        """Tell the model how the sandbox exposes the code under test"""
+        if language != "python":
+            return ""
+        return f"\n{number}. Import the code under test from a module named `{MODULE_NAME}`"
+    
+    def _extract_test_code(self, tests: str) -> str:
+        """Pull the runnable code out of a (possibly markdown-formatted) response"""
+        blocks = CODE_BLOCK_PATTERN.findall(tests)
+        return "\n\n".join(blocks) if blocks else tests
+    
+    def _analyze_coverage(self, analysis: Dict, target: float, validation: Optional[SandboxResult] = None) -> Dict:
+        """Analyze potential test coverage, using measured results when the tests were run"""
         total_functions = len(analysis.get("functions", []))
         total_classes = len(analysis.get("classes", []))
         total_testable = total_functions + total_classes
         
+        if validation is not None:
+            return self._measured_coverage(validation, target, total_functions, total_classes)
+        
         if total_testable == 0:
             return {"coverage": 0, "testable_items": 0, "recommendations": ["No testable code found"]}
         
@@ -313,6 +383,33 @@ def mock_{import_name.replace('.', '_')}():
             ]
         }
     
+    def _measured_coverage(self, validation: SandboxResult, target: float, total_functions: int, total_classes: int) -> Dict:
+        """Coverage analysis from an actual sandbox run"""
+        recommendations = []
+        if validation.error:
+            recommendations.append(validation.error)
+        if validation.failed or validation.errors:
+            recommendations.append(f"Fix {validation.failed + validation.errors} failing or erroring tests")
+        if validation.missing_lines:
+            recommendations.append(f"Add tests covering lines {', '.join(map(str, validation.missing_lines[:20]))}")
+        if validation.line_coverage < target:
+            recommendations.append(f"Line coverage {validation.line_coverage:.0%} is below the {target:.0%} target")
+        
+        return {
+            "target_coverage": target,
+            "measured": True,
+            "line_coverage": validation.line_coverage,
+            "branch_coverage": validation.branch_coverage,
+            "missing_lines": validation.missing_lines,
+            "tests_passed": validation.passed,
+            "tests_failed": validation.failed,
+            "tests_errored": validation.errors,
+            "testable_functions": total_functions,
+            "testable_classes": total_classes,
+            "total_testable_items": total_functions + total_classes,
+            "recommendations": recommendations or ["Generated tests pass and meet the coverage target"]
+        }
+    
     def _get_test_framework(self, language: str) -> str:
         """Get appropriate testing framework for language"""
         frameworks = {
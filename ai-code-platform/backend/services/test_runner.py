@@ -0,0 +1,322 @@
+import asyncio
+import contextlib
+import ctypes
+import io
+import json
+import math
+import multiprocessing
+import os
+import signal
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+try:
+    import pwd
+    import resource
+except ImportError:  # Not available on Windows; runs there are only wall-clock limited
+    pwd = resource = None
+
+from core.config import settings
+from core.metrics import metrics
+
+MODULE_NAME = "module_under_test"
+TEST_MODULE_NAME = "test_module_under_test"
+
+# Extra time the parent waits beyond the in-worker limits before killing the pool
+KILL_GRACE_SECONDS = 5.0
+
+CLONE_NEWNET = 0x40000000
+
+@dataclass
+class SandboxResult:
+    passed: int = 0
+    failed: int = 0
+    errors: int = 0
+    skipped: int = 0
+    line_coverage: float = 0.0
+    branch_coverage: Optional[float] = None
+    covered_lines: List[int] = field(default_factory=list)
+    missing_lines: List[int] = field(default_factory=list)
+    duration: float = 0.0
+    timed_out: bool = False
+    error: Optional[str] = None
+    output: str = ""
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+# Worker-side code: everything below runs inside the pool processes
+
+_worker_state = {"limit": None, "armed": False}
+
+class _ResultCollector:
+    """pytest plugin that tallies outcomes into a SandboxResult"""
+
+    def __init__(self, result: SandboxResult):
+        self.result = result
+
+    def pytest_collectreport(self, report):
+        if report.failed:
+            self.result.errors += 1
+
+    def pytest_runtest_logreport(self, report):
+        if report.skipped:
+            self.result.skipped += 1
+        elif report.failed:
+            if report.when == "call":
+                self.result.failed += 1
+            else:
+                self.result.errors += 1
+        elif report.when == "call":
+            self.result.passed += 1
+
+def _limit_exceeded(signum, frame):
+    import pytest
+    if not _worker_state["armed"]:
+        return
+    _worker_state["limit"] = "cpu" if signum == getattr(signal, "SIGXCPU", None) else "time"
+    pytest.exit(f"sandbox {_worker_state['limit']} limit exceeded", returncode=3)
+
+def _init_worker(memory_limit_mb: int, user: str, max_open_files: int, max_processes: int, env: List[str]):
+    """Load the test tooling, then lock the worker down before it runs any test code.
+
+    The worker gets a capped address space, no network (its own empty network
+    namespace where it may create one, and a socket module that refuses
+    anything but Unix sockets everywhere), an unprivileged user when started
+    as root, limits on open files and child processes, and only the
+    allowlisted environment variables.
+    """
+    import coverage  # noqa: F401
+    import pytest  # noqa: F401
+
+    if resource is not None and memory_limit_mb:
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    _isolate_network()
+    if pwd is not None and user and os.geteuid() == 0:
+        account = pwd.getpwnam(user)
+        os.setgroups([])
+        os.setgid(account.pw_gid)
+        os.setuid(account.pw_uid)
+    if resource is not None:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (max_open_files, max_open_files))
+        resource.setrlimit(resource.RLIMIT_NPROC, (max_processes, max_processes))
+    kept = {name: os.environ[name] for name in env if name in os.environ}
+    os.environ.clear()
+    os.environ.update(kept)
+    os.chdir(tempfile.gettempdir())
+
+    if hasattr(signal, "SIGALRM"):
+        signal.signal(signal.SIGALRM, _limit_exceeded)
+    if hasattr(signal, "SIGXCPU"):
+        signal.signal(signal.SIGXCPU, _limit_exceeded)
+
+def _isolate_network():
+    import socket
+
+    if sys.platform.startswith("linux"):
+        # Needs root (or user namespaces); the socket module below is the fallback
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.unshare(CLONE_NEWNET)
+
+    class _UnixOnlySocket(socket.socket):
+        def __init__(self, family=-1, type=-1, proto=-1, fileno=None):
+            # family -1 is the AF_INET default
+            if fileno is None and family != socket.AF_UNIX:
+                raise PermissionError("network access is disabled in the test sandbox")
+            super().__init__(family, type, proto, fileno)
+
+    socket.socket = _UnixOnlySocket
+
+def _warm(delay: float) -> int:
+    time.sleep(delay)
+    return os.getpid()
+
+def _arm_limits(cpu_seconds: float, timeout: float):
+    _worker_state["armed"] = True
+    if resource is not None and cpu_seconds:
+        # RLIMIT_CPU counts the worker's lifetime CPU, so the budget starts from what it has used
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        resource.setrlimit(resource.RLIMIT_CPU, (math.ceil(usage.ru_utime + usage.ru_stime + cpu_seconds), hard))
+    if timeout and hasattr(signal, "setitimer"):
+        # Keep firing until disarmed in case test code swallows the first exit
+        signal.setitimer(signal.ITIMER_REAL, timeout, 0.5)
+
+def _disarm_limits():
+    _worker_state["armed"] = False
+    if hasattr(signal, "setitimer"):
+        signal.setitimer(signal.ITIMER_REAL, 0)
+    if resource is not None:
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        resource.setrlimit(resource.RLIMIT_CPU, (hard, hard))
+
+def _run_tests(code: str, tests: str, cpu_seconds: float, timeout: float) -> SandboxResult:
+    import coverage
+    import pytest
+
+    result = SandboxResult()
+    started = time.perf_counter()
+    _worker_state["limit"] = None
+
+    with tempfile.TemporaryDirectory(prefix="sandbox-") as workdir:
+        module_path = os.path.join(workdir, MODULE_NAME + ".py")
+        test_path = os.path.join(workdir, TEST_MODULE_NAME + ".py")
+        for path, content in ((module_path, code), (test_path, tests), (os.path.join(workdir, "pytest.ini"), "[pytest]\n")):
+            with open(path, "w") as f:
+                f.write(content)
+        os.chdir(workdir)
+
+        cov = coverage.Coverage(data_file=None, branch=True, include=[module_path], config_file=False)
+        cov.set_option("run:disable_warnings", ["no-data-collected"])
+        output = io.StringIO()
+        sys.path.insert(0, workdir)
+        try:
+            _arm_limits(cpu_seconds, timeout)
+            cov.start()
+            try:
+                with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+                    pytest.main([test_path, "-q", "-p", "no:cacheprovider", "--rootdir", workdir], plugins=[_ResultCollector(result)])
+            except pytest.exit.Exception:
+                # The limit fired again while pytest was already shutting down
+                pass
+            finally:
+                _disarm_limits()
+                cov.stop()
+        finally:
+            os.chdir(os.path.dirname(workdir))
+            sys.path.remove(workdir)
+            for name in (MODULE_NAME, TEST_MODULE_NAME):
+                sys.modules.pop(name, None)
+
+        report_path = os.path.join(workdir, "coverage.json")
+        try:
+            cov.json_report(outfile=report_path)
+            with open(report_path) as f:
+                report = json.load(f)
+        except coverage.exceptions.CoverageException:
+            # The module was never imported, so there is nothing to report
+            report = None
+
+    if report and report["files"]:
+        file_report = next(iter(report["files"].values()))
+        summary = report["totals"]
+        result.line_coverage = summary["covered_lines"] / summary["num_statements"] if summary["num_statements"] else 1.0
+        if summary.get("num_branches"):
+            result.branch_coverage = summary["covered_branches"] / summary["num_branches"]
+        result.covered_lines = file_report["executed_lines"]
+        result.missing_lines = file_report["missing_lines"]
+
+    result.timed_out = _worker_state["limit"] is not None
+    if result.timed_out:
+        result.error = f"Test run exceeded the {_worker_state['limit']} limit"
+    result.output = output.getvalue()[-4000:]
+    result.duration = time.perf_counter() - started
+    return result
+
+# Parent-side pool
+
+class SandboxPool:
+    """Pre-warmed pool of resource-limited interpreters for running generated tests.
+
+    Workers are forked from a forkserver that has already imported pytest and
+    coverage, so a run pays neither interpreter start-up nor import cost. Each
+    worker runs a single test run and is then replaced, so nothing a test
+    leaves behind reaches the next one. Workers are locked down by
+    _init_worker; CPU time and wall-clock time are limited per run.
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        memory_limit_mb: Optional[int] = None,
+        cpu_seconds: Optional[float] = None,
+        timeout: Optional[float] = None,
+        user: Optional[str] = None
+    ):
+        self.workers = workers or settings.TEST_SANDBOX_WORKERS or os.cpu_count() or 1
+        self.memory_limit_mb = settings.TEST_SANDBOX_MEMORY_MB if memory_limit_mb is None else memory_limit_mb
+        self.cpu_seconds = cpu_seconds or settings.TEST_SANDBOX_CPU_SECONDS
+        self.timeout = timeout or settings.TEST_SANDBOX_TIMEOUT
+        self.user = settings.TEST_SANDBOX_USER if user is None else user
+        self.max_open_files = settings.TEST_SANDBOX_MAX_OPEN_FILES
+        self.max_processes = settings.TEST_SANDBOX_MAX_PROCESSES
+        self.env = list(settings.TEST_SANDBOX_ENV)
+        self.runs = 0
+        self.restarts = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    async def start(self):
+        """Spawn every worker ahead of the first run"""
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        await asyncio.gather(*(loop.run_in_executor(executor, _warm, 0.05) for _ in range(self.workers)))
+
+    async def run(self, code: str, tests: str) -> SandboxResult:
+        """Run pytest tests against code in a worker and measure coverage"""
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        try:
+            future = loop.run_in_executor(executor, _run_tests, code, tests, self.cpu_seconds, self.timeout)
+            result = await asyncio.wait_for(future, self.timeout + KILL_GRACE_SECONDS)
+        except asyncio.TimeoutError:
+            # The worker is stuck in native code that the in-process limits cannot interrupt
+            self._restart(executor, kill=True)
+            return SandboxResult(timed_out=True, error="Test run exceeded the time limit")
+        except BrokenProcessPool:
+            self._restart(executor)
+            return SandboxResult(error="Sandbox worker crashed while running the tests")
+
+        self.runs += 1
+        return result
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def snapshot(self) -> Dict:
+        return {"workers": self.workers, "runs": self.runs, "restarts": self.restarts}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context("forkserver")
+                context.set_forkserver_preload(["pytest", "coverage"])
+            else:
+                context = multiprocessing.get_context("spawn")
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(self.memory_limit_mb, self.user, self.max_open_files, self.max_processes, self.env),
+                max_tasks_per_child=1
+            )
+        return self._executor
+
+    def _restart(self, executor: ProcessPoolExecutor, kill: bool = False):
+        """Replace a broken or hung pool; concurrent failures restart it only once"""
+        if self._executor is not executor:
+            return
+        if kill:
+            # ProcessPoolExecutor has no public way to stop a running task
+            for process in list((executor._processes or {}).values()):
+                process.kill()
+        executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        self.restarts += 1
+
+_pool: Optional[SandboxPool] = None
+
+def get_sandbox_pool() -> SandboxPool:
+    """Return the process-wide sandbox pool"""
+    global _pool
+    if _pool is None:
+        _pool = SandboxPool()
+        metrics.register_collector("test_sandbox", _pool.snapshot)
+    return _pool
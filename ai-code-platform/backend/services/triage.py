@@ -0,0 +1,128 @@
+import ast
+import hashlib
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from core.config import settings
+from core.metrics import metrics
+from services.result_cache import ResultCache
+from services.source import SourceDocument
+
+SLASH_COMMENTS = r"//[^\n]*|/\*.*?\*/"
+HASH_COMMENTS = r"\#[^\n]*"
+
+# Comment syntax per language; anything else uses C-style comments
+COMMENT_SYNTAX = {
+    "python": HASH_COMMENTS,
+    "ruby": HASH_COMMENTS,
+    "php": f"{SLASH_COMMENTS}|{HASH_COMMENTS}"
+}
+
+# String literals are kept verbatim so comment markers inside them are not taken for comments
+TOKEN_PATTERNS = {
+    syntax: re.compile(
+        r"""(?P<string>"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*'|`(?:\\.|[^`\\])*`)"""
+        rf"|(?P<comment>{syntax})|(?P<token>\w+|\S)",
+        re.DOTALL
+    )
+    for syntax in {SLASH_COMMENTS, *COMMENT_SYNTAX.values()}
+}
+
+def normalize_code(code: str, language: str) -> str:
+    """The code with comments, whitespace and (for Python) formatting removed.
+
+    Python is reduced to its AST dump, which also drops line numbers and
+    redundant parentheses; other languages, and Python that does not
+    parse, to their token stream.
+    """
+    if language == "python":
+        try:
+            return ast.dump(ast.parse(code))
+        except (SyntaxError, ValueError):
+            pass
+    return _tokens(code, language)
+
+def _tokens(code: str, language: str) -> str:
+    pattern = TOKEN_PATTERNS[COMMENT_SYNTAX.get(language, SLASH_COMMENTS)]
+    return " ".join(match.group() for match in pattern.finditer(code) if match.lastgroup != "comment")
+
+@dataclass
+class TriageDecision:
+    """Whether code needs an AI review, and the prior findings to use when it does not"""
+    reason: str  # "trivial", "unchanged" or "review"
+    language: str = ""
+    key: Optional[str] = None  # result cache key of the normalized code
+    issues: List[Dict] = field(default_factory=list)  # prior AI findings, on this code's line numbers
+    suggestions: List[str] = field(default_factory=list)
+
+    @property
+    def skip_ai(self) -> bool:
+        return self.reason != "review"
+
+class ReviewTriage:
+    """Decide from static analysis and earlier reviews whether the AI review can be skipped.
+
+    Code is skipped as trivial when it is short (TRIAGE_CLEAN_MAX_LINES
+    non-blank lines) and has no static findings above
+    TRIAGE_CLEAN_MAX_SEVERITY. Otherwise the AI findings of the last
+    review of the same normalized code (see normalize_code) are reused
+    from the result cache, moved onto the current line numbers, so a
+    re-save that only changed comments or formatting costs no LLM call.
+    """
+
+    SEVERITIES = ["low", "medium", "high", "critical"]
+
+    def __init__(self, result_cache: Optional[ResultCache] = None, enabled: Optional[bool] = None,
+                 clean_max_lines: Optional[int] = None, clean_max_severity: Optional[str] = None):
+        self.result_cache = result_cache
+        self.enabled = enabled if enabled is not None else settings.TRIAGE_ENABLED
+        self.clean_max_lines = clean_max_lines if clean_max_lines is not None else settings.TRIAGE_CLEAN_MAX_LINES
+        self.clean_max_severity = self.SEVERITIES.index(clean_max_severity or settings.TRIAGE_CLEAN_MAX_SEVERITY)
+
+    async def check(self, doc: SourceDocument, language: str, static_issues: List, *key_parts) -> TriageDecision:
+        """Decide for code with the given static findings; key_parts are whatever else shapes the AI review"""
+        if not self.enabled:
+            return TriageDecision("review", language)
+        if self._trivial(doc, static_issues):
+            return self._decided(TriageDecision("trivial", language))
+
+        if self.result_cache is None:
+            return self._decided(TriageDecision("review", language))
+        digest = hashlib.sha256(normalize_code(doc.text, language).encode("utf8")).hexdigest()
+        key = ResultCache.key("triage", language, digest, *key_parts)
+        prior = await self.result_cache.get(key)
+        if prior is None:
+            return self._decided(TriageDecision("review", language, key))
+        line_tokens = [_tokens(line, language) for line in doc.lines] if prior["issues"] else []
+        issues = [self._relocate(issue, line_tokens) for issue in prior["issues"]]
+        return self._decided(TriageDecision("unchanged", language, key, issues, prior["suggestions"]))
+
+    async def remember(self, decision: TriageDecision, doc: SourceDocument, issues: List[Dict], suggestions: List[str]):
+        """Store the AI findings (file line numbers) of a completed review for check to reuse"""
+        if decision.key is None or decision.skip_ai:
+            return
+        stored = [dict(issue, line_text=_tokens(doc.line(issue["line_number"]), decision.language)) for issue in issues]
+        await self.result_cache.set(decision.key, {"issues": stored, "suggestions": suggestions})
+
+    def _trivial(self, doc: SourceDocument, static_issues: List) -> bool:
+        if sum(1 for line in doc.lines if line.strip()) > self.clean_max_lines:
+            return False
+        return all(self.SEVERITIES.index(issue.severity.value) <= self.clean_max_severity for issue in static_issues)
+
+    def _relocate(self, issue: Dict, line_tokens: List[str]) -> Dict:
+        """Move a stored finding to the line with the same tokens nearest its old line"""
+        issue = dict(issue)
+        line_text = issue.pop("line_text", "")
+        old = issue["line_number"]
+        if line_text:
+            matches = [number for number, tokens in enumerate(line_tokens, 1) if tokens == line_text]
+            if matches:
+                issue["line_number"] = min(matches, key=lambda number: abs(number - old))
+                return issue
+        issue["line_number"] = max(1, min(old, len(line_tokens)))
+        return issue
+
+    def _decided(self, decision: TriageDecision) -> TriageDecision:
+        metrics.increment("review_triage", labels={"decision": decision.reason})
+        return decision
@@ -0,0 +1,173 @@
+import re
+import textwrap
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional
+
+from services.source import SourceDocument
+
+@dataclass
+class SourceWindow:
+    """A run of whole lines from a large file, analyzed on its own"""
+    start_line: int  # 1-based line of the first line in the file
+    text: str
+    line_count: int
+    partial: bool = False  # cut mid-definition because no boundary was found in time
+
+    @property
+    def end_line(self) -> int:
+        return self.start_line + self.line_count - 1
+
+    @property
+    def line_offset(self) -> int:
+        """Add to a window-relative line number to get the file line number"""
+        return self.start_line - 1
+
+    def document(self) -> SourceDocument:
+        return SourceDocument(self.text)
+
+# Python lines that start a new top-level statement only when they are not continuing a block
+PYTHON_CONTINUATIONS = re.compile(r'(else|elif|except|finally|case)\b|[)\]}]')
+PYTHON_DEFINITION = re.compile(r'(async\s+def|def|class)\b|@')
+TRIPLE_QUOTE = re.compile(r'"""|\'\'\'')
+# String literals and comments, removed before counting brackets
+PYTHON_NOISE = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|#.*')
+BRACE_NOISE = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|`(?:\\.|[^`\\])*`|//.*|/\*.*?\*/')
+# A line ending like this continues onto the next one
+BRACE_CONTINUATION_ENDINGS = tuple("=,+-*/([{.&|?:<>")
+
+class PythonBoundaries:
+    """Finds lines where a Python file can be cut without splitting a statement.
+
+    ``boundary`` returns 0 for a top-level statement, 1 for a method
+    definition directly inside a top-level class, otherwise None.
+    """
+
+    def __init__(self):
+        self.triple_quote: Optional[str] = None
+        self.brackets = 0
+        self.in_class = False
+        self.decorated: Optional[int] = None  # indent of the decorator the next definition belongs to
+
+    def boundary(self, line: str) -> Optional[int]:
+        level = None
+        if self.triple_quote is None and self.brackets == 0:
+            stripped = line.lstrip(' \t')
+            indent = len(line) - len(stripped)
+            if stripped and not stripped.startswith('#'):
+                if indent == 0:
+                    if not PYTHON_CONTINUATIONS.match(stripped) and self.decorated != 0:
+                        level = 0
+                    if not stripped.startswith('@'):
+                        self.in_class = stripped.startswith('class ')
+                elif self.in_class and indent == 4 and PYTHON_DEFINITION.match(stripped) and self.decorated != 4:
+                    level = 1
+                self.decorated = indent if stripped.startswith('@') else None
+        self._scan(line)
+        return level
+
+    def _scan(self, line: str):
+        """Track open triple-quoted strings and brackets across lines"""
+        code = []
+        position = 0
+        for match in TRIPLE_QUOTE.finditer(line):
+            if self.triple_quote is None:
+                code.append(line[position:match.start()])
+                self.triple_quote = match.group()
+            elif match.group() == self.triple_quote:
+                self.triple_quote = None
+                position = match.end()
+        if self.triple_quote is None:
+            code.append(line[position:])
+        for part in code:
+            part = PYTHON_NOISE.sub('', part)
+            self.brackets = max(0, self.brackets + sum(part.count(c) for c in '([{') - sum(part.count(c) for c in ')]}'))
+
+class BraceBoundaries:
+    """Finds lines where a brace-delimited file can be cut between declarations.
+
+    ``boundary`` returns the brace depth (0 or 1) of a line that follows a
+    finished statement or block, otherwise None.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.in_comment = False
+        self.statement_ended = True
+        self.blank_since_code = False
+        self.decorated = False
+
+    def boundary(self, line: str) -> Optional[int]:
+        stripped = line.strip()
+        if self.in_comment:
+            if '*/' in stripped:
+                self.in_comment = False
+                stripped = stripped[stripped.index('*/') + 2:].strip()
+            else:
+                return None
+        if not stripped:
+            self.blank_since_code = True
+            return None
+
+        level = None
+        if self.depth <= 1 and not self.decorated and stripped[0] not in '})].' and (
+            self.statement_ended or self.blank_since_code
+        ):
+            level = self.depth
+
+        code = BRACE_NOISE.sub('', stripped)
+        if '/*' in code:
+            self.in_comment = True
+            code = code[:code.index('/*')]
+        code = code.rstrip()
+        self.depth = max(0, self.depth + code.count('{') - code.count('}'))
+        if code:
+            self.statement_ended = code.endswith(('}', ';')) or not code.endswith(BRACE_CONTINUATION_ENDINGS)
+            self.decorated = code.startswith('@') or code.startswith('[')
+        self.blank_since_code = False
+        return level
+
+def iter_windows(lines: Iterable[str], language: str, target_bytes: int) -> Iterator[SourceWindow]:
+    """Cut a file into windows of roughly ``target_bytes``, one at a time.
+
+    ``lines`` may be any line iterator (a list, a file object), so only the
+    current window is held in memory. Windows end on top-level statement
+    boundaries; a definition longer than twice the target is cut between its
+    members (methods), and anything longer than four times the target is cut
+    wherever it is, marking the windows on both sides ``partial``. Python windows cut between methods
+    are dedented so they parse on their own; line numbers are unchanged.
+    """
+    scanner = PythonBoundaries() if language == "python" else BraceBoundaries()
+    buffer: List[str] = []
+    size = 0
+    start = 1
+    nested = False
+    partial = False
+
+    def window() -> SourceWindow:
+        text = '\n'.join(buffer)
+        if nested and language == "python":
+            text = textwrap.dedent(text)
+        return SourceWindow(start_line=start, text=text, line_count=len(buffer), partial=partial)
+
+    for number, line in enumerate(lines, 1):
+        line = line.rstrip('\r\n')
+        level = scanner.boundary(line)
+        if buffer:
+            cut = None
+            if level == 0 and (size >= target_bytes or nested):
+                cut = (False, False)
+            elif level == 1 and size >= 2 * target_bytes:
+                cut = (True, False)
+            elif size >= 4 * target_bytes:
+                cut = (True, True)
+            if cut is not None:
+                # A forced cut leaves both sides incomplete
+                partial = partial or cut[1]
+                yield window()
+                buffer, size, start = [], 0, number
+                nested, partial = cut
+        buffer.append(line)
+        size += len(line) + 1
+
+    if buffer:
+        yield window()
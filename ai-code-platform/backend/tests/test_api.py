@@ -1,6 +1,18 @@
+import asyncio
+import io
+import json
+import tarfile
 import pytest
 from fastapi.testclient import TestClient
-from app.main import app
+from app.main import app, get_archive_reviewer, get_batch_jobs, get_code_reviewer, get_documentation_service
+from services.archive_review import ArchiveReviewService, ContentHashStore
+from services.batch_jobs import BatchJobService, BatchJobStore, LocalBatchBackend
+from services.code_reviewer import CodeReviewerService
+from services.documentation import DocumentationService
+from services.test_generator import TestGeneratorService as GeneratorService
+from services.triage import ReviewTriage
+from services.llm_providers import CompletionResult
+from services.result_cache import ResultCache, SharedMemoryCache
 
 client = TestClient(app)
 
@@ -39,12 +51,386 @@ def test_generate_tests():
 
 def test_review_code():
     """Test code review endpoint"""
-    payload = {
-        "code": "def hello():\n    return 'Hello World'",
-        "language": "python"
-    }
-    response = client.post("/api/v1/review-code", json=payload)
+    reviewer = CodeReviewerService()
+    reviewer.provider = FakeStreamingProvider(json.dumps({"issues": [], "suggestions": ["Add tests"]}))
+    app.dependency_overrides[get_code_reviewer] = lambda: reviewer
+    try:
+        payload = {
+            "code": "def hello():\n    return 'Hello World'",
+            "language": "python"
+        }
+        response = client.post("/api/v1/review-code", json=payload)
+    finally:
+        app.dependency_overrides.clear()
     assert response.status_code == 200
     data = response.json()
     assert data["success"] == True
-    assert "quality_score" in data
\ No newline at end of file
+    assert "quality_score" in data
+    assert data["issues"][0]["title"] == "Missing Docstring"
+    assert data["issues"][0]["severity"] == "low"
+
+def test_review_code_columnar_compressed():
+    """Large reviews can be requested column-oriented and come back gzip-encoded"""
+    reviewer = CodeReviewerService()
+    reviewer.provider = FakeStreamingProvider(json.dumps({"issues": [], "suggestions": []}))
+    app.dependency_overrides[get_code_reviewer] = lambda: reviewer
+    try:
+        code = "".join(f"def f{i}():\n    return '{'x' * 90}'\n" for i in range(200))
+        payload = {"code": code, "language": "python", "issue_format": "columnar"}
+        response = client.post("/api/v1/review-code", json=payload, headers={"Accept-Encoding": "gzip"})
+    finally:
+        app.dependency_overrides.clear()
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    issues = response.json()["issues"]
+    assert issues["count"] == 400
+    assert set(issues["dictionaries"]["title"]) == {"Missing Docstring", "Line Too Long"}
+    assert len(issues["columns"]["title"]) == 400
+
+def test_review_code_rejects_oversized_code(monkeypatch):
+    """Code beyond the large-file limit is refused before any analysis"""
+    from core.config import settings
+    monkeypatch.setattr(settings, "LARGE_FILE_MAX_SIZE", 1000)
+    payload = {"code": "x = 1\n" * 200, "language": "python"}
+    response = client.post("/api/v1/review-code", json=payload)
+    assert response.status_code == 413
+    assert client.post("/api/v1/review-code/stream", json=payload).status_code == 413
+    assert client.post("/api/v1/generate-docs", json=payload).status_code == 413
+
+def test_review_archive_upload():
+    """A multipart tarball upload streams one event per source file, then totals"""
+    app.dependency_overrides[get_archive_reviewer] = lambda: ArchiveReviewService(CodeReviewerService(), ContentHashStore())
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        info = tarfile.TarInfo("pkg/main.py")
+        data = b"x = eval(input())\n"
+        info.size = len(data)
+        archive.addfile(info, io.BytesIO(data))
+    try:
+        files = {"archive": ("repo.tar.gz", buffer.getvalue(), "application/gzip")}
+        response = client.post("/api/v1/review-archive", data={"project": "demo"}, files=files)
+        rejected = client.post("/api/v1/review-archive", data={"project": "demo"}, files={"archive": ("x.tar", b"junk" * 200)})
+    finally:
+        app.dependency_overrides.clear()
+    assert response.status_code == 200
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert events[0]["event"] == "file" and events[0]["path"] == "pkg/main.py"
+    assert events[-1]["reviewed"] == 1
+    assert rejected.status_code == 400
+
+def test_profile_endpoints_require_admin(monkeypatch):
+    """Profiles are only listed and downloaded with an admin API key"""
+    from core.config import settings
+    monkeypatch.setattr(settings, "ADMIN_API_KEYS", ["admin-key"])
+    admin = {"Authorization": "Bearer admin-key"}
+    assert client.get("/api/v1/admin/profiles").status_code == 403
+    assert client.get("/api/v1/admin/profiles", headers=admin).json()["profiles"] == []
+    assert client.get("/api/v1/admin/profiles/missing", headers=admin).status_code == 404
+
+def test_stats_unavailable_without_rollup_tables():
+    """Stats are read from the rollup tables; a broken database is a 503, not a 500"""
+    from sqlalchemy import create_engine
+    from app.main import get_usage_stats_reader
+    from core.usage_stats import UsageStatsReader
+    app.dependency_overrides[get_usage_stats_reader] = lambda: UsageStatsReader(create_engine("sqlite://"))
+    try:
+        assert client.get("/api/v1/stats").status_code == 503
+        assert client.get("/api/v1/stats?hours=0").status_code == 422
+    finally:
+        app.dependency_overrides.clear()
+
+def test_history_rejects_invalid_queries():
+    """Unknown kinds and malformed cursors are client errors; a missing table is a 503"""
+    from sqlalchemy import create_engine
+    from app.main import get_history_store
+    from core.history import HistoryStore
+    app.dependency_overrides[get_history_store] = lambda: HistoryStore(create_engine("sqlite://"))
+    headers = {"Authorization": "Bearer test-key"}
+    try:
+        assert client.get("/api/v1/history/deployments", headers=headers).status_code == 400
+        assert client.get("/api/v1/history/generations?cursor=junk", headers=headers).status_code == 400
+        assert client.get("/api/v1/history/generations?limit=0", headers=headers).status_code == 422
+        assert client.get("/api/v1/history/generations", headers=headers).status_code == 503
+    finally:
+        app.dependency_overrides.clear()
+
+def test_history_requires_an_api_key():
+    """Anonymous callers share a tenant per address, so they get no history"""
+    from sqlalchemy import create_engine
+    from app.main import get_history_store
+    from core.history import HistoryStore
+    app.dependency_overrides[get_history_store] = lambda: HistoryStore(create_engine("sqlite://"))
+    try:
+        response = client.get("/api/v1/history/generations")
+        assert response.status_code == 401
+        assert response.headers["www-authenticate"] == "Bearer"
+    finally:
+        app.dependency_overrides.clear()
+
+def test_metrics():
+    """Test metrics endpoint"""
+    response = client.get("/api/v1/metrics")
+    assert response.status_code == 200
+    assert "counters" in response.json()
+
+
+class FakeStreamingProvider:
+    """Streams a canned JSON review in small chunks"""
+
+    key = "fake:streaming"
+
+    def __init__(self, response):
+        self.response = response
+
+    async def stream(self, system, prompt, temperature=0.2, max_tokens=2000, **options):
+        for i in range(0, len(self.response), 5):
+            yield self.response[i:i + 5]
+
+def test_review_code_stream():
+    """Test progressive review streaming"""
+    reviewer = CodeReviewerService()
+    reviewer.provider = FakeStreamingProvider(json.dumps({
+        "issues": [{"line_number": 1, "severity": "high", "category": "security", "title": "eval", "description": "d", "suggestion": "s", "code_snippet": ""}],
+        "suggestions": ["Add tests"]
+    }))
+    app.dependency_overrides[get_code_reviewer] = lambda: reviewer
+    try:
+        payload = {"code": "x = eval(input())\n", "language": "python"}
+        response = client.post("/api/v1/review-code/stream", json=payload)
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert [e["event"] for e in events] == ["static", "issue", "complete"]
+    assert "quality_score" in events[0]
+    assert events[1]["issue"]["severity"] == "high"
+    assert events[2]["suggestions"] == ["Add tests"]
+    assert events[2]["issue_count"] == len(events[0]["issues"]) + 1
+
+class FakeDocsProvider:
+    """Documents each symbol with a fixed sentence"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def complete(self, system, prompt, temperature=0.2, max_tokens=2000, **options):
+        self.calls += 1
+        return CompletionResult(text="Adds two numbers.", provider="openai", model="gpt-4")
+
+def test_generate_docs():
+    """Test per-symbol documentation generation with caching"""
+    docs = DocumentationService()
+    docs.provider = FakeDocsProvider()
+    app.dependency_overrides[get_documentation_service] = lambda: docs
+    try:
+        payload = {"code": "def add(a, b):\n    return a + b\n", "language": "python"}
+        first = client.post("/api/v1/generate-docs", json=payload).json()
+        second = client.post("/api/v1/generate-docs", json=payload).json()
+    finally:
+        app.dependency_overrides.clear()
+
+    assert first["success"] == True
+    assert "Adds two numbers." in first["documentation"]
+    assert first["symbols"][0]["name"] == "add"
+    assert (second["generated"], second["cached"]) == (0, 1)
+    assert docs.provider.calls == 1
+
+class SupersededStreamingProvider(FakeStreamingProvider):
+    """The first review hangs until it is cancelled; later ones stream normally"""
+
+    def __init__(self, response):
+        super().__init__(response)
+        self.calls = 0
+        self.cancelled = False
+
+    async def stream(self, system, prompt, temperature=0.2, max_tokens=2000, **options):
+        self.calls += 1
+        if self.calls == 1:
+            try:
+                await asyncio.sleep(30)
+            except asyncio.CancelledError:
+                self.cancelled = True
+                raise
+        async for chunk in super().stream(system, prompt, temperature, max_tokens, **options):
+            yield chunk
+
+def test_ide_channel_supersedes_stale_review():
+    """Test that a newer review of a document cancels the one in flight"""
+    reviewer = CodeReviewerService()
+    reviewer.provider = SupersededStreamingProvider(json.dumps({"issues": [], "suggestions": []}))
+    # "x = 1" is trivially clean; the AI review has to run for there to be something to supersede
+    reviewer.triage = ReviewTriage(enabled=False)
+    app.dependency_overrides[get_code_reviewer] = lambda: reviewer
+    try:
+        with client.websocket_connect("/api/v1/ws") as ws:
+            payload = {"code": "x = 1\n", "language": "python"}
+            ws.send_json({"id": "1", "type": "review", "document": "file:///a.py", "payload": payload})
+            assert ws.receive_json() == {"id": "1", "event": "static", "issues": [], "quality_score": 10.0}
+
+            ws.send_json({"id": "2", "type": "review", "document": "file:///a.py", "payload": payload})
+            events = []
+            while not events or events[-1] != {"id": "2", "event": "done"}:
+                events.append(ws.receive_json())
+    finally:
+        app.dependency_overrides.clear()
+
+    assert {"id": "1", "event": "cancelled", "reason": "superseded"} in events
+    assert [e["event"] for e in events if e["id"] == "2"] == ["static", "complete", "done"]
+    assert reviewer.provider.cancelled
+
+def test_client_disconnect_cancels_review_quietly():
+    """Test that a client going away cancels the review without a 500 from any middleware"""
+    reviewer = CodeReviewerService()
+    reviewer.provider = SupersededStreamingProvider(json.dumps({"issues": [], "suggestions": []}))
+    reviewer.triage = ReviewTriage(enabled=False)
+    body = json.dumps({"code": "x = 1\n", "language": "python"}).encode()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+        "path": "/api/v1/review-code", "raw_path": b"/api/v1/review-code", "query_string": b"", "root_path": "",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 50000), "server": ("testserver", 80)
+    }
+    requests = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        if requests:
+            return requests.pop()
+        await asyncio.sleep(0.2)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    app.dependency_overrides[get_code_reviewer] = lambda: reviewer
+    try:
+        asyncio.run(asyncio.wait_for(app(scope, receive, send), 10))
+    finally:
+        app.dependency_overrides.clear()
+
+    assert reviewer.provider.cancelled
+    assert sent == []
+
+def test_ide_channel_multiplexes_requests():
+    """Test that independent requests share one connection"""
+    with client.websocket_connect("/api/v1/ws") as ws:
+        ws.send_json({"id": "a", "type": "generate_code", "payload": {"description": "hello world", "language": "python"}})
+        ws.send_json({"id": "b", "type": "unknown"})
+        events = [ws.receive_json() for _ in range(3)]
+
+    assert {"id": "b", "event": "error", "detail": "Invalid request type 'unknown' or id 'b'"} in events
+    assert [e["event"] for e in events if e["id"] == "a"] == ["result", "done"]
+
+def test_batch_job_lifecycle():
+    """Test that batch results are only served once every provider batch has finished"""
+    backend = LocalBatchBackend(completion_delay=60)
+    jobs = BatchJobService(CodeReviewerService(), GeneratorService(), backend, BatchJobStore())
+    app.dependency_overrides[get_batch_jobs] = lambda: jobs
+    files = [{"path": "a.py", "code": "x = eval(y)\n", "language": "python"}]
+    try:
+        assert client.post("/api/v1/batch/jobs", json={"kind": "deploy", "files": files}).status_code == 422
+        response = client.post("/api/v1/batch/jobs", json={"kind": "review", "files": files})
+        assert response.status_code == 202
+        job_id = response.json()["id"]
+        assert client.get(f"/api/v1/batch/jobs/{job_id}/results").status_code == 409
+
+        backend.completion_delay = 0
+        assert client.get(f"/api/v1/batch/jobs/{job_id}").json()["status"] == "completed"
+        events = [json.loads(line) for line in client.get(f"/api/v1/batch/jobs/{job_id}/results").iter_lines()]
+        assert client.get("/api/v1/batch/jobs/unknown").status_code == 404
+    finally:
+        app.dependency_overrides.clear()
+
+    assert events[0]["path"] == "a.py" and events[0]["result"]["issues"]
+    assert events[-1] == {"event": "complete", "files": 1, "failed_requests": 0}
+
+class CountingStreamingProvider(FakeStreamingProvider):
+    """Counts the reviews it is asked for"""
+
+    def __init__(self, response):
+        super().__init__(response)
+        self.calls = 0
+
+    async def stream(self, system, prompt, temperature=0.2, max_tokens=2000, **options):
+        self.calls += 1
+        async for chunk in super().stream(system, prompt, temperature, max_tokens, **options):
+            yield chunk
+
+def test_repeat_review_with_etag_not_modified():
+    """Test that If-None-Match with the result's ETag returns 304 without reviewing again"""
+    reviewer = CodeReviewerService()
+    reviewer.provider = CountingStreamingProvider(json.dumps({"issues": [], "suggestions": []}))
+    reviewer.triage = ReviewTriage(enabled=False)
+    app.dependency_overrides[get_code_reviewer] = lambda: reviewer
+    payload = {"code": "x = eval(input())\n", "language": "python"}
+    try:
+        first = client.post("/api/v1/review-code", json=payload)
+        etag = first.headers["etag"]
+        repeat = client.post("/api/v1/review-code", json=payload, headers={"If-None-Match": f'W/"other", {etag}'})
+        changed = client.post("/api/v1/review-code", json=dict(payload, code="y = eval(input())\n"),
+                              headers={"If-None-Match": etag})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert etag.startswith('W/"')
+    assert (repeat.status_code, repeat.content, repeat.headers["etag"]) == (304, b"", etag)
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+    assert reviewer.provider.calls == 2
+
+class FailingStreamingProvider(CountingStreamingProvider):
+    async def stream(self, system, prompt, temperature=0.2, max_tokens=2000, **options):
+        self.calls += 1
+        raise RuntimeError("provider down")
+        yield
+
+def test_failed_review_has_no_etag():
+    """Test that a review whose AI pass failed can be retried rather than revalidated"""
+    reviewer = CodeReviewerService()
+    reviewer.provider = FailingStreamingProvider(json.dumps({"issues": [], "suggestions": []}))
+    reviewer.triage = ReviewTriage(enabled=False)
+    app.dependency_overrides[get_code_reviewer] = lambda: reviewer
+    payload = {"code": "x = eval(input())\n", "language": "python"}
+    try:
+        first = client.post("/api/v1/review-code", json=payload)
+        retry = client.post("/api/v1/review-code", json=payload)
+    finally:
+        app.dependency_overrides.clear()
+
+    assert any(s.startswith("AI review failed") for s in first.json()["suggestions"])
+    assert "etag" not in first.headers and retry.status_code == 200
+    assert reviewer.provider.calls == 2
+
+def test_repeat_review_served_from_result_cache(tmp_path):
+    """Test that a repeated review, on either review endpoint, makes no second LLM call"""
+    reviewer = CodeReviewerService(result_cache=ResultCache(SharedMemoryCache(str(tmp_path / "results")), ttl=60))
+    reviewer.provider = CountingStreamingProvider(json.dumps({
+        "issues": [{"line_number": 1, "severity": "high", "category": "security", "title": "eval", "description": "d", "suggestion": "s", "code_snippet": ""}],
+        "suggestions": ["Add tests"]
+    }))
+    reviewer.triage = ReviewTriage(enabled=False)
+    app.dependency_overrides[get_code_reviewer] = lambda: reviewer
+    payload = {"code": "x = eval(input())\n", "language": "python"}
+    try:
+        first = client.post("/api/v1/review-code", json=payload)
+        second = client.post("/api/v1/review-code", json=payload)
+        streamed = client.post("/api/v1/review-code/stream", json=payload)
+    finally:
+        app.dependency_overrides.clear()
+
+    assert reviewer.provider.calls == 1
+    assert second.json() == first.json()
+    assert "eval" in [issue["title"] for issue in first.json()["issues"]]
+    assert json.loads(streamed.text.strip().split("\n")[-1])["suggestions"] == ["Add tests"]
+
+def test_repeat_test_generation_with_etag_not_modified():
+    """Test that generated tests can be revalidated with If-None-Match"""
+    payload = {"code": "def hello():\n    return 'Hello World'", "language": "python"}
+    etag = client.post("/api/v1/generate-tests", json=payload).headers["etag"]
+
+    repeat = client.post("/api/v1/generate-tests", json=payload, headers={"If-None-Match": etag})
+    integration = client.post("/api/v1/generate-tests", json=dict(payload, test_type="integration"),
+                              headers={"If-None-Match": etag})
+
+    assert repeat.status_code == 304
+    assert integration.status_code == 200 and "tests" in integration.json()
@@ -9,6 +9,7 @@ CREATE DATABASE IF NOT EXISTS ai_code_platform;
 -- Create tables for future use
 CREATE TABLE IF NOT EXISTS code_generations (
     id SERIAL PRIMARY KEY,
+    tenant_id VARCHAR(64),
     description TEXT NOT NULL,
     language VARCHAR(50) NOT NULL,
     generated_code TEXT NOT NULL,
@@ -18,6 +19,7 @@ CREATE TABLE IF NOT EXISTS code_generations (
 
 CREATE TABLE IF NOT EXISTS test_generations (
     id SERIAL PRIMARY KEY,
+    tenant_id VARCHAR(64),
     source_code TEXT NOT NULL,
     language VARCHAR(50) NOT NULL,
     test_code TEXT NOT NULL,
@@ -27,6 +29,7 @@ CREATE TABLE IF NOT EXISTS test_generations (
 
 CREATE TABLE IF NOT EXISTS code_reviews (
     id SERIAL PRIMARY KEY,
+    tenant_id VARCHAR(64),
     source_code TEXT NOT NULL,
     language VARCHAR(50) NOT NULL,
     quality_score FLOAT DEFAULT 0.0,
@@ -34,6 +37,38 @@ CREATE TABLE IF NOT EXISTS code_reviews (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Per-tenant usage, written in bulk by the API's rate limiter (one row per tenant per minute)
+CREATE TABLE IF NOT EXISTS quota_usage (
+    tenant_id VARCHAR(64) NOT NULL,
+    window_start TIMESTAMP WITH TIME ZONE NOT NULL,
+    requests INTEGER NOT NULL DEFAULT 0,
+    llm_tokens BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (tenant_id, window_start)
+);
+
+-- Hourly usage rollups, updated incrementally by the API so /api/v1/stats never scans the history tables
+CREATE TABLE IF NOT EXISTS usage_rollup_hourly (
+    hour TIMESTAMP WITH TIME ZONE NOT NULL,
+    endpoint VARCHAR(64) NOT NULL,
+    language VARCHAR(50) NOT NULL,
+    requests BIGINT NOT NULL DEFAULT 0,
+    cache_hits BIGINT NOT NULL DEFAULT 0,
+    quality_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    quality_count BIGINT NOT NULL DEFAULT 0,
+    latency_sum_ms DOUBLE PRECISION NOT NULL DEFAULT 0,
+    PRIMARY KEY (hour, endpoint, language)
+);
+
+-- Latency histogram per rollup row; bucket i counts requests up to the i-th bound in core/usage_stats.py
+CREATE TABLE IF NOT EXISTS usage_latency_hourly (
+    hour TIMESTAMP WITH TIME ZONE NOT NULL,
+    endpoint VARCHAR(64) NOT NULL,
+    language VARCHAR(50) NOT NULL,
+    bucket SMALLINT NOT NULL,
+    requests BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (hour, endpoint, language, bucket)
+);
+
 -- Insert sample data
 INSERT INTO code_generations (description, language, generated_code, confidence) VALUES
 ('Hello world function', 'python', 'def hello_world():\n    print("Hello, World!")\n    return "Hello, World!"', 0.95);
@@ -41,4 +76,13 @@ INSERT INTO code_generations (description, language, generated_code, confidence)
 -- Create indexes for better performance
 CREATE INDEX IF NOT EXISTS idx_code_generations_language ON code_generations(language);
 CREATE INDEX IF NOT EXISTS idx_test_generations_language ON test_generations(language);
-CREATE INDEX IF NOT EXISTS idx_code_reviews_language ON code_reviews(language);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_code_reviews_language ON code_reviews(language);
+
+-- History API: keyset pages per tenant and full-text search (see database/migrations for existing databases)
+CREATE INDEX IF NOT EXISTS idx_code_generations_tenant_created ON code_generations(tenant_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_code_generations_tenant_language_created ON code_generations(tenant_id, language, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_test_generations_tenant_created ON test_generations(tenant_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_test_generations_tenant_language_created ON test_generations(tenant_id, language, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_code_reviews_tenant_created ON code_reviews(tenant_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_code_reviews_tenant_language_created ON code_reviews(tenant_id, language, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_code_generations_description_fts ON code_generations USING GIN (to_tsvector('english', description));
\ No newline at end of file
@@ -0,0 +1,35 @@
+-- Per-tenant history with keyset pagination and full-text search over descriptions
+--
+-- Apply with: psql "$DATABASE_URL" -f database/migrations/001_history_keyset_indexes.sql
+-- The indexes are built CONCURRENTLY so large tables stay writable; psql runs
+-- each statement in its own transaction, which CONCURRENTLY requires.
+
+-- Nullable, so adding the column does not rewrite the table; rows written
+-- before it have no tenant and are not returned by the history API
+ALTER TABLE code_generations ADD COLUMN IF NOT EXISTS tenant_id VARCHAR(64);
+ALTER TABLE test_generations ADD COLUMN IF NOT EXISTS tenant_id VARCHAR(64);
+ALTER TABLE code_reviews ADD COLUMN IF NOT EXISTS tenant_id VARCHAR(64);
+
+-- One range scan per page: WHERE tenant_id = ? [AND language = ?] AND (created_at, id) < (?, ?)
+-- ORDER BY created_at DESC, id DESC LIMIT n
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_code_generations_tenant_created
+    ON code_generations (tenant_id, created_at DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_code_generations_tenant_language_created
+    ON code_generations (tenant_id, language, created_at DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_test_generations_tenant_created
+    ON test_generations (tenant_id, created_at DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_test_generations_tenant_language_created
+    ON test_generations (tenant_id, language, created_at DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_code_reviews_tenant_created
+    ON code_reviews (tenant_id, created_at DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_code_reviews_tenant_language_created
+    ON code_reviews (tenant_id, language, created_at DESC, id DESC);
+
+-- Expression index rather than a stored tsvector column, which would rewrite the table;
+-- queries must use the same expression: to_tsvector('english', description)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_code_generations_description_fts
+    ON code_generations USING GIN (to_tsvector('english', description));
+
+ANALYZE code_generations;
+ANALYZE test_generations;
+ANALYZE code_reviews;
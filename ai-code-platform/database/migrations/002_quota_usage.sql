@@ -0,0 +1,13 @@
+-- Per-tenant usage written in bulk by the API's rate limiter (one row per tenant per minute)
+--
+-- Apply with: psql "$DATABASE_URL" -f database/migrations/002_quota_usage.sql
+-- Databases created from init.sql already have the table; until it exists every
+-- quota flush fails and its rows are kept in memory for the next attempt.
+
+CREATE TABLE IF NOT EXISTS quota_usage (
+    tenant_id VARCHAR(64) NOT NULL,
+    window_start TIMESTAMP WITH TIME ZONE NOT NULL,
+    requests INTEGER NOT NULL DEFAULT 0,
+    llm_tokens BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (tenant_id, window_start)
+);
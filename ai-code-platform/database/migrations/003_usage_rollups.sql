@@ -0,0 +1,27 @@
+-- Hourly usage rollups behind /api/v1/stats, upserted in bulk by the API
+--
+-- Apply with: psql "$DATABASE_URL" -f database/migrations/003_usage_rollups.sql
+-- Databases created from init.sql already have both tables; until they exist
+-- every rollup flush fails and its rows are kept in memory for the next attempt.
+
+CREATE TABLE IF NOT EXISTS usage_rollup_hourly (
+    hour TIMESTAMP WITH TIME ZONE NOT NULL,
+    endpoint VARCHAR(64) NOT NULL,
+    language VARCHAR(50) NOT NULL,
+    requests BIGINT NOT NULL DEFAULT 0,
+    cache_hits BIGINT NOT NULL DEFAULT 0,
+    quality_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    quality_count BIGINT NOT NULL DEFAULT 0,
+    latency_sum_ms DOUBLE PRECISION NOT NULL DEFAULT 0,
+    PRIMARY KEY (hour, endpoint, language)
+);
+
+-- Latency histogram per rollup row; bucket i counts requests up to the i-th bound in core/usage_stats.py
+CREATE TABLE IF NOT EXISTS usage_latency_hourly (
+    hour TIMESTAMP WITH TIME ZONE NOT NULL,
+    endpoint VARCHAR(64) NOT NULL,
+    language VARCHAR(50) NOT NULL,
+    bucket SMALLINT NOT NULL,
+    requests BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (hour, endpoint, language, bucket)
+);
@@ -6,7 +6,11 @@ import {
   TestGenerationResponse,
   CodeReviewRequest,
   CodeReviewResponse,
-  HealthResponse
+  HealthResponse,
+  HistoryKind,
+  HistoryPage,
+  HistoryQuery,
+  UsageStatsResponse
 } from '../types/api';
 
 const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000';
@@ -18,6 +22,34 @@ const api = axios.create({
   },
 });
 
+// Results of repeatable POSTs by endpoint and body, revalidated with If-None-Match
+const MAX_CACHED_RESULTS = 50;
+const resultCache = new Map<string, { etag: string; data: any }>();
+
+async function postWithEtag<T>(url: string, body: object): Promise<T> {
+  const key = `${url} ${JSON.stringify(body)}`;
+  const cached = resultCache.get(key);
+  const response = await api.post(url, body, {
+    headers: cached ? { 'If-None-Match': cached.etag } : {},
+    validateStatus: (status) => (status >= 200 && status < 300) || status === 304,
+  });
+  if (response.status === 304 && cached) {
+    // Refresh the entry's position so the least recently used result is evicted first
+    resultCache.delete(key);
+    resultCache.set(key, cached);
+    return cached.data;
+  }
+  const etag = response.headers['etag'];
+  if (etag) {
+    resultCache.delete(key);
+    resultCache.set(key, { etag, data: response.data });
+    if (resultCache.size > MAX_CACHED_RESULTS) {
+      resultCache.delete(resultCache.keys().next().value);
+    }
+  }
+  return response.data;
+}
+
 export const apiService = {
   // Health check
   async healthCheck(): Promise<HealthResponse> {
@@ -25,6 +57,18 @@ export const apiService = {
     return response.data;
   },
 
+  // Usage statistics from the hourly rollups
+  async getStats(hours: number = 24): Promise<UsageStatsResponse> {
+    const response = await api.get('/api/v1/stats', { params: { hours } });
+    return response.data;
+  },
+
+  // Past requests of the caller, newest first; pass next_cursor back as cursor for the next page
+  async getHistory(kind: HistoryKind, query: HistoryQuery = {}): Promise<HistoryPage> {
+    const response = await api.get(`/api/v1/history/${kind}`, { params: query });
+    return response.data;
+  },
+
   // Code generation
   async generateCode(request: CodeGenerationRequest): Promise<CodeGenerationResponse> {
     const response = await api.post('/api/v1/generate-code', request);
@@ -33,14 +77,12 @@ export const apiService = {
 
   // Test generation
   async generateTests(request: TestGenerationRequest): Promise<TestGenerationResponse> {
-    const response = await api.post('/api/v1/generate-tests', request);
-    return response.data;
+    return postWithEtag<TestGenerationResponse>('/api/v1/generate-tests', request);
   },
 
   // Code review
   async reviewCode(request: CodeReviewRequest): Promise<CodeReviewResponse> {
-    const response = await api.post('/api/v1/review-code', request);
-    return response.data;
+    return postWithEtag<CodeReviewResponse>('/api/v1/review-code', request);
   },
 };
 
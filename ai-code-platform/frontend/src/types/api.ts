@@ -61,6 +61,50 @@ export interface CodeReviewResponse {
   maintainability_score: number;
 }
 
+export interface UsageSummary {
+  requests: number;
+  cache_hit_rate: number | null;
+  average_quality_score: number | null;
+  latency_ms: {
+    mean: number | null;
+    p50: number | null;
+    p90: number | null;
+    p95: number | null;
+    p99: number | null;
+  };
+}
+
+export interface UsageStatsResponse {
+  since: string;
+  hours: number;
+  totals: UsageSummary;
+  endpoints: Record<string, UsageSummary>;
+  languages: Record<string, UsageSummary>;
+}
+
+export type HistoryKind = 'generations' | 'tests' | 'reviews';
+
+export interface HistoryQuery {
+  language?: string;
+  since?: string;
+  until?: string;
+  q?: string;
+  cursor?: string;
+  limit?: number;
+}
+
+export interface HistoryItem {
+  id: number;
+  created_at: string;
+  language: string;
+  [field: string]: string | number | null;
+}
+
+export interface HistoryPage {
+  items: HistoryItem[];
+  next_cursor: string | null;
+}
+
 export interface HealthResponse {
   status: string;
   services: string[];
@@ -1,16 +1,119 @@
 import * as vscode from 'vscode';
 import axios from 'axios';
+import WebSocket from 'ws';
 
 interface ApiConfig {
     baseUrl: string;
     apiKey: string;
 }
 
+interface ChannelEvent {
+    id: string;
+    event: string;
+    [key: string]: any;
+}
+
+interface PendingRequest {
+    events: ChannelEvent[];
+    resolve: (events: ChannelEvent[]) => void;
+    reject: (error: Error) => void;
+}
+
+class ChannelUnavailableError extends Error {}
+
+class RequestCancelledError extends Error {}
+
+// One WebSocket per IDE session; requests are multiplexed by id and a newer
+// request for the same document makes the server cancel the older one
+class PlatformChannel {
+    private socket?: WebSocket;
+    private opening?: Promise<WebSocket>;
+    private nextId = 0;
+    private pending = new Map<string, PendingRequest>();
+
+    constructor(private config: ApiConfig) {}
+
+    async request(type: string, payload: any, document?: string): Promise<ChannelEvent[]> {
+        const socket = await this.connect();
+        return new Promise((resolve, reject) => {
+            const id = String(++this.nextId);
+            this.pending.set(id, { events: [], resolve, reject });
+            socket.send(JSON.stringify({ id, type, document, payload }));
+        });
+    }
+
+    dispose() {
+        this.socket?.close();
+    }
+
+    private connect(): Promise<WebSocket> {
+        if (this.socket && this.socket.readyState === WebSocket.OPEN) {
+            return Promise.resolve(this.socket);
+        }
+        if (!this.opening) {
+            this.opening = new Promise((resolve, reject) => {
+                const url = `${this.config.baseUrl.replace(/^http/, 'ws')}/api/v1/ws`;
+                const socket = new WebSocket(url, {
+                    headers: { 'Authorization': `Bearer ${this.config.apiKey}` }
+                });
+                socket.on('open', () => {
+                    this.socket = socket;
+                    this.opening = undefined;
+                    resolve(socket);
+                });
+                socket.on('message', data => this.onMessage(JSON.parse(data.toString())));
+                socket.on('close', () => this.onClose(socket));
+                socket.on('error', error => {
+                    this.opening = undefined;
+                    reject(new ChannelUnavailableError(error.message));
+                });
+            });
+        }
+        return this.opening;
+    }
+
+    private onMessage(message: ChannelEvent) {
+        const request = this.pending.get(message.id);
+        if (!request) {
+            return;
+        }
+        if (message.event === 'done' || message.event === 'error' || message.event === 'cancelled') {
+            this.pending.delete(message.id);
+        }
+
+        if (message.event === 'done') {
+            request.resolve(request.events);
+        } else if (message.event === 'error') {
+            request.reject(new Error(message.detail || 'API request failed'));
+        } else if (message.event === 'cancelled') {
+            request.reject(new RequestCancelledError(`Request ${message.reason}`));
+        } else {
+            request.events.push(message);
+        }
+    }
+
+    private onClose(socket: WebSocket) {
+        if (this.socket === socket) {
+            this.socket = undefined;
+        }
+        for (const request of this.pending.values()) {
+            request.reject(new Error('Connection to AI Code Platform closed'));
+        }
+        this.pending.clear();
+    }
+}
+
+// Most recent HTTP results kept for revalidation with If-None-Match
+const MAX_CACHED_RESULTS = 50;
+
 class AICodePlatformProvider {
     private config: ApiConfig;
+    private channel: PlatformChannel;
+    private results = new Map<string, { etag: string; data: any }>();
 
     constructor() {
         this.config = this.getConfiguration();
+        this.channel = new PlatformChannel(this.config);
     }
 
     private getConfiguration(): ApiConfig {
@@ -21,56 +124,115 @@ class AICodePlatformProvider {
         };
     }
 
+    // A repeat of an earlier request is answered 304 and served from the cached body
     private async makeApiRequest(endpoint: string, data: any) {
+        const key = `${endpoint} ${JSON.stringify(data)}`;
+        const cached = this.results.get(key);
         try {
             const response = await axios.post(`${this.config.baseUrl}${endpoint}`, data, {
                 headers: {
                     'Authorization': `Bearer ${this.config.apiKey}`,
-                    'Content-Type': 'application/json'
-                }
+                    'Content-Type': 'application/json',
+                    ...(cached ? { 'If-None-Match': cached.etag } : {})
+                },
+                validateStatus: status => (status >= 200 && status < 300) || status === 304
             });
+            if (response.status === 304 && cached) {
+                this.results.delete(key);
+                this.results.set(key, cached);
+                return cached.data;
+            }
+            const etag = response.headers['etag'];
+            if (etag) {
+                this.results.delete(key);
+                this.results.set(key, { etag, data: response.data });
+                if (this.results.size > MAX_CACHED_RESULTS) {
+                    this.results.delete(this.results.keys().next().value);
+                }
+            }
             return response.data;
         } catch (error: any) {
             throw new Error(error.response?.data?.detail || 'API request failed');
         }
     }
 
+    // Send over the shared channel, falling back to HTTP when it cannot connect
+    private async makeChannelRequest(type: string, endpoint: string, data: any, document?: string): Promise<ChannelEvent[]> {
+        try {
+            return await this.channel.request(type, data, document);
+        } catch (error: any) {
+            if (!(error instanceof ChannelUnavailableError)) {
+                throw error;
+            }
+            const result = await this.makeApiRequest(endpoint, data);
+            return [{ id: '', event: 'result', ...result }];
+        }
+    }
+
+    private async requestResult(type: string, endpoint: string, data: any, document?: string): Promise<any> {
+        const events = await this.makeChannelRequest(type, endpoint, data, document);
+        return events.find(event => event.event === 'result');
+    }
+
     async generateCode(description: string, language: string, context?: string): Promise<any> {
-        return this.makeApiRequest('/api/v1/generate-code', {
+        return this.requestResult('generate_code', '/api/v1/generate-code', {
             description,
             language,
             context: context ? { additional_info: context } : undefined
         });
     }
 
-    async generateTests(code: string, language: string): Promise<any> {
-        return this.makeApiRequest('/api/v1/generate-tests', {
+    async generateTests(code: string, language: string, document?: string): Promise<any> {
+        return this.requestResult('generate_tests', '/api/v1/generate-tests', {
             code,
             language,
             test_type: 'unit',
             coverage_target: 0.8
-        });
+        }, document);
     }
 
-    async reviewCode(code: string, language: string): Promise<any> {
-        return this.makeApiRequest('/api/v1/review-code', {
+    async reviewCode(code: string, language: string, document?: string): Promise<any> {
+        const events = await this.makeChannelRequest('review', '/api/v1/review-code', {
             code,
             language,
             severity_threshold: 'medium'
-        });
+        }, document);
+
+        const fallback = events.find(event => event.event === 'result');
+        if (fallback) {
+            return fallback;
+        }
+        // Assemble the streamed review: static findings, AI findings, then totals
+        const issues: any[] = [];
+        let summary: any = {};
+        for (const event of events) {
+            if (event.event === 'static') {
+                issues.push(...event.issues);
+            } else if (event.event === 'issue') {
+                issues.push(event.issue);
+            } else if (event.event === 'complete') {
+                summary = event;
+            }
+        }
+        return { ...summary, issues };
     }
 
-    async generateDocumentation(code: string, language: string): Promise<any> {
-        return this.makeApiRequest('/api/v1/generate-docs', {
+    async generateDocumentation(code: string, language: string, document?: string): Promise<any> {
+        return this.requestResult('generate_docs', '/api/v1/generate-docs', {
             code,
             language,
             doc_type: 'api'
-        });
+        }, document);
+    }
+
+    dispose() {
+        this.channel.dispose();
     }
 }
 
 export function activate(context: vscode.ExtensionContext) {
     const provider = new AICodePlatformProvider();
+    const diagnosticCollection = vscode.languages.createDiagnosticCollection('aiCodePlatform');
 
     // Generate Code Command
     const generateCodeCommand = vscode.commands.registerCommand('aiCodePlatform.generateCode', async () => {
@@ -134,7 +296,7 @@ export function activate(context: vscode.ExtensionContext) {
                 title: 'Generating tests...',
                 cancellable: false
             }, async () => {
-                const result = await provider.generateTests(code, language);
+                const result = await provider.generateTests(code, language, document.uri.toString());
                 
                 // Create new test file
                 const fileName = document.fileName;
@@ -173,16 +335,15 @@ export function activate(context: vscode.ExtensionContext) {
         }
 
         try {
-            vscode.window.withProgress({
+            await vscode.window.withProgress({
                 location: vscode.ProgressLocation.Notification,
                 title: 'Reviewing code...',
                 cancellable: false
             }, async () => {
-                const result = await provider.reviewCode(code, language);
+                const result = await provider.reviewCode(code, language, document.uri.toString());
                 
                 // Clear existing diagnostics
-                const diagnosticCollection = vscode.languages.createDiagnosticCollection('aiCodePlatform');
-                diagnosticCollection.clear();
+                diagnosticCollection.delete(document.uri);
 
                 // Create diagnostics for issues
                 const diagnostics: vscode.Diagnostic[] = result.issues.map((issue: any) => {
@@ -209,6 +370,10 @@ export function activate(context: vscode.ExtensionContext) {
                 );
             });
         } catch (error: any) {
+            if (error instanceof RequestCancelledError) {
+                // A newer review of this document replaced this one
+                return;
+            }
             vscode.window.showErrorMessage(`Failed to review code: ${error.message}`);
         }
     });
@@ -236,7 +401,7 @@ export function activate(context: vscode.ExtensionContext) {
                 title: 'Generating documentation...',
                 cancellable: false
             }, async () => {
-                const result = await provider.generateDocumentation(code, language);
+                const result = await provider.generateDocumentation(code, language, document.uri.toString());
                 
                 // Create new documentation file
                 const fileName = document.fileName;
@@ -269,7 +434,7 @@ export function activate(context: vscode.ExtensionContext) {
         const config = vscode.workspace.getConfiguration('aiCodePlatform');
         const autoReview = config.get('autoReview', false);
         
-        if (autoReview && document.languageId in ['python', 'javascript', 'typescript', 'java']) {
+        if (autoReview && ['python', 'javascript', 'typescript', 'java'].includes(document.languageId)) {
             vscode.commands.executeCommand('aiCodePlatform.reviewCode');
         }
     });
@@ -281,7 +446,9 @@ export function activate(context: vscode.ExtensionContext) {
         reviewCodeCommand,
         generateDocsCommand,
         openDashboardCommand,
-        autoReviewDisposable
+        autoReviewDisposable,
+        diagnosticCollection,
+        provider
     );
 
     // Status bar item
@@ -0,0 +1,90 @@
+import io
+import tarfile
+import zipfile
+import pytest
+from backend.services.archive_review import ArchiveError, ArchiveReviewService, ContentHashStore, open_archive
+from backend.services.code_reviewer import CodeReviewerService
+
+FILES = {
+    "./src/app.py": b"def run(cmd):\n    return eval(cmd)\n",
+    "src/util.js": b"function add(a, b) {\n  return a + b;\n}\n",
+    "README.md": b"# Project\n",
+    "src/big.py": b"x = 1\n" * 100,
+}
+
+
+def _tarball(files, compression="gz"):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode=f"w:{compression}") as archive:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    buffer.seek(0)
+    return buffer
+
+
+def _zip(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+
+async def _review(service, upload, project="repo"):
+    members = open_archive(upload, max_file_bytes=300)
+    return [event async for event in service.review_archive(members, project)]
+
+
+@pytest.fixture
+def service():
+    return ArchiveReviewService(CodeReviewerService(), ContentHashStore())
+
+
+def test_members_streamed_with_languages():
+    members = list(open_archive(_tarball(FILES), max_file_bytes=300))
+
+    assert [(m.path, m.language) for m in members] == [
+        ("src/app.py", "python"), ("src/util.js", "javascript"), ("README.md", None), ("src/big.py", "python")
+    ]
+    # Unsupported and oversized files are never read
+    assert members[2].data is None and members[3].data is None
+    assert members[0].data == FILES["./src/app.py"]
+
+
+def test_zip_archives_supported():
+    members = list(open_archive(_zip(FILES), max_file_bytes=300))
+
+    assert [m.path for m in members if m.data is not None] == ["src/app.py", "src/util.js"]
+
+
+def test_unreadable_upload_rejected():
+    with pytest.raises(ArchiveError):
+        open_archive(io.BytesIO(b"not an archive" * 100), max_file_bytes=300)
+
+
+@pytest.mark.asyncio
+async def test_files_reviewed_with_paths(service):
+    events = await _review(service, _tarball(FILES))
+
+    reviewed = {event["path"]: event for event in events if event["event"] == "file"}
+    assert set(reviewed) == {"src/app.py", "src/util.js"}
+    assert any(issue["category"] == "security" and issue["line_number"] == 2 for issue in reviewed["src/app.py"]["issues"])
+    assert {"event": "skipped", "path": "src/big.py", "reason": "too_large"} in events
+    assert events[-1] == {"event": "complete", "files": 4, "reviewed": 2, "unchanged": 0, "skipped": 1, "ignored": 1}
+
+
+@pytest.mark.asyncio
+async def test_unchanged_files_skipped_on_next_upload(service):
+    await _review(service, _tarball(FILES))
+    changed = dict(FILES, **{"src/util.js": b"function add(a, b) {\n  return b + a;\n}\n"})
+
+    events = await _review(service, _tarball(changed))
+
+    assert [event["path"] for event in events if event["event"] == "file"] == ["src/util.js"]
+    assert events[-1]["unchanged"] == 1
+    # Hashes are per project
+    other = await _review(service, _tarball(FILES), project="fork")
+    assert other[-1]["reviewed"] == 2
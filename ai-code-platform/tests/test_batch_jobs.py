@@ -0,0 +1,142 @@
+import json
+
+import pytest
+# Imported as the service modules import them so settings are shared
+from core.config import settings
+from services.batch_jobs import BatchJobService, BatchJobStore, LocalBatchBackend, OpenAIBatchBackend
+from services.code_reviewer import CodeReviewerService
+from services.llm_providers import BatchRequest
+from services.test_generator import TestGeneratorService as GeneratorService
+
+FILES = [
+    {"path": "src/app.py", "language": "python", "code": "def run(cmd):\n    return eval(cmd)\n"},
+    {"path": "src/util.js", "language": "javascript", "code": "function add(a, b) {\n  return a + b;\n}\n"}
+]
+
+
+def _responder(request: BatchRequest) -> str:
+    if "response_format" in request.options:
+        return json.dumps({"issues": [{"line_number": 1, "severity": "low", "category": "style",
+                                       "title": "Missing docstring", "description": "", "suggestion": ""}],
+                           "suggestions": ["Document the module"]})
+    return "```python\ndef test_placeholder():\n    assert True\n```"
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(settings, "TEST_SANDBOX_ENABLED", False)
+    return BatchJobService(CodeReviewerService(), GeneratorService(), LocalBatchBackend(_responder), BatchJobStore())
+
+
+async def _results(service, job_id):
+    job = await service.jobs.load(job_id)
+    return [event async for event in service.results(job)]
+
+
+@pytest.mark.asyncio
+async def test_reviews_fan_out_per_file(service, monkeypatch):
+    # One request per file, each in its own provider batch
+    monkeypatch.setattr(settings, "BATCH_MAX_REQUESTS", 1)
+    submitted = await service.submit("review", FILES)
+
+    assert (submitted["files"], submitted["requests"], len(submitted["batches"])) == (2, 2, 2)
+    assert (await service.refresh(submitted["id"]))["status"] == "completed"
+
+    events = await _results(service, submitted["id"])
+    reviews = {event["path"]: event["result"] for event in events if event["event"] == "file"}
+    assert any(issue["category"] == "security" and issue["line_number"] == 2 for issue in reviews["src/app.py"]["issues"])
+    assert all("Document the module" in review["suggestions"] for review in reviews.values())
+    assert events[-1] == {"event": "complete", "files": 2, "failed_requests": 0}
+
+
+@pytest.mark.asyncio
+async def test_large_jobs_split_by_bytes(service, monkeypatch):
+    monkeypatch.setattr(settings, "BATCH_MAX_BYTES", 40000)
+    files = [{"path": f"src/m{i}.py", "language": "python", "code": f"def f{i}():\n    return '{'x' * 15000}'\n"}
+             for i in range(5)]
+
+    submitted = await service.submit("tests", files)
+    job = service.jobs.local[submitted["id"]]
+    batches = [service.backend.batches[batch["id"]]["requests"] for batch in submitted["batches"]]
+
+    assert [len(requests) for requests in batches] == [2, 2, 1]
+    assert all(sum(service.backend.request_size(r) for r in requests) <= 40000 for requests in batches)
+    # The job record, re-saved on every poll, does not carry the code
+    assert "xxxx" not in json.dumps(job)
+    await service.refresh(submitted["id"])
+    events = await _results(service, submitted["id"])
+    assert [event["path"] for event in events[:-1]] == [file["path"] for file in files]
+    assert all("result" in event for event in events[:-1])
+
+
+@pytest.mark.asyncio
+async def test_failed_requests_reported_per_file(monkeypatch):
+    monkeypatch.setattr(settings, "TEST_SANDBOX_ENABLED", False)
+    service = BatchJobService(CodeReviewerService(), GeneratorService(), LocalBatchBackend(_responder, fail_every=2))
+    submitted = await service.submit("tests", FILES)
+    await service.refresh(submitted["id"])
+
+    events = await _results(service, submitted["id"])
+
+    assert "def test_placeholder" in events[0]["result"]["tests"]
+    assert events[1]["result"]["tests"].startswith("# Error generating tests: local simulated failure")
+    assert events[-1]["failed_requests"] == 1
+
+
+@pytest.mark.asyncio
+async def test_jobs_wait_for_every_batch():
+    service = BatchJobService(CodeReviewerService(), GeneratorService(), LocalBatchBackend(completion_delay=60))
+    submitted = await service.submit("review", FILES)
+
+    assert (await service.refresh(submitted["id"]))["status"] == "in_progress"
+    assert await service.refresh("unknown") is None
+    with pytest.raises(ValueError):
+        await service.submit("deploy", FILES)
+
+
+@pytest.mark.asyncio
+async def test_openai_backend_uploads_jsonl_and_reads_results():
+    client = FakeOpenAIClient()
+    backend = OpenAIBatchBackend(client)
+    request = BatchRequest(custom_id="0:0", system="s", prompt="p", prefix="x", max_tokens=300, model="gpt-3.5-turbo",
+                           options={"response_format": {"type": "json_object"}})
+
+    batch_id = await backend.submit([request, BatchRequest(custom_id="1:0", system="s", prompt="q")])
+    outputs = await backend.results(batch_id)
+
+    line = json.loads(client.uploaded.splitlines()[0])
+    assert line["url"] == "/v1/chat/completions"
+    assert line["body"]["model"] == "gpt-3.5-turbo" and line["body"]["max_tokens"] == 300
+    assert line["body"]["messages"][1]["content"] == "xp"
+    assert json.loads(client.uploaded.splitlines()[1])["body"]["model"] == "gpt-4-turbo-preview"
+    assert client.created["completion_window"] == "24h"
+    assert outputs["0:0"].text == "{}" and outputs["1:0"].error == "rate limited"
+
+
+class FakeOpenAIClient:
+    """The parts of the OpenAI client the batch backend calls, answering from canned files"""
+
+    def __init__(self):
+        self.files = self
+        self.uploaded = None
+        self.created = None
+
+    async def create(self, file, purpose):
+        self.uploaded = file[1].decode("utf8")
+        return type("Upload", (), {"id": "file-in"})
+
+    async def post(self, path, body, cast_to):
+        self.created = body
+        return {"id": "batch-1", "status": "validating"}
+
+    async def get(self, path, cast_to):
+        return {"id": "batch-1", "status": "completed", "output_file_id": "file-out", "error_file_id": "file-err"}
+
+    async def content(self, file_id):
+        records = {
+            "file-out": {"custom_id": "0:0", "response": {"status_code": 200, "body": {
+                "choices": [{"message": {"content": "{}"}}]}}},
+            "file-err": {"custom_id": "1:0", "response": {"status_code": 429, "body": {
+                "error": {"message": "rate limited"}}}}
+        }
+        return type("Content", (), {"text": json.dumps(records[file_id]) + "\n"})
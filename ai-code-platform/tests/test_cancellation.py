@@ -0,0 +1,117 @@
+import asyncio
+import json
+import time
+import pytest
+# Imported as the service modules import them so context variables and metrics are shared
+from core.cancellation import CancellationMiddleware
+from core.concurrency import AdaptiveLimiter, DeadlineExceededError
+from core.metrics import metrics
+from core.request_context import request_deadline, time_remaining
+from services.llm_providers import LocalProvider
+
+
+class SlowEndpoint:
+    """ASGI app standing in for an endpoint blocked on an LLM call"""
+
+    def __init__(self, delay=30):
+        self.delay = delay
+        self.cancelled = False
+        self.remaining = None
+
+    async def __call__(self, scope, receive, send):
+        await receive()
+        self.remaining = time_remaining()
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def _call(middleware, path, disconnect_after=None):
+    sent = []
+    requests = [{"type": "http.request", "body": b"{}", "more_body": False}]
+
+    async def receive():
+        if requests:
+            return requests.pop()
+        await asyncio.sleep(disconnect_after if disconnect_after is not None else 60)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    await middleware({"type": "http", "path": path}, receive, send)
+    return sent
+
+
+@pytest.mark.asyncio
+async def test_disconnect_cancels_endpoint():
+    endpoint = SlowEndpoint()
+    before = metrics.counter("requests_cancelled", {"path": "/api/v1/generate-tests", "reason": "disconnect"})
+
+    sent = await asyncio.wait_for(_call(CancellationMiddleware(endpoint, deadlines={}), "/api/v1/generate-tests", disconnect_after=0.05), 5)
+
+    assert endpoint.cancelled
+    assert sent == []
+    assert metrics.counter("requests_cancelled", {"path": "/api/v1/generate-tests", "reason": "disconnect"}) == before + 1
+
+
+@pytest.mark.asyncio
+async def test_deadline_returns_504():
+    endpoint = SlowEndpoint()
+
+    sent = await asyncio.wait_for(_call(CancellationMiddleware(endpoint, deadlines={"/slow": 0.1}), "/slow"), 5)
+
+    assert endpoint.cancelled
+    assert 0 < endpoint.remaining <= 0.1
+    assert sent[0]["status"] == 504
+    assert "deadline" in json.loads(sent[1]["body"])["detail"]
+
+
+@pytest.mark.asyncio
+async def test_completed_request_untouched():
+    endpoint = SlowEndpoint(delay=0)
+
+    sent = await _call(CancellationMiddleware(endpoint, deadlines={"/fast": 5}), "/fast")
+
+    assert sent[0]["status"] == 200
+    assert not endpoint.cancelled
+
+
+@pytest.mark.asyncio
+async def test_limiter_queue_respects_deadline():
+    limiter = AdaptiveLimiter("deadline-test", initial_limit=1, max_queue=5, queue_timeout=10.0)
+    await limiter.acquire()
+
+    token = request_deadline.set(time.monotonic() + 0.05)
+    try:
+        with pytest.raises(DeadlineExceededError):
+            await limiter.acquire()
+    finally:
+        request_deadline.reset(token)
+
+    assert limiter.shed_count == 0
+    assert limiter.queued == 0
+
+
+@pytest.mark.asyncio
+async def test_llm_call_bounded_by_deadline_and_counted():
+    provider = LocalProvider(name="deadline-local", latency=5)
+    labels = {"provider": "deadline-local", "reason": "deadline"}
+    initial_limit = provider.limiter.limit
+
+    token = request_deadline.set(time.monotonic() + 0.05)
+    try:
+        with pytest.raises(DeadlineExceededError):
+            await provider.complete(system="s", prompt="p")
+    finally:
+        request_deadline.reset(token)
+
+    assert metrics.counter("llm_calls_abandoned", labels) == 1
+    assert metrics.counter("llm_abandoned_seconds", labels) > 0
+    # Running out of time is not a provider overload, so the limit is not cut
+    assert provider.limiter.limit == initial_limit
+    assert provider.limiter.in_flight == 0
@@ -154,13 +154,25 @@ def main_function():
             "functions": ["helper"]
         }
         
-        prompt = service._build_generation_prompt(description, language, context, project_context)
+        prefix, prompt = service._build_generation_prompt(description, language, context, project_context)
         
+        assert language in prefix
+        assert "django.db" in prefix
+        assert "Model" in prefix
+        assert "helper" in prefix
+        # The request-specific parts follow the cacheable prefix
         assert description in prompt
-        assert language in prompt
-        assert "django.db" in prompt
-        assert "Model" in prompt
-        assert "helper" in prompt
+        assert "Django" in prompt
+        assert description not in prefix
+    
+    def test_prompt_prefix_stable_across_requests(self, service):
+        """Requests against the same project share a byte-identical prefix"""
+        project_context = {"imports": ["django.db"], "classes": ["Model"], "functions": ["helper"]}
+        
+        first, _ = service._build_generation_prompt("Create a sorting function", "python", None, project_context)
+        second, _ = service._build_generation_prompt("Parse a CSV file", "python", {"framework": "Django"}, project_context)
+        
+        assert first == second
     
     def test_response_parsing(self, service):
         """Test parsing of AI responses"""
@@ -0,0 +1,141 @@
+import asyncio
+import json
+
+import pytest
+from unittest.mock import Mock, patch, AsyncMock
+from backend.services.code_index import CodeChunker, CodeIndex
+from backend.services.code_generator import CodeGeneratorService
+
+PROJECT = {
+    "billing/invoice.py": "class Invoice:\n    def total(self):\n        return sum(self.lines)\n\ndef send_invoice_email(invoice, address):\n    return smtp.send(address, invoice)\n",
+    "utils/strings.py": "def slugify(text):\n    return text.lower().replace(' ', '-')\n",
+    "web/app.js": "function renderCart(cart) {\n  return cart.items.map(i => i.name);\n}\n",
+}
+
+
+class TestCodeChunker:
+
+    def test_python_symbols_become_chunks(self):
+        chunks = CodeChunker(max_lines=50).chunk("billing/invoice.py", PROJECT["billing/invoice.py"])
+
+        assert [(c.symbol, c.start_line, c.end_line) for c in chunks] == [("Invoice", 1, 3), ("send_invoice_email", 5, 6)]
+
+    def test_large_class_split_into_methods(self):
+        code = "class Big:\n" + "".join(f"    def m{i}(self):\n        return {i}\n\n" for i in range(5))
+        chunks = CodeChunker(max_lines=5).chunk("big.py", code)
+
+        assert chunks[0].symbol == "Big"
+        assert [c.symbol for c in chunks[1:]] == [f"m{i}" for i in range(5)]
+
+    @pytest.mark.parametrize("path, code, symbols", [
+        ("shapes.go", "package shapes\n\ntype Circle struct{ r float64 }\n\nfunc (c Circle) Area() float64 { return c.r }\n", ["Circle", "Area"]),
+        ("shapes.rs", "struct Circle { r: f64 }\nimpl Circle {\n    fn area(&self) -> f64 { self.r }\n}\nmod util { fn scale() {} }\n", ["Circle", "Circle", "scale"]),
+        ("shapes.cpp", "namespace geo {\nint area(int r) { return r; }\n}\ntemplate <typename T> T twice(T x) { return x; }\n", ["area", "twice"]),
+        ("Shapes.cs", "namespace Geo {\n  class Circle {\n    int Area() { return 1; }\n  }\n}\n", ["Circle"]),
+        ("shapes.ts", "interface Shape { area(): number }\nexport function area(s: Shape) { return s.area() }\n", ["Shape", "area"]),
+    ])
+    def test_other_languages_become_symbol_chunks(self, path, code, symbols):
+        assert [c.symbol for c in CodeChunker(max_lines=50).chunk(path, code)] == symbols
+
+    def test_unknown_language_uses_windows(self):
+        chunks = CodeChunker(window_lines=2).chunk("notes.txt", "a\nb\nc\n")
+
+        assert [(c.start_line, c.end_line) for c in chunks] == [(1, 2), (3, 4)]
+
+
+class TestCodeIndex:
+
+    @pytest.mark.asyncio
+    async def test_search_returns_relevant_chunk(self):
+        index = CodeIndex()
+        await index.update(PROJECT)
+
+        results = await index.search("send an invoice by email", top_k=1)
+
+        assert results[0]["symbol"] == "send_invoice_email"
+
+    @pytest.mark.asyncio
+    async def test_incremental_update(self):
+        index = CodeIndex()
+        await index.update(PROJECT)
+        changed = dict(PROJECT, **{"utils/strings.py": "def slugify(text):\n    return text.strip()\n"})
+
+        summary = await index.update(changed)
+
+        assert summary["changed_files"] == 1
+        assert summary["chunks_indexed"] == 1
+        assert summary["total_chunks"] == 4
+
+    @pytest.mark.asyncio
+    async def test_prune_removes_deleted_files(self):
+        index = CodeIndex()
+        await index.update(PROJECT)
+
+        await index.update({"utils/strings.py": PROJECT["utils/strings.py"]}, prune=True)
+
+        assert index.size == 1
+        assert all(r["path"] == "utils/strings.py" for r in await index.search("invoice email", top_k=3))
+
+    @pytest.mark.asyncio
+    async def test_concurrent_updates_index_each_file_once(self, tmp_path):
+        index = CodeIndex(str(tmp_path))
+
+        await asyncio.gather(index.update(PROJECT), index.update(PROJECT))
+
+        assert index.size == 4
+        assert len((tmp_path / "index.log").read_text().splitlines()) == 1 + len(PROJECT)
+        assert CodeIndex(str(tmp_path)).size == 4
+
+    @pytest.mark.asyncio
+    async def test_memory_mapped_index_reloads(self, tmp_path):
+        index = CodeIndex(str(tmp_path))
+        await index.update(PROJECT)
+
+        reloaded = CodeIndex(str(tmp_path))
+
+        assert reloaded.size == index.size
+        assert (await reloaded.update(PROJECT))["changed_files"] == 0
+        assert (await reloaded.search("render cart items", top_k=1))[0]["symbol"] == "renderCart"
+
+    @pytest.mark.asyncio
+    async def test_updates_append_only_changed_files(self, tmp_path):
+        index = CodeIndex(str(tmp_path))
+        await index.update(PROJECT)
+        log = (tmp_path / "index.log").read_text()
+
+        await index.update(dict(PROJECT, **{"utils/strings.py": "def slugify(text):\n    return text.strip()\n"}))
+        await index.update({"web/app.js": PROJECT["web/app.js"]}, prune=True)
+        appended = (tmp_path / "index.log").read_text()
+        reloaded = CodeIndex(str(tmp_path))
+
+        assert appended.startswith(log)
+        assert [json.loads(line).get("path") for line in appended[len(log):].splitlines()] == [
+            "utils/strings.py", "billing/invoice.py", "utils/strings.py"
+        ]
+        assert list(reloaded.files) == ["web/app.js"] and reloaded.size == index.size == 1
+        assert (await reloaded.search("render cart items", top_k=1))[0]["symbol"] == "renderCart"
+
+        reloaded.save()
+        assert len((tmp_path / "index.log").read_text().splitlines()) == 2
+
+
+@pytest.mark.asyncio
+async def test_generation_prompt_includes_retrieved_code():
+    with patch('backend.services.code_generator.settings') as mock_settings:
+        mock_settings.OPENAI_API_KEY = "test-key"
+        mock_settings.ANTHROPIC_API_KEY = "test-key"
+        service = CodeGeneratorService()
+
+    mock_response = Mock()
+    mock_response.choices = [Mock()]
+    mock_response.choices[0].message.content = "```python\ndef resend(invoice):\n    pass\n```"
+
+    await service.index_project("acme", PROJECT)
+
+    with patch.object(service.openai_client.chat.completions, 'create', new_callable=AsyncMock) as mock_create:
+        mock_create.return_value = mock_response
+
+        await service.generate_code(description="resend an invoice email", language="python", project_id="acme")
+
+        prompt = mock_create.call_args[1]['messages'][1]['content']
+        assert "smtp.send(address, invoice)" in prompt
@@ -0,0 +1,190 @@
+import json
+import pytest
+from unittest.mock import Mock, patch, AsyncMock
+from backend.core.serialization import dumps
+from backend.services.code_reviewer import CodeReviewerService, RuleEngine, StreamingIssueParser, issue_to_dict, issues_to_columns
+
+SAMPLE_CODE = "def add(a, b):\n    return eval('a + b')\n"
+
+REVIEW_JSON = json.dumps({
+    "issues": [
+        {
+            "line_number": 2,
+            "severity": "high",
+            "category": "security",
+            "title": "Use of eval",
+            "description": "eval executes arbitrary code",
+            "suggestion": "Return a + b directly",
+            "code_snippet": ""
+        },
+        {
+            "line_number": 1,
+            "severity": "low",
+            "category": "style",
+            "title": "Missing docstring {braces} \"quoted\"",
+            "description": "Function has no docstring",
+            "suggestion": "Add a docstring",
+            "code_snippet": "def add(a, b):"
+        }
+    ],
+    "suggestions": ["Add type hints"]
+})
+
+
+def _stream_chunks(text, size=7):
+    """Build a fake OpenAI streaming response from text"""
+    async def stream():
+        for i in range(0, len(text), size):
+            chunk = Mock()
+            chunk.choices = [Mock()]
+            chunk.choices[0].delta.content = text[i:i + size]
+            yield chunk
+    return stream()
+
+
+class TestStreamingIssueParser:
+
+    def test_issues_emitted_incrementally(self):
+        """Each issue is returned as soon as its object closes"""
+        parser = StreamingIssueParser(SAMPLE_CODE)
+        first_end = REVIEW_JSON.index('}') + 1
+
+        first = parser.feed(REVIEW_JSON[:first_end])
+        rest = parser.feed(REVIEW_JSON[first_end:])
+
+        assert [i.title for i in first] == ["Use of eval"]
+        assert len(rest) == 1
+        assert rest[0].title == 'Missing docstring {braces} "quoted"'
+        assert parser.finish()["suggestions"] == ["Add type hints"]
+
+    def test_issue_fields_mapped(self):
+        """Severity, category and snippet come from the JSON payload"""
+        parser = StreamingIssueParser(SAMPLE_CODE)
+        issue = parser.feed(REVIEW_JSON)[0]
+
+        assert issue.line_number == 2
+        assert issue.severity.value == "high"
+        assert issue.category.value == "security"
+        # Empty snippets are filled from the reviewed source
+        assert issue.code_snippet == "return eval('a + b')"
+
+    def test_unknown_enums_fall_back(self):
+        """Unexpected severity/category values don't drop the finding"""
+        parser = StreamingIssueParser()
+        issues = parser.feed('{"issues": [{"line_number": "x", "severity": "urgent", "category": "other", "title": "T"}]}')
+
+        assert len(issues) == 1
+        assert issues[0].line_number == 0
+        assert issues[0].severity.value == "medium"
+        assert issues[0].category.value == "best_practice"
+
+    def test_invalid_json_reported(self):
+        """Non-JSON responses are surfaced as a suggestion"""
+        parser = StreamingIssueParser()
+        assert parser.feed("Line 3 has an issue") == []
+        assert parser.finish()["suggestions"] == ["AI review response was not valid JSON"]
+
+
+class TestSerialization:
+
+    def test_slotted_issues_encode_like_issue_to_dict(self):
+        issues = StreamingIssueParser(SAMPLE_CODE).feed(REVIEW_JSON)
+
+        assert not hasattr(issues[0], "__dict__")
+        assert json.loads(dumps(issues)) == [issue_to_dict(issue) for issue in issues]
+
+    def test_columns_rebuild_rows(self):
+        issues = StreamingIssueParser(SAMPLE_CODE).feed(REVIEW_JSON) * 3
+        encoded = issues_to_columns(issues)
+        columns, dictionaries = encoded["columns"], encoded["dictionaries"]
+
+        rows = [
+            {name: dictionaries[name][codes[i]] if name in dictionaries else codes[i] for name, codes in columns.items()}
+            for i in range(encoded["count"])
+        ]
+        assert rows == [issue_to_dict(issue) for issue in issues]
+        assert dictionaries["severity"] == ["high", "low"]
+
+
+class TestRuleEngine:
+
+    @pytest.fixture(scope="class")
+    def engine(self):
+        return RuleEngine()
+
+    def test_javascript_rules(self, engine):
+        code = (
+            "function find(db, id) {\n"
+            "  try { run(); } catch (e) {}\n"
+            "  return db.query(\"SELECT * FROM users WHERE id = \" + id);\n"
+            "}\n"
+        )
+        issues = engine.analyze(code, "javascript")
+
+        assert [(i.line_number, i.title) for i in issues] == [(2, "Empty Catch Block"), (3, "Potential Sql Injection")]
+        assert issues[1].severity.value == "high"
+
+    def test_plain_string_concatenation_not_flagged(self, engine):
+        assert engine.analyze('const greeting = "Hello, " + name;', "javascript") == []
+
+    def test_complexity_counted_per_function(self, engine):
+        branches = "".join(f"    if (a == {i}) {{ a++; }}\n" for i in range(11))
+        code = f"function outer(a) {{\n{branches}    return () => a;\n}}\n"
+
+        issues = engine.analyze(code, "typescript")
+
+        assert [i.description for i in issues] == ["Function 'outer' has complexity 12"]
+
+    @pytest.mark.parametrize("language, code, title", [
+        ("java", 'class A { void f() { try { g(); } catch (Exception e) { log(e); } } }', "Catch-All Exception Handler"),
+        ("go", 'package m\nfunc f(id string) string { return fmt.Sprintf("DELETE FROM t WHERE id=%s", id) }', "Potential Sql Injection"),
+        ("rust", 'fn f() { let v = read().unwrap(); }', "Unchecked unwrap"),
+        ("cpp", 'void f(char* s) { char b[8]; strcpy(b, s); }', "Unsafe C String Function"),
+        ("csharp", 'class A { string Q(int id) { return $"SELECT * FROM t WHERE id={id}"; } }', "Potential Sql Injection"),
+        ("php", '<?php function f($c) { eval($c); }', "Use of eval"),
+    ])
+    def test_rule_packs(self, engine, language, code, title):
+        assert [i.title for i in engine.analyze(code, language)] == [title]
+
+    def test_unsupported_language(self, engine):
+        assert not engine.supports("cobol")
+        assert engine.analyze("DISPLAY 'HI'.", "cobol") == []
+
+
+class TestCodeReviewerService:
+
+    @pytest.fixture
+    def service(self):
+        with patch('backend.services.code_reviewer.settings') as mock_settings:
+            mock_settings.OPENAI_API_KEY = "test-key"
+            return CodeReviewerService()
+
+    @pytest.mark.asyncio
+    async def test_ai_review_uses_json_stream(self, service):
+        """AI review requests JSON mode and parses the streamed response"""
+        with patch.object(service.openai_client.chat.completions, 'create', new_callable=AsyncMock) as mock_create:
+            mock_create.return_value = _stream_chunks(REVIEW_JSON)
+
+            result = await service._ai_code_review(SAMPLE_CODE, "python", None, None)
+
+            call_args = mock_create.call_args[1]
+            assert call_args["stream"] is True
+            assert call_args["response_format"] == {"type": "json_object"}
+            assert [i.line_number for i in result["issues"]] == [2, 1]
+            assert result["suggestions"] == ["Add type hints"]
+
+    @pytest.mark.asyncio
+    async def test_ai_review_failure_keeps_partial_issues(self, service):
+        """Issues streamed before a failure are kept"""
+        async def broken_stream():
+            async for chunk in _stream_chunks(REVIEW_JSON[:REVIEW_JSON.index('}') + 1]):
+                yield chunk
+            raise RuntimeError("connection reset")
+
+        with patch.object(service.openai_client.chat.completions, 'create', new_callable=AsyncMock) as mock_create:
+            mock_create.return_value = broken_stream()
+
+            result = await service._ai_code_review(SAMPLE_CODE, "python", None, None)
+
+            assert len(result["issues"]) == 1
+            assert "AI review failed" in result["suggestions"][0]
@@ -0,0 +1,107 @@
+import asyncio
+import pytest
+from backend.core.concurrency import AdaptiveLimiter, OverloadedError, is_overload_error
+from backend.core.request_context import RequestPriority
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+
+def _limiter(**kwargs):
+    options = {"initial_limit": 2, "min_limit": 1, "max_limit": 4, "max_queue": 2, "queue_timeout": 1.0}
+    options.update(kwargs)
+    return AdaptiveLimiter("test", **options)
+
+
+class TestAdaptiveLimiter:
+
+    @pytest.mark.asyncio
+    async def test_limit_grows_on_success(self):
+        limiter = _limiter()
+        for _ in range(4):
+            async with limiter.slot():
+                pass
+        assert limiter.limit > 2
+
+    @pytest.mark.asyncio
+    async def test_limit_shrinks_on_rate_limit(self):
+        limiter = _limiter(initial_limit=4)
+        with pytest.raises(RateLimited):
+            async with limiter.slot():
+                raise RateLimited()
+        assert limiter.limit == 2
+        assert limiter.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_other_errors_keep_limit(self):
+        limiter = _limiter()
+        with pytest.raises(ValueError):
+            async with limiter.slot():
+                raise ValueError("bad prompt")
+        assert limiter.limit == 2
+
+    @pytest.mark.asyncio
+    async def test_queue_full_sheds_load(self):
+        """Requests beyond limit + queue are rejected with a retry hint"""
+        limiter = _limiter(initial_limit=1, max_queue=1)
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+
+        with pytest.raises(OverloadedError) as exc_info:
+            await limiter.acquire()
+        assert exc_info.value.retry_after >= 1
+
+        limiter.release(succeeded=True)
+        await waiter
+        assert limiter.in_flight == 1
+
+    @pytest.mark.asyncio
+    async def test_interactive_served_before_batch(self):
+        limiter = _limiter(initial_limit=1, max_queue=5)
+        await limiter.acquire()
+        order = []
+
+        async def request(name, priority):
+            await limiter.acquire(priority)
+            order.append(name)
+            limiter.release(succeeded=True)
+
+        batch = asyncio.create_task(request("batch", RequestPriority.BATCH))
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(request("interactive", RequestPriority.INTERACTIVE))
+        await asyncio.sleep(0)
+
+        limiter.release(succeeded=True)
+        await asyncio.gather(batch, interactive)
+        assert order == ["interactive", "batch"]
+
+    @pytest.mark.asyncio
+    async def test_interactive_displaces_queued_batch(self):
+        """A full queue sheds batch work to admit an interactive request"""
+        limiter = _limiter(initial_limit=1, max_queue=1)
+        await limiter.acquire()
+        batch = asyncio.create_task(limiter.acquire(RequestPriority.BATCH))
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(limiter.acquire(RequestPriority.INTERACTIVE))
+        await asyncio.sleep(0)
+
+        with pytest.raises(OverloadedError):
+            await batch
+        limiter.release(succeeded=True)
+        await interactive
+        assert limiter.queued == 0
+
+    @pytest.mark.asyncio
+    async def test_queue_timeout(self):
+        limiter = _limiter(initial_limit=1, queue_timeout=0.01)
+        await limiter.acquire()
+        with pytest.raises(OverloadedError):
+            await limiter.acquire()
+        assert limiter.queued == 0
+
+    def test_overload_classification(self):
+        assert is_overload_error(RateLimited())
+        assert is_overload_error(asyncio.TimeoutError())
+        assert not is_overload_error(ValueError())
@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+from unittest.mock import patch
+from core.concurrency import AdaptiveLimiter, OverloadedError  # the classes the service modules import
+from backend.services.documentation import DocumentationService, SymbolExtractor
+from backend.services.llm_providers import CompletionResult, LLMProvider
+
+MODULE = '''import math
+
+class Circle:
+    """A circle"""
+    unit = "cm"
+
+    def __init__(self, radius):
+        self.radius = radius
+
+    def area(self):
+        return math.pi * self.radius ** 2
+
+def describe(shape):
+    return f"{shape} with area {shape.area()}"
+'''
+
+
+class CountingProvider:
+    """Records which symbols were documented"""
+
+    def __init__(self, fail_on=None):
+        self.documented = []
+        self.fail_on = fail_on
+
+    async def complete(self, system, prompt, temperature=0.2, max_tokens=2000, **options):
+        name = prompt.split('`')[1]
+        if name == self.fail_on:
+            raise OverloadedError("openai", 3)
+        self.documented.append(name)
+        return CompletionResult(text=f"Docs for {name}", provider="openai", model="gpt-4")
+
+
+class FailingProvider(CountingProvider):
+    """Fails one symbol with an ordinary provider error"""
+
+    async def complete(self, system, prompt, temperature=0.2, max_tokens=2000, **options):
+        if prompt.split('`')[1] == self.fail_on:
+            raise RuntimeError("no completion")
+        return await super().complete(system, prompt, temperature, max_tokens, **options)
+
+
+class SlowProvider(LLMProvider):
+    """Goes through the real concurrency limiter"""
+
+    name = "slow"
+
+    async def _complete(self, system, prompt, temperature, max_tokens, prefix="", **options):
+        await asyncio.sleep(0.001)
+        return CompletionResult(text="Docs", provider=self.name, model=self.model)
+
+
+@pytest.fixture
+def service():
+    with patch('backend.services.documentation.settings') as mock_settings:
+        mock_settings.OPENAI_API_KEY = "test-key"
+        mock_settings.DOC_CACHE_MAX_ENTRIES = 100
+        mock_settings.DOCS_MAX_CONCURRENCY = 4
+        service = DocumentationService()
+    service.provider = CountingProvider()
+    return service
+
+
+def test_python_symbols():
+    symbols = SymbolExtractor().extract(MODULE, "python")
+
+    assert [(s.name, s.kind, s.start_line, s.end_line) for s in symbols] == [
+        ("Circle", "class", 3, 11),
+        ("Circle.__init__", "method", 7, 8),
+        ("Circle.area", "method", 10, 11),
+        ("describe", "function", 13, 14),
+    ]
+    # Method bodies are left out of the class symbol
+    assert "math.pi" not in symbols[0].source
+    assert "def area(self):" in symbols[0].source
+
+
+def test_javascript_symbols_use_tree_sitter():
+    code = "function a() {\n  return 1;\n}\n\nfunction b() {\n  return 2;\n}\n"
+
+    assert [s.name for s in SymbolExtractor().extract(code, "javascript")] == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_only_changed_symbols_regenerated(service):
+    first = await service.generate_documentation(MODULE, "python")
+    service.provider.documented.clear()
+
+    changed = MODULE.replace("math.pi * self.radius ** 2", "3.14159 * self.radius * self.radius")
+    second = await service.generate_documentation(changed, "python")
+
+    assert (first.generated, first.cached) == (4, 0)
+    assert service.provider.documented == ["Circle.area"]
+    assert (second.generated, second.cached) == (1, 3)
+    assert "## `describe`\n\nDocs for describe" in second.documentation
+
+
+@pytest.mark.asyncio
+async def test_overload_keeps_completed_symbols(service):
+    service.provider = CountingProvider(fail_on="describe")
+
+    with pytest.raises(OverloadedError):
+        await service.generate_documentation(MODULE, "python")
+
+    service.provider = CountingProvider()
+    result = await service.generate_documentation(MODULE, "python")
+
+    assert service.provider.documented == ["describe"]
+    assert result.cached == 3
+
+
+@pytest.mark.asyncio
+async def test_failed_symbols_are_not_counted_as_generated(service):
+    service.provider = FailingProvider(fail_on="describe")
+
+    result = await service.generate_documentation(MODULE, "python")
+
+    assert (result.generated, result.cached) == (3, 0)
+    assert "_Documentation generation failed: no completion_" in result.documentation
+
+
+@pytest.mark.asyncio
+async def test_large_module_is_not_shed_by_the_limiter(service):
+    limiter = AdaptiveLimiter("docs-test", initial_limit=2, max_limit=2, max_queue=5)
+    service.provider = SlowProvider("model", limiter)
+    module = "".join(f"def f{i}():\n    return {i}\n\n" for i in range(40))
+
+    result = await service.generate_documentation(module, "python")
+
+    assert result.generated == 40
+    assert limiter.shed_count == 0
+    assert "_Documentation generation failed" not in result.documentation
@@ -0,0 +1,129 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, text
+# Imported as the service modules import them so the request context variables are shared
+from core.history import HistoryQueryError, HistoryRecorder, HistoryStore, encode_cursor
+from core.request_context import request_tenant
+
+SCHEMA = [
+    """CREATE TABLE code_generations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, tenant_id VARCHAR(64), description TEXT NOT NULL,
+        language VARCHAR(50) NOT NULL, generated_code TEXT NOT NULL, confidence FLOAT DEFAULT 0.0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)""",
+    """CREATE TABLE code_reviews (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, tenant_id VARCHAR(64), source_code TEXT NOT NULL,
+        language VARCHAR(50) NOT NULL, quality_score FLOAT DEFAULT 0.0, issues_found INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"""
+]
+
+START = datetime(2024, 1, 1)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'history.db'}")
+    with engine.begin() as connection:
+        for statement in SCHEMA:
+            connection.execute(text(statement))
+        # Two rows share each timestamp so pages have to break ties on id
+        connection.execute(text(
+            "INSERT INTO code_generations (tenant_id, description, language, generated_code, created_at) "
+            "VALUES (:tenant, :description, :language, '', :created_at)"
+        ), [
+            {"tenant": "key:a", "description": f"parse csv file {i}" if i % 5 == 0 else f"sort list {i}",
+             "language": "go" if i % 3 == 0 else "python", "created_at": START + timedelta(minutes=i // 2)}
+            for i in range(25)
+        ] + [{"tenant": "key:b", "description": "parse csv", "language": "python", "created_at": START}])
+    return engine
+
+
+def test_keyset_pages_cover_every_row_once(engine):
+    store = HistoryStore(engine)
+    seen = []
+    cursor = None
+    while True:
+        page = store.page("generations", "key:a", cursor=cursor, limit=4)
+        seen.extend(item["id"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == list(range(25, 0, -1))
+    assert page["items"][-1]["created_at"] == "2024-01-01T00:00:00+00:00"
+
+
+def test_filters_and_search(engine):
+    store = HistoryStore(engine)
+
+    go = store.page("generations", "key:a", language="go", limit=100)["items"]
+    assert [item["id"] for item in go] == [25, 22, 19, 16, 13, 10, 7, 4, 1]
+
+    recent = store.page("generations", "key:a", since=START + timedelta(minutes=10), limit=100)["items"]
+    assert {item["id"] for item in recent} == {21, 22, 23, 24, 25}
+
+    matches = store.page("generations", "key:a", query="csv", limit=100)["items"]
+    assert [item["description"] for item in matches] == [f"parse csv file {i}" for i in (20, 15, 10, 5, 0)]
+
+    assert store.page("generations", "key:c")["items"] == []
+
+
+def test_invalid_queries(engine):
+    store = HistoryStore(engine)
+
+    with pytest.raises(HistoryQueryError):
+        store.page("generations", "key:a", cursor="not-a-cursor")
+    with pytest.raises(HistoryQueryError):
+        store.page("reviews", "key:a", query="csv")
+    with pytest.raises(HistoryQueryError):
+        store.page("deployments", "key:a")
+    assert store.page("generations", "key:a", cursor=encode_cursor(START, 1))["items"] == []
+
+
+@pytest.mark.asyncio
+async def test_recorder_writes_rows_for_the_request_tenant(engine):
+    recorder = HistoryRecorder(engine=engine, flush_interval=60)
+    recorder.record("reviews", source_code="x = 1", language="python", quality_score=9.0, issues_found=0)
+    token = request_tenant.set("key:a")
+    try:
+        recorder.record("reviews", source_code="x = 1", language="python", quality_score=9.0, issues_found=0)
+        recorder.record("reviews", source_code="eval(x)", language="python", quality_score=4.0, issues_found=2)
+    finally:
+        request_tenant.reset(token)
+    await recorder.flush()
+
+    items = HistoryStore(engine).page("reviews", "key:a")["items"]
+    assert [(item["source_code"], item["issues_found"]) for item in items] == [("eval(x)", 2), ("x = 1", 0)]
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT COUNT(*) FROM code_reviews")).scalar() == 2
+
+
+@pytest.mark.asyncio
+async def test_recorder_skips_anonymous_tenants(engine):
+    recorder = HistoryRecorder(engine=engine, flush_interval=60)
+    token = request_tenant.set("anonymous:10.0.0.1")
+    try:
+        recorder.record("reviews", source_code="x = 1", language="python", quality_score=9.0, issues_found=0)
+    finally:
+        request_tenant.reset(token)
+
+    assert recorder.pending == {}
+    await recorder.flush()
+    assert HistoryStore(engine).page("reviews", "anonymous:10.0.0.1")["items"] == []
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_is_retried(engine, tmp_path):
+    recorder = HistoryRecorder(engine=create_engine(f"sqlite:///{tmp_path / 'missing.db'}"), flush_interval=60, max_pending=2)
+    token = request_tenant.set("key:a")
+    try:
+        for code in ("x = 1", "x = 2", "x = 3"):
+            recorder.record("reviews", source_code=code, language="python", quality_score=9.0, issues_found=0)
+    finally:
+        request_tenant.reset(token)
+
+    await recorder.flush()
+    recorder._engine = engine
+    await recorder.flush()
+
+    assert [item["source_code"] for item in HistoryStore(engine).page("reviews", "key:a")["items"]] == ["x = 2", "x = 1"]
@@ -0,0 +1,125 @@
+import pytest
+from unittest.mock import AsyncMock, Mock
+from core.metrics import metrics  # the registry the service modules import
+from core.request_context import request_usage
+from backend.services.llm_providers import AnthropicProvider, LocalProvider, OpenAIProvider
+
+
+def _openai_client(cached_tokens):
+    response = Mock()
+    response.choices = [Mock()]
+    response.choices[0].message.content = "ok"
+    response.usage = Mock(prompt_tokens=1500, completion_tokens=20)
+    response.usage.prompt_tokens_details = Mock(cached_tokens=cached_tokens)
+    client = Mock()
+    client.chat.completions.create = AsyncMock(return_value=response)
+    return client
+
+
+def _anthropic_client():
+    response = Mock()
+    response.content = [Mock(text="ok")]
+    response.usage = Mock(input_tokens=40, output_tokens=20, cache_read_input_tokens=1400, cache_creation_input_tokens=0)
+    client = Mock()
+    client.messages.create = AsyncMock(return_value=response)
+    return client
+
+
+class _ChunkStream:
+    """Async iterator over canned chat completion chunks"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+def _openai_streaming_client(cached_tokens):
+    chunks = [Mock(choices=[Mock()], usage=None) for _ in range(2)]
+    chunks[0].choices[0].delta.content = "o"
+    chunks[1].choices[0].delta.content = "k"
+    # With include_usage the last chunk has no choices and the usage of the whole call
+    final = Mock(choices=[], usage=Mock(prompt_tokens=1500, completion_tokens=20))
+    final.usage.prompt_tokens_details = Mock(cached_tokens=cached_tokens)
+    client = Mock()
+    client.chat.completions.create = AsyncMock(return_value=_ChunkStream([*chunks, final]))
+    return client
+
+
+class TestStreamingUsage:
+
+    @pytest.mark.asyncio
+    async def test_streamed_call_is_charged_to_the_request(self):
+        client = _openai_streaming_client(cached_tokens=0)
+        provider = OpenAIProvider(client, model="stream-usage-test")
+        token = request_usage.set({"llm_tokens": 0})
+        try:
+            text = "".join([delta async for delta in provider.stream(system="s", prompt="p")])
+            usage = request_usage.get()
+        finally:
+            request_usage.reset(token)
+
+        assert text == "ok"
+        assert client.chat.completions.create.call_args[1]["extra_body"] == {"stream_options": {"include_usage": True}}
+        assert usage["llm_tokens"] == 1520
+
+
+class TestPromptCaching:
+
+    @pytest.mark.asyncio
+    async def test_openai_sends_prefix_first_and_reports_cached_tokens(self):
+        client = _openai_client(cached_tokens=1280)
+        provider = OpenAIProvider(client, model="cache-test-openai")
+        before = metrics.counter("llm_cached_prompt_tokens", {"provider": "openai"})
+
+        result = await provider.complete(system="s", prompt="variable", prefix="stable rules\n")
+
+        assert client.chat.completions.create.call_args[1]["messages"][1]["content"] == "stable rules\nvariable"
+        assert (result.prompt_tokens, result.cached_tokens) == (1500, 1280)
+        assert metrics.counter("llm_cached_prompt_tokens", {"provider": "openai"}) == before + 1280
+
+    @pytest.mark.asyncio
+    async def test_openai_stream_reports_cached_tokens(self):
+        provider = OpenAIProvider(_openai_streaming_client(cached_tokens=1024), model="cache-test-openai-stream")
+        before = metrics.counter("llm_cached_prompt_tokens", {"provider": "openai"})
+        prompt_before = metrics.counter("llm_prompt_tokens", {"provider": "openai"})
+
+        [delta async for delta in provider.stream(system="s", prompt="variable", prefix="stable rules\n")]
+
+        assert metrics.counter("llm_cached_prompt_tokens", {"provider": "openai"}) == before + 1024
+        assert metrics.counter("llm_prompt_tokens", {"provider": "openai"}) == prompt_before + 1500
+
+    @pytest.mark.asyncio
+    async def test_anthropic_breakpoint_after_prefix(self):
+        client = _anthropic_client()
+        provider = AnthropicProvider(client)
+
+        result = await provider.complete(system="s", prompt="variable", prefix="stable rules")
+
+        call_args = client.messages.create.call_args[1]
+        content = call_args["messages"][0]["content"]
+        assert [block["text"] for block in content] == ["stable rules", "variable"]
+        assert content[0]["cache_control"] == {"type": "ephemeral"}
+        assert "cache_control" not in content[1]
+        assert "cache_control" not in call_args["system"][0]
+        assert (result.prompt_tokens, result.cached_tokens) == (1440, 1400)
+
+    @pytest.mark.asyncio
+    async def test_anthropic_caches_system_without_prefix(self):
+        client = _anthropic_client()
+
+        await AnthropicProvider(client).complete(system="s", prompt="variable")
+
+        call_args = client.messages.create.call_args[1]
+        assert call_args["system"][0]["cache_control"] == {"type": "ephemeral"}
+        assert call_args["messages"][0]["content"] == [{"type": "text", "text": "variable"}]
+
+    @pytest.mark.asyncio
+    async def test_missing_usage_details_count_as_uncached(self):
+        provider = LocalProvider(name="cache-test-local", latency=0)
+
+        result = await provider.complete(system="s", prompt="two words", prefix="three more words")
+
+        assert (result.prompt_tokens, result.cached_tokens) == (5, 0)
@@ -0,0 +1,90 @@
+import pytest
+# Imported as the service modules import them so the metrics registry is shared
+from core.metrics import metrics
+from services.code_reviewer import StaticAnalyzer
+from services.llm_providers import LocalProvider
+from services.model_tiers import ComplexityProfile, ModelTierPolicy
+from services.test_generator import TestAnalyzer as StructureAnalyzer
+
+TIERS = [
+    {"name": "fast", "models": {"local": "local-small"}, "max_tokens": 1000,
+     "max_lines": 50, "max_functions": 3, "max_complex_functions": 0, "max_findings": 0,
+     "cost_per_1k_prompt": 1.0, "cost_per_1k_completion": 2.0},
+    {"name": "standard", "models": {"local": "local-large"}, "max_tokens": 4000}
+]
+
+BUDGETS = {
+    "unit_tests": {"base": 400, "per_function": 250},
+    "review": {"base": 300, "per_100_lines": 100},
+    "metered": {"base": 200}
+}
+
+SIMPLE = "def add(a, b):\n    return a + b\n"
+
+BRANCHY = "def route(x):\n" + "".join(f"    if x == {i}:\n        return {i}\n" for i in range(12)) + "    return None\n"
+
+
+@pytest.fixture
+def policy():
+    return ModelTierPolicy(tiers=TIERS, budgets=BUDGETS, enabled=True)
+
+
+def test_profiles_from_existing_analysis():
+    analysis = StructureAnalyzer().analyze_code_structure(SIMPLE + BRANCHY, "python")
+    profile = ComplexityProfile.from_analysis(analysis, SIMPLE + BRANCHY)
+    assert (profile.functions, profile.complex_functions) == (2, 1)
+
+    code = "password = 'hunter2'\n" + BRANCHY
+    review_profile = ComplexityProfile.from_static_issues(code, StaticAnalyzer().analyze_python_code(code))
+    assert (review_profile.functions, review_profile.complex_functions, review_profile.findings) == (1, 1, 1)
+
+
+def test_simple_inputs_get_the_fast_tier(policy):
+    simple = ComplexityProfile(lines=2, functions=1)
+
+    assert policy.select(simple).name == "fast"
+    assert policy.select(ComplexityProfile(lines=2, functions=1, complex_functions=1)).name == "standard"
+    assert policy.select(ComplexityProfile(lines=2, functions=1, findings=1)).name == "standard"
+    assert policy.select(ComplexityProfile(lines=400, functions=1)).name == "standard"
+    assert ModelTierPolicy(tiers=TIERS, budgets=BUDGETS, enabled=False).select(simple).name == "standard"
+
+
+def test_max_tokens_follows_expected_output(policy):
+    fast, standard = policy.tiers
+
+    assert policy.max_tokens("unit_tests", ComplexityProfile(lines=2, functions=1), fast) == 650
+    # Capped by the tier, never below the task's base
+    assert policy.max_tokens("unit_tests", ComplexityProfile(lines=2, functions=3), fast) == 1000
+    assert policy.max_tokens("unit_tests", ComplexityProfile(lines=900, functions=40), standard) == 4000
+    assert policy.max_tokens("review", ComplexityProfile(lines=1000, functions=0), standard) == 1300
+    assert policy.max_tokens("unknown", ComplexityProfile(lines=1, functions=0), fast) == 1000
+
+
+@pytest.mark.asyncio
+async def test_calls_use_the_tier_model_and_are_metered(policy):
+    provider = LocalProvider(latency=0)
+
+    result = await policy.complete(provider, "metered", ComplexityProfile(lines=2, functions=1),
+                                   system="s", prompt="one two three")
+    chunks = [chunk async for chunk in policy.stream(
+        LocalStreamingProvider(), "review", ComplexityProfile(lines=900, functions=30), system="", prompt="x" * 400
+    )]
+
+    assert result.model == "local-small"
+    labels = {"tier": "fast", "task": "metered"}
+    assert metrics.counter("llm_tier_calls", labels) == 1
+    assert metrics.counter("llm_tier_cost_usd", labels) == pytest.approx(
+        (result.prompt_tokens * 1.0 + result.completion_tokens * 2.0) / 1000
+    )
+    assert chunks == ["local-large", ":1200"]
+    assert metrics.counter("llm_tier_prompt_tokens", {"tier": "standard", "task": "review"}) >= 100
+    assert policy.snapshot()["standard"]["samples"] >= 1
+
+
+class LocalStreamingProvider:
+    """Echoes the model and budget it was asked for"""
+    name = "local"
+
+    async def stream(self, system, prompt, max_tokens=2000, model=None, **options):
+        yield model
+        yield f":{max_tokens}"
@@ -0,0 +1,122 @@
+import asyncio
+import time
+import pytest
+# Imported as the service modules import them so settings and context variables are shared
+from core.config import settings
+from core.profiling import ProfilingMiddleware, SamplingProfiler, is_admin
+
+
+def busy_scan(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        sum(range(200))
+
+
+def other_request_work(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        sum(range(200))
+
+
+async def _interleaved(work, rounds=20):
+    for _ in range(rounds):
+        work(0.005)
+        await asyncio.sleep(0)
+
+
+class ReviewEndpoint:
+    """ASGI app that burns CPU in its own task and in a child task"""
+
+    async def __call__(self, scope, receive, send):
+        await _interleaved(busy_scan)
+        await asyncio.create_task(_interleaved(busy_scan))
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def _call(middleware, headers=()):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": "/api/v1/review-code", "headers": list(headers)}
+    await middleware(scope, receive, send)
+    return dict(sent[0]["headers"])
+
+
+ADMIN = [(b"authorization", b"Bearer admin-key"), (b"x-profile", b"1")]
+
+
+@pytest.fixture
+def admin_key(monkeypatch):
+    monkeypatch.setattr(settings, "ADMIN_API_KEYS", ["admin-key"])
+    monkeypatch.setattr(settings, "PROFILING_SAMPLE_RATE", 0)
+
+
+@pytest.mark.asyncio
+async def test_admin_header_profiles_request_and_its_tasks(admin_key):
+    profiler = SamplingProfiler(interval=0.001)
+    middleware = ProfilingMiddleware(ReviewEndpoint(), profiler=profiler)
+
+    # An unprofiled request runs on the same loop at the same time
+    headers, _ = await asyncio.gather(_call(middleware, ADMIN), _interleaved(other_request_work, rounds=40))
+
+    trace = profiler.get(headers[b"x-profile-id"].decode())
+    assert trace is not None and not trace.active
+    folded = trace.collapsed()
+    assert "busy_scan (test_profiling.py:" in folded
+    assert "_interleaved" in folded
+    assert "other_request_work" not in folded
+    assert trace.samples == sum(int(line.rsplit(" ", 1)[1]) for line in folded.strip().split("\n"))
+
+
+@pytest.mark.asyncio
+async def test_speedscope_export(admin_key):
+    profiler = SamplingProfiler(interval=0.001)
+    headers = await _call(ProfilingMiddleware(ReviewEndpoint(), profiler=profiler), ADMIN)
+
+    document = profiler.get(headers[b"x-profile-id"].decode()).speedscope()
+
+    profile = document["profiles"][0]
+    assert profile["type"] == "sampled"
+    assert len(profile["samples"]) == len(profile["weights"])
+    names = {document["shared"]["frames"][i]["name"] for sample in profile["samples"] for i in sample}
+    assert "busy_scan" in names
+
+
+@pytest.mark.asyncio
+async def test_unprofiled_without_admin_key(admin_key):
+    profiler = SamplingProfiler(interval=0.001)
+    middleware = ProfilingMiddleware(ReviewEndpoint(), profiler=profiler)
+
+    headers = await _call(middleware, [(b"authorization", b"Bearer someone-else"), (b"x-profile", b"1")])
+
+    assert b"x-profile-id" not in headers
+    assert len(profiler.traces) == 0
+
+
+@pytest.mark.asyncio
+async def test_sampling_and_overhead_limits(monkeypatch):
+    monkeypatch.setattr(settings, "PROFILING_SAMPLE_RATE", 1)
+    profiler = SamplingProfiler(interval=0.001, max_samples=5, max_active=1, buffer_size=2)
+    middleware = ProfilingMiddleware(ReviewEndpoint(), profiler=profiler)
+
+    results = await asyncio.gather(*(_call(middleware) for _ in range(2)))
+    for _ in range(2):
+        await _call(middleware)
+
+    # One concurrent trace at most, samples capped, and only the newest traces kept
+    assert sum(b"x-profile-id" in headers for headers in results) == 1
+    assert len(profiler.traces) == 2
+    assert all(trace.samples <= 5 and trace.truncated for trace in profiler.traces)
+    assert all(trace.trigger == "sampled" for trace in profiler.traces)
+
+
+def test_is_admin(admin_key):
+    assert is_admin("Bearer admin-key")
+    assert not is_admin("Bearer admin")
+    assert not is_admin("")
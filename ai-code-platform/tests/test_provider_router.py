@@ -0,0 +1,113 @@
+import time
+import pytest
+from backend.services.llm_providers import LocalProvider
+from backend.services.provider_router import ProviderRouter, ProviderUnavailableError
+
+
+def _router(*providers, **kwargs):
+    options = {"min_samples": 3, "max_error_rate": 0.5, "unhealthy_cooldown": 60, "default_hedge_delay": 0.05}
+    options.update(kwargs)
+    return ProviderRouter(list(providers), **options)
+
+
+class TestProviderRouter:
+
+    @pytest.mark.asyncio
+    async def test_preferred_provider_used_until_measured(self):
+        """Without latency samples the preferred provider goes first"""
+        fast = LocalProvider(name="fast", latency=0.001)
+        slow = LocalProvider(name="slow", latency=0.001)
+        router = _router(fast, slow)
+
+        result = await router.complete("system", "prompt", preferred="slow")
+
+        assert result.provider == "slow"
+
+    @pytest.mark.asyncio
+    async def test_routes_to_fastest_measured_provider(self):
+        """Once both providers have samples the lower p50 wins"""
+        fast = LocalProvider(name="fast", latency=0.001)
+        slow = LocalProvider(name="slow", latency=0.03)
+        router = _router(fast, slow)
+
+        for provider in (fast, slow):
+            for _ in range(3):
+                await router._call(provider, {"system": "s", "prompt": "p", "temperature": 0.2, "max_tokens": 10})
+
+        assert [p.name for p in router.rank(preferred="slow")] == ["fast", "slow"]
+
+    @pytest.mark.asyncio
+    async def test_failover_on_error(self):
+        """A failing provider falls back to the next candidate"""
+        broken = LocalProvider(name="broken", failure_rate=1.0)
+        healthy = LocalProvider(name="healthy")
+        router = _router(broken, healthy)
+
+        result = await router.complete("system", "prompt", preferred="broken")
+
+        assert result.provider == "healthy"
+        assert router.snapshot()["broken:local-stand-in"]["error_rate"] == 1.0
+
+    @pytest.mark.asyncio
+    async def test_unhealthy_provider_ranked_last(self):
+        """Providers above the error-rate threshold are demoted"""
+        broken = LocalProvider(name="broken", failure_rate=1.0)
+        healthy = LocalProvider(name="healthy")
+        router = _router(broken, healthy)
+        await router.complete("system", "prompt", preferred="broken")
+
+        assert [p.name for p in router.rank(preferred="broken")] == ["healthy", "broken"]
+
+    @pytest.mark.asyncio
+    async def test_all_providers_failing_raises(self):
+        router = _router(LocalProvider(name="a", failure_rate=1.0), LocalProvider(name="b", failure_rate=1.0))
+
+        with pytest.raises(ProviderUnavailableError) as exc_info:
+            await router.complete("system", "prompt")
+
+        assert len(exc_info.value.errors) == 2
+
+    @pytest.mark.asyncio
+    async def test_hedge_cuts_tail_latency(self):
+        """A stalled primary is hedged and the loser is cancelled"""
+        stalled = LocalProvider(name="stalled", latency=5.0)
+        backup = LocalProvider(name="backup", latency=0.01)
+        router = _router(stalled, backup, default_hedge_delay=0.02)
+
+        started = time.monotonic()
+        result = await router.complete("system", "prompt", preferred="stalled", hedge=True)
+        elapsed = time.monotonic() - started
+
+        assert result.provider == "backup"
+        assert elapsed < 1.0
+        assert router.stats[backup.key].hedges_won == 1
+        # The cancelled request is not recorded as a failure
+        assert router.stats[stalled.key].error_rate == 0.0
+
+    @pytest.mark.asyncio
+    async def test_hedge_loser_latency_is_sampled(self):
+        """A provider that keeps losing hedges is measured at least as slow as the hedge took"""
+        stalled = LocalProvider(name="stalled", latency=5.0)
+        backup = LocalProvider(name="backup", latency=0.02)
+        router = _router(stalled, backup, default_hedge_delay=0.02)
+
+        for _ in range(3):
+            await router.complete("system", "prompt", preferred="stalled", hedge=True)
+
+        stats = router.stats[stalled.key]
+        assert stats.samples == 3
+        assert stats.percentile(0.5) >= 0.04
+        assert stats.error_rate == 0.0
+        # Censored samples count as measurements, so the slow provider is now ranked behind the backup
+        assert [p.name for p in router.rank(preferred="stalled")] == ["backup", "stalled"]
+
+    @pytest.mark.asyncio
+    async def test_no_hedge_when_primary_is_fast(self):
+        primary = LocalProvider(name="primary", latency=0.001)
+        backup = LocalProvider(name="backup", latency=0.001)
+        router = _router(primary, backup, default_hedge_delay=0.5)
+
+        result = await router.complete("system", "prompt", preferred="primary", hedge=True)
+
+        assert result.provider == "primary"
+        assert backup.calls == 0
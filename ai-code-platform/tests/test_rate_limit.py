@@ -0,0 +1,141 @@
+import asyncio
+import json
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+# Imported as the service modules import them so context variables and metrics are shared
+from core.metrics import metrics
+from core.rate_limit import BucketConfig, QuotaRecorder, RateLimiter, RateLimitMiddleware, tenant_from_headers
+from services.llm_providers import LocalProvider
+
+
+class LLMEndpoint:
+    """ASGI app that makes one LLM call per request"""
+
+    def __init__(self):
+        self.provider = LocalProvider(name="rate-limit-local", latency=0, responder=lambda prompt: "one two three")
+
+    async def __call__(self, scope, receive, send):
+        await self.provider.complete(system="s", prompt="a b c d e")
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def _call(middleware, api_key=None, path="/api/v1/generate-code"):
+    sent = []
+    headers = [(b"authorization", f"Bearer {api_key}".encode())] if api_key else []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await middleware({"type": "http", "path": path, "headers": headers, "client": ("10.0.0.1", 1234)}, receive, send)
+    return sent[0]["status"], dict(sent[0]["headers"]), sent[1]["body"]
+
+
+def _limiter(requests=2, llm_tokens=1000, **kwargs):
+    return RateLimiter(
+        requests=BucketConfig(requests, 0.001),
+        llm_tokens=BucketConfig(llm_tokens, 0.001),
+        **kwargs
+    )
+
+
+class FailingStore:
+    async def take(self, keys, args):
+        raise RedisConnectionError("connection refused")
+
+
+class TestRateLimitMiddleware:
+
+    @pytest.mark.asyncio
+    async def test_request_bucket_per_api_key(self):
+        middleware = RateLimitMiddleware(LLMEndpoint(), limiter=_limiter(requests=2), exempt_paths=[])
+
+        statuses = [(await _call(middleware, "ci-key"))[0] for _ in range(3)]
+        other_status, _, _ = await _call(middleware, "ide-key")
+        status, headers, body = await _call(middleware, "ci-key")
+
+        assert statuses == [200, 200, 429]
+        assert other_status == 200
+        assert status == 429
+        assert int(headers[b"retry-after"]) >= 1
+        assert "requests" in json.loads(body)["detail"]
+
+    @pytest.mark.asyncio
+    async def test_llm_tokens_used_are_charged(self):
+        limiter = _limiter(requests=100, llm_tokens=10)
+        middleware = RateLimitMiddleware(LLMEndpoint(), limiter=limiter, exempt_paths=[])
+
+        # The first call uses 8 tokens, the second pushes the bucket into debt
+        first, headers, _ = await _call(middleware, "key")
+        second, _, _ = await _call(middleware, "key")
+        third, _, body = await _call(middleware, "key")
+
+        assert (first, second, third) == (200, 200, 429)
+        assert headers[b"x-ratelimit-limit"] == b"100"
+        assert "llm_tokens" in json.loads(body)["detail"]
+
+    @pytest.mark.asyncio
+    async def test_exempt_paths_skip_limits(self):
+        middleware = RateLimitMiddleware(LLMEndpoint(), limiter=_limiter(requests=1), exempt_paths=["/api/v1/health"])
+
+        statuses = [(await _call(middleware, "key", path="/api/v1/health"))[0] for _ in range(3)]
+
+        assert statuses == [200, 200, 200]
+
+    @pytest.mark.asyncio
+    async def test_redis_failure_falls_back_to_local_buckets(self):
+        before = metrics.counter("rate_limit_store_errors")
+        middleware = RateLimitMiddleware(LLMEndpoint(), limiter=_limiter(requests=1, store=FailingStore()), exempt_paths=[])
+
+        statuses = [(await _call(middleware, "key"))[0] for _ in range(2)]
+
+        assert statuses == [200, 429]
+        assert metrics.counter("rate_limit_store_errors") > before
+
+
+def test_tenant_is_hashed_api_key():
+    tenant = tenant_from_headers({"authorization": "Bearer secret-key"}, "10.0.0.1")
+
+    assert tenant.startswith("key:") and "secret-key" not in tenant
+    assert tenant_from_headers({}, "10.0.0.1") == "anonymous:10.0.0.1"
+
+
+class TestQuotaRecorder:
+
+    @pytest.mark.asyncio
+    async def test_usage_written_in_one_batch(self):
+        batches = []
+        recorder = QuotaRecorder(writer=batches.append, flush_interval=0.01)
+        limiter = _limiter(requests=100, recorder=recorder)
+        middleware = RateLimitMiddleware(LLMEndpoint(), limiter=limiter, exempt_paths=[])
+
+        for key in ("a", "a", "b"):
+            await _call(middleware, key)
+        await asyncio.sleep(0.05)
+
+        assert len(batches) == 1
+        usage = sorted((row["requests"], row["llm_tokens"]) for row in batches[0])
+        assert usage == [(1, 8), (2, 16)]
+
+    @pytest.mark.asyncio
+    async def test_failed_flush_is_retried(self):
+        batches = []
+
+        def flaky_writer(rows):
+            if not batches:
+                batches.append(None)
+                raise ConnectionError("database unavailable")
+            batches.append(rows)
+
+        recorder = QuotaRecorder(writer=flaky_writer, flush_interval=60)
+        recorder.record("tenant", requests=1, llm_tokens=5)
+
+        await recorder.flush()
+        await recorder.flush()
+
+        assert batches[1][0]["requests"] == 1
+        assert batches[1][0]["llm_tokens"] == 5
+        assert recorder.pending == {}
@@ -0,0 +1,188 @@
+import fcntl
+import json
+import multiprocessing
+import os
+import time
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+from core.config import settings
+from core.metrics import metrics  # the registry the service modules import
+from backend.services.code_reviewer import CodeReviewerService
+from backend.services.result_cache import ResultCache, SharedMemoryCache
+
+
+class FakeRedis:
+    """Dict-backed stand-in for the redis.asyncio client"""
+
+    def __init__(self, fail=False):
+        self.data = {}
+        self.fail = fail
+
+    async def get(self, key):
+        if self.fail:
+            raise RedisConnectionError("connection refused")
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        if self.fail:
+            raise RedisConnectionError("connection refused")
+        self.data[key] = value
+
+
+def _write_from_child(path, key, value):
+    SharedMemoryCache(path, sets=16, ways=2, slot_size=256).set(key, value)
+
+
+def _hold_lock(path, locked, release):
+    fd = os.open(path, os.O_RDWR)
+    fcntl.lockf(fd, fcntl.LOCK_EX)
+    locked.set()
+    release.wait(10)
+
+
+class TestSharedMemoryCache:
+
+    def test_round_trip_and_overwrite(self, tmp_path):
+        cache = SharedMemoryCache(str(tmp_path / "cache"), sets=16, ways=2, slot_size=256)
+
+        cache.set("a", b"first")
+        cache.set("a", b"second")
+
+        assert cache.get("a") == b"second"
+        assert cache.get("missing") is None
+        assert cache.stats()["entries"] == 1
+
+    def test_entries_visible_across_processes(self, tmp_path):
+        path = str(tmp_path / "cache")
+        cache = SharedMemoryCache(path, sets=16, ways=2, slot_size=256)
+
+        process = multiprocessing.get_context("fork").Process(target=_write_from_child, args=(path, "shared", b"from child"))
+        process.start()
+        process.join(10)
+
+        assert process.exitcode == 0
+        assert cache.get("shared") == b"from child"
+
+    def test_clock_keeps_recently_read_entries(self, tmp_path):
+        cache = SharedMemoryCache(str(tmp_path / "cache"), sets=1, ways=2, slot_size=256)
+        cache.set("a", b"1")
+        cache.set("b", b"2")
+        cache.set("c", b"3")  # evicts a, the first unreferenced entry under the hand
+        cache.get("b")
+
+        cache.set("d", b"4")
+
+        assert cache.get("a") is None
+        assert cache.get("b") == b"2"
+        assert cache.get("c") is None
+        assert cache.get("d") == b"4"
+
+    def test_oversized_and_expired_values(self, tmp_path):
+        cache = SharedMemoryCache(str(tmp_path / "cache"), sets=16, ways=2, slot_size=64)
+
+        assert cache.set("big", b"x" * 64) is False
+        cache.set("old", b"v", ttl=-1)
+
+        assert cache.get("big") is None
+        assert cache.get("old") is None
+
+    def test_busy_sets_do_not_block(self, tmp_path):
+        path = str(tmp_path / "cache")
+        cache = SharedMemoryCache(path, sets=16, ways=2, slot_size=256)
+        cache.set("a", b"1")
+        context = multiprocessing.get_context("fork")
+        locked, release = context.Event(), context.Event()
+        process = context.Process(target=_hold_lock, args=(cache.path, locked, release))
+        process.start()
+        before = metrics.counter("result_cache_lock_busy")
+        try:
+            assert locked.wait(10)
+            started = time.monotonic()
+
+            assert cache.get("a") is None
+            assert cache.set("b", b"2") is False
+            assert time.monotonic() - started < 1
+        finally:
+            release.set()
+            process.join(10)
+
+        assert metrics.counter("result_cache_lock_busy") == before + 2
+        assert cache.get("a") == b"1"
+
+    def test_oversized_values_are_counted(self, tmp_path):
+        cache = SharedMemoryCache(str(tmp_path / "cache"), sets=16, ways=2, slot_size=64)
+        before = metrics.counter("result_cache_oversized")
+
+        cache.set("big", b"x" * 64)
+
+        assert metrics.counter("result_cache_oversized") == before + 1
+
+    def test_geometry_change_uses_a_new_table(self, tmp_path):
+        path = str(tmp_path / "cache")
+        running = SharedMemoryCache(path, sets=16, ways=2, slot_size=256)
+        running.set("a", b"1")
+
+        resized = SharedMemoryCache(path, sets=32, ways=2, slot_size=256)
+
+        assert resized.get("a") is None
+        # The running worker's mapping is neither shrunk nor cleared under it
+        assert running.get("a") == b"1"
+        assert [p.name for p in tmp_path.iterdir()] == [os.path.basename(resized.path)]
+
+
+class TestResultCache:
+
+    def test_keys_change_with_result_version(self, monkeypatch):
+        key = ResultCache.key("review", "code", "python")
+        monkeypatch.setattr(settings, "RESULT_VERSION", "2")
+
+        assert ResultCache.key("review", "code", "python") != key
+
+    @pytest.mark.asyncio
+    async def test_redis_hit_populates_shared_memory(self, tmp_path):
+        redis = FakeRedis()
+        local = SharedMemoryCache(str(tmp_path / "cache"), sets=16, ways=2, slot_size=512)
+        key = ResultCache.key("review", "code", "python")
+        redis.data[key] = json.dumps({"score": 9}).encode()
+        cache = ResultCache(local, redis, ttl=60)
+
+        assert await cache.get(key) == {"score": 9}
+        redis.data.clear()
+        assert await cache.get(key) == {"score": 9}
+        assert metrics.counter("result_cache_hits", {"namespace": "review", "tier": "shared_memory"}) >= 1
+
+    @pytest.mark.asyncio
+    async def test_redis_errors_are_misses(self, tmp_path):
+        cache = ResultCache(SharedMemoryCache(str(tmp_path / "cache"), sets=16, ways=2, slot_size=512), FakeRedis(fail=True), ttl=60)
+        before = metrics.counter("result_cache_errors", {"tier": "redis"})
+
+        assert await cache.get(ResultCache.key("review", "x")) is None
+        await cache.set(ResultCache.key("review", "x"), {"ok": True})
+
+        assert await cache.get(ResultCache.key("review", "x")) == {"ok": True}
+        assert metrics.counter("result_cache_errors", {"tier": "redis"}) == before + 2
+
+
+class CountingStreamProvider:
+    key = "openai:test"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def stream(self, system, prompt, temperature=0.2, max_tokens=2000, **options):
+        self.calls += 1
+        yield json.dumps({"issues": [], "suggestions": ["Add tests"]})
+
+
+@pytest.mark.asyncio
+async def test_review_stream_served_from_cache(tmp_path):
+    cache = ResultCache(SharedMemoryCache(str(tmp_path / "cache"), sets=16, ways=2, slot_size=4096), ttl=60)
+    reviewer = CodeReviewerService(result_cache=cache)
+    reviewer.provider = CountingStreamProvider()
+
+    first = [event async for event in reviewer.stream_review("x = eval(input())\n", "python")]
+    second = [event async for event in reviewer.stream_review("x = eval(input())\n", "python")]
+
+    assert reviewer.provider.calls == 1
+    assert second == first
+    assert first[-1]["suggestions"] == ["Add tests"]
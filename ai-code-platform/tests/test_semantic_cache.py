@@ -0,0 +1,93 @@
+import pytest
+from unittest.mock import Mock, patch, AsyncMock
+from backend.services.code_generator import CodeGeneratorService
+from backend.services.semantic_cache import SemanticCache
+
+
+class TestSemanticCache:
+
+    @pytest.mark.asyncio
+    async def test_near_duplicate_hits(self):
+        cache = SemanticCache(threshold=0.9, max_entries=10, path="")
+        await cache.store("sort a list", "python", {"code": "sorted(items)"})
+
+        lookup = await cache.lookup("function to sort list", "python")
+
+        assert lookup.payload == {"code": "sorted(items)"}
+        assert cache.stats()["hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_unrelated_or_other_language_misses(self):
+        cache = SemanticCache(threshold=0.9, max_entries=10, path="")
+        await cache.store("sort a list", "python", {"code": "sorted(items)"})
+
+        assert (await cache.lookup("reverse a string", "python")).payload is None
+        assert (await cache.lookup("sort a list", "go")).payload is None
+        assert cache.stats()["hit_rate"] == 0.0
+
+    @pytest.mark.asyncio
+    async def test_requests_for_a_different_output_miss(self):
+        cache = SemanticCache(threshold=0.9, max_entries=10, path="")
+        await cache.store("implement a function that parses csv files into dictionaries", "python", {"code": "parse"})
+
+        tests = await cache.lookup("write tests for a function that parses csv files into dictionaries", "python")
+
+        assert tests.payload is None
+        assert tests.score == 0.0
+        assert (await cache.lookup("implement function that parses csv files into dictionaries", "python")).payload == {"code": "parse"}
+
+    @pytest.mark.asyncio
+    async def test_swapped_arguments_and_other_verbs_miss(self):
+        cache = SemanticCache(threshold=0.9, max_entries=10, path="")
+        await cache.store("convert celsius to fahrenheit", "python", {"code": "c * 9 / 5 + 32"})
+        await cache.store("write a file", "python", {"code": "open(path, 'w')"})
+
+        assert (await cache.lookup("convert fahrenheit to celsius", "python")).payload is None
+        assert (await cache.lookup("create a file", "python")).payload is None
+        assert (await cache.lookup("converting celsius to fahrenheit", "python")).payload == {"code": "c * 9 / 5 + 32"}
+
+    @pytest.mark.asyncio
+    async def test_lru_eviction(self):
+        cache = SemanticCache(threshold=0.9, max_entries=2, path="")
+        await cache.store("sort a list", "python", {"id": 1})
+        await cache.store("reverse a string", "python", {"id": 2})
+        await cache.lookup("sort a list", "python")
+        await cache.store("parse a csv file", "python", {"id": 3})
+
+        assert cache.stats()["evictions"] == 1
+        assert (await cache.lookup("reverse a string", "python")).payload is None
+        assert (await cache.lookup("sort a list", "python")).payload == {"id": 1}
+
+    @pytest.mark.asyncio
+    async def test_persistence_round_trip(self, tmp_path):
+        path = str(tmp_path / "cache")
+        cache = SemanticCache(threshold=0.9, max_entries=10, path=path, save_interval=1)
+        await cache.store("sort a list", "python", {"code": "sorted(items)"})
+
+        restored = SemanticCache(threshold=0.9, max_entries=10, path=path)
+
+        assert (await restored.lookup("sort list", "python")).payload == {"code": "sorted(items)"}
+
+
+@pytest.mark.asyncio
+async def test_generator_serves_cached_result():
+    """A near-duplicate description does not reach the provider"""
+    with patch('backend.services.code_generator.settings') as mock_settings:
+        mock_settings.OPENAI_API_KEY = "test-key"
+        mock_settings.ANTHROPIC_API_KEY = "test-key"
+        mock_settings.SEMANTIC_CACHE_ENABLED = True
+        mock_settings.SEMANTIC_CACHE_EMBEDDER = "hashing"
+        service = CodeGeneratorService()
+
+    mock_response = Mock()
+    mock_response.choices = [Mock()]
+    mock_response.choices[0].message.content = "```python\ndef sort_list(items):\n    return sorted(items)\n```\nSorts items."
+
+    with patch.object(service.openai_client.chat.completions, 'create', new_callable=AsyncMock) as mock_create:
+        mock_create.return_value = mock_response
+
+        first = await service.generate_code(description="sort a list", language="python")
+        second = await service.generate_code(description="function to sort list", language="python")
+
+        assert mock_create.call_count == 1
+        assert second == first
@@ -0,0 +1,47 @@
+from backend.services.source import SourceDocument
+
+CODE = "import os\n\ndef café():\n    return 'naïve'\n"
+
+
+def test_lines_built_once_and_shared():
+    doc = SourceDocument(CODE)
+
+    assert doc.lines is doc.lines
+    assert doc.line_count == 5
+    assert doc.line(3) == "def café():"
+    assert doc.line(0) == "" and doc.line(6) == ""
+
+
+def test_offset_to_line_mapping():
+    doc = SourceDocument(CODE)
+
+    assert doc.line_of_offset(0) == 1
+    assert doc.line_of_offset(CODE.index("def")) == 3
+    assert doc.line_of_offset(CODE.index("return")) == 4
+    assert doc.offset_of_line(4) == CODE.index("    return")
+
+
+def test_byte_offsets_account_for_utf8():
+    doc = SourceDocument(CODE)
+    data = CODE.encode("utf8")
+
+    assert doc.data == data
+    assert doc.line_of_byte(data.index(b"return")) == 4
+    assert doc.line_view(4).tobytes() == "    return 'naïve'".encode("utf8")
+    assert doc.line_view(5).tobytes() == b""
+
+
+def test_line_view_shares_the_buffer():
+    doc = SourceDocument(CODE)
+
+    view = doc.line_view(3)
+
+    assert view.obj is doc.data
+
+
+def test_of_reuses_documents():
+    doc = SourceDocument(CODE)
+
+    assert SourceDocument.of(doc) is doc
+    assert SourceDocument.of(CODE).text == CODE
+    assert SourceDocument.of("").is_blank()
@@ -0,0 +1,103 @@
+import os
+
+import pytest
+from unittest.mock import AsyncMock, patch
+from backend.services.llm_providers import CompletionResult
+from backend.services.test_generator import TestGeneratorService as GeneratorService
+from backend.services.test_runner import SandboxPool
+
+CODE = "def sign(x):\n    if x > 0:\n        return 1\n    elif x < 0:\n        return -1\n    return 0\n"
+
+TESTS = (
+    "from module_under_test import sign\n\n"
+    "def test_positive():\n    assert sign(5) == 1\n\n"
+    "def test_wrong():\n    assert sign(-5) == 1\n"
+)
+
+# Set before the sandbox forkserver starts, so the workers inherit it unless they drop it
+os.environ["SANDBOX_TEST_SECRET"] = "hunter2"
+
+LOCKDOWN_TESTS = (
+    "import os, socket\n"
+    "import pytest\n"
+    "import module_under_test\n\n"
+    "def test_secrets_are_not_visible():\n"
+    "    assert 'SANDBOX_TEST_SECRET' not in os.environ\n"
+    "    if os.geteuid() != 0:\n"
+    "        with pytest.raises(OSError):\n"
+    "            open('/proc/self/environ', 'rb')\n\n"
+    "def test_runs_in_its_own_directory():\n"
+    "    assert os.getcwd() == os.path.dirname(module_under_test.__file__)\n\n"
+    "def test_network_is_blocked():\n"
+    "    with pytest.raises(OSError):\n"
+    "        socket.create_connection(('127.0.0.1', 80), timeout=1)\n"
+)
+
+
+@pytest.fixture(scope="module")
+def pool():
+    # Runs as the current user: the interpreter need not be readable by the sandbox user
+    pool = SandboxPool(workers=2, cpu_seconds=2, timeout=3, user="")
+    yield pool
+    pool.shutdown()
+
+
+class TestSandboxPool:
+
+    @pytest.mark.asyncio
+    async def test_reports_outcomes_and_coverage(self, pool):
+        result = await pool.run(CODE, TESTS)
+
+        assert (result.passed, result.failed, result.errors) == (1, 1, 0)
+        assert result.missing_lines == [6]
+        assert result.line_coverage == pytest.approx(5 / 6)
+        assert result.branch_coverage < 1.0
+
+    @pytest.mark.asyncio
+    async def test_runs_are_isolated(self, pool):
+        """A worker reused for a new run sees the new module, not a cached import"""
+        await pool.run(CODE, TESTS)
+
+        result = await pool.run("def sign(x):\n    return 1\n", TESTS)
+
+        assert result.passed == 2
+
+    @pytest.mark.asyncio
+    async def test_workers_are_locked_down(self, pool):
+        result = await pool.run(CODE, LOCKDOWN_TESTS)
+
+        assert (result.passed, result.failed, result.errors) == (3, 0, 0), result.output
+
+    @pytest.mark.asyncio
+    async def test_time_limit(self, pool):
+        result = await pool.run(CODE, "import time\n\ndef test_hangs():\n    time.sleep(60)\n")
+
+        assert result.timed_out
+        assert result.duration < 10
+
+    @pytest.mark.asyncio
+    async def test_crashed_worker_is_replaced(self, pool):
+        result = await pool.run(CODE, "import os\n\ndef test_exits():\n    os._exit(1)\n")
+
+        assert result.error is not None
+        assert (await pool.run(CODE, TESTS)).passed == 1
+
+
+@pytest.mark.asyncio
+async def test_generate_tests_reports_measured_coverage(pool):
+    with patch('backend.services.test_generator.settings') as mock_settings:
+        mock_settings.OPENAI_API_KEY = "test-key"
+        service = GeneratorService()
+
+    response = CompletionResult(text=f"Here are the tests:\n```python\n{TESTS}```\n", provider="openai", model="gpt-4")
+
+    with patch.object(service.provider, 'complete', new_callable=AsyncMock) as mock_complete, \
+         patch('backend.services.test_generator.get_sandbox_pool', return_value=pool):
+        mock_complete.return_value = response
+
+        result = await service.generate_tests(CODE, "python")
+
+    assert "module_under_test" in mock_complete.call_args[1]["prefix"]
+    assert result.estimated_coverage == pytest.approx(5 / 6)
+    assert result.coverage_analysis["measured"] is True
+    assert result.coverage_analysis["tests_failed"] == 1
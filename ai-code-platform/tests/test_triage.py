@@ -0,0 +1,86 @@
+import json
+
+import pytest
+# Imported as the service modules import them so settings and metrics are shared
+from services.code_reviewer import CodeReviewerService
+from services.result_cache import ResultCache, SharedMemoryCache
+from services.triage import normalize_code
+
+CODE = "def total(values):\n    result = 0\n    for value in values:\n        result += value\n    return result\n" + "".join(
+    f"CONSTANT_{i} = {i}\n" for i in range(20)
+)
+
+
+class CountingProvider:
+    """Reports one issue on the line that accumulates, or fails when told to"""
+
+    key = "counting"
+
+    def __init__(self, fail=False):
+        self.calls = 0
+        self.fail = fail
+
+    async def stream(self, system, prompt, temperature=0.2, max_tokens=2000, **options):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("connection reset")
+        yield json.dumps({
+            "issues": [{"line_number": 4, "severity": "medium", "category": "performance", "title": "Use sum()",
+                        "description": "d", "suggestion": "s", "code_snippet": ""}],
+            "suggestions": ["Use builtins"]
+        })
+
+
+@pytest.fixture
+def reviewer(tmp_path):
+    reviewer = CodeReviewerService(result_cache=ResultCache(SharedMemoryCache(str(tmp_path / "cache"))))
+    reviewer.provider = CountingProvider()
+    return reviewer
+
+
+def test_normalization_ignores_comments_and_formatting():
+    assert normalize_code("x = (1 +  2)  # sum\n", "python") == normalize_code("\nx = 1 + 2\n", "python")
+    assert normalize_code("int a = 1; // one\n/* b */", "cpp") == normalize_code("int a=1;", "cpp")
+    assert normalize_code('s = "// kept";', "javascript") != normalize_code("s = ;", "javascript")
+    assert normalize_code("x = 1\n", "python") != normalize_code("x = 2\n", "python")
+
+
+@pytest.mark.asyncio
+async def test_trivially_clean_code_skips_the_llm(reviewer):
+    result = await reviewer.review_code("def add(a, b):\n    return a + b\n", "python")
+
+    assert reviewer.provider.calls == 0
+    assert [issue.title for issue in result.issues] == ["Missing Docstring"]
+    # Findings above the clean severity still get an AI review
+    await reviewer.review_code("x = eval(input())\n", "python")
+    assert reviewer.provider.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_unchanged_code_reuses_findings_on_new_lines(reviewer):
+    first = await reviewer.review_code(CODE, "python")
+    assert [issue.line_number for issue in first.issues if issue.title == "Use sum()"] == [4]
+
+    reformatted = "# Totals\n\n" + CODE.replace("result += value", "result += value  # accumulate")
+    result = await reviewer.review_code(reformatted, "python")
+    events = [event async for event in reviewer.stream_review(reformatted + "\n", "python")]
+
+    assert reviewer.provider.calls == 1
+    assert [issue.line_number for issue in result.issues if issue.title == "Use sum()"] == [6]
+    assert "Use builtins" in result.suggestions
+    assert [event["issue"]["line_number"] for event in events if event["event"] == "issue"] == [6]
+
+    await reviewer.review_code(CODE.replace("result = 0", "result = 1"), "python")
+    assert reviewer.provider.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_reviews_are_not_remembered(reviewer):
+    reviewer.provider.fail = True
+    failed = await reviewer.review_code(CODE, "python")
+    reviewer.provider.fail = False
+    result = await reviewer.review_code(CODE, "python")
+
+    assert failed.suggestions[0].startswith("AI review failed")
+    assert reviewer.provider.calls == 2
+    assert "Use builtins" in result.suggestions
@@ -0,0 +1,109 @@
+import pytest
+from sqlalchemy import create_engine, text
+# Imported as the service modules import them so the request context variables are shared
+from core.request_context import annotate_request
+from core.usage_stats import UsageRecorder, UsageStatsMiddleware, UsageStatsReader, latency_percentile
+
+SCHEMA = [
+    """CREATE TABLE usage_rollup_hourly (
+        hour TIMESTAMP NOT NULL, endpoint VARCHAR(64) NOT NULL, language VARCHAR(50) NOT NULL,
+        requests BIGINT NOT NULL DEFAULT 0, cache_hits BIGINT NOT NULL DEFAULT 0,
+        quality_sum DOUBLE PRECISION NOT NULL DEFAULT 0, quality_count BIGINT NOT NULL DEFAULT 0,
+        latency_sum_ms DOUBLE PRECISION NOT NULL DEFAULT 0,
+        PRIMARY KEY (hour, endpoint, language))""",
+    """CREATE TABLE usage_latency_hourly (
+        hour TIMESTAMP NOT NULL, endpoint VARCHAR(64) NOT NULL, language VARCHAR(50) NOT NULL,
+        bucket SMALLINT NOT NULL, requests BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (hour, endpoint, language, bucket))"""
+]
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'stats.db'}")
+    with engine.begin() as connection:
+        for statement in SCHEMA:
+            connection.execute(text(statement))
+    return engine
+
+
+class ReviewEndpoint:
+    """ASGI app that reports a python review with a fixed score"""
+
+    def __init__(self, status=200, cached=False):
+        self.status = status
+        self.cached = cached
+
+    async def __call__(self, scope, receive, send):
+        annotate_request(language="python", quality_score=8.0, cached=self.cached)
+        await send({"type": "http.response.start", "status": self.status, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def _call(middleware, path="/api/v1/review-code"):
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await middleware({"type": "http", "path": path, "headers": []}, receive, send)
+
+
+def test_latency_percentiles_interpolate_within_buckets():
+    counts = [0] * 12
+    counts[2] = 10  # 50-100 ms
+
+    assert latency_percentile(counts, 0.5) == 75.0
+    assert latency_percentile([0] * 12, 0.5) is None
+    assert latency_percentile([0] * 11 + [3], 0.99) == 60000.0
+
+
+@pytest.mark.asyncio
+async def test_rollups_accumulate_across_flushes(engine):
+    recorder = UsageRecorder(engine=engine, flush_interval=60)
+    for latency, cached in ((40, False), (80, True), (900, False)):
+        recorder.record("/api/v1/review-code", "python", latency, cached=cached, quality_score=7.0)
+    await recorder.flush()
+    recorder.record("/api/v1/review-code", "python", 60, quality_score=9.0)
+    recorder.record("/api/v1/generate-code", "go", 30)
+    await recorder.flush()
+
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT COUNT(*) FROM usage_rollup_hourly")).scalar() == 2
+
+    stats = UsageStatsReader(engine).summary(hours=24)
+
+    review = stats["endpoints"]["/api/v1/review-code"]
+    assert review["requests"] == 4
+    assert review["cache_hit_rate"] == 0.25
+    assert review["average_quality_score"] == 7.5
+    assert review["latency_ms"]["mean"] == 270.0
+    assert 50 <= review["latency_ms"]["p50"] <= 100
+    assert stats["languages"]["go"]["average_quality_score"] is None
+    assert stats["totals"]["requests"] == 5
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_is_retried(tmp_path):
+    recorder = UsageRecorder(engine=create_engine(f"sqlite:///{tmp_path / 'missing.db'}"), flush_interval=60)
+    recorder.record("/api/v1/review-code", "python", 10)
+
+    await recorder.flush()
+
+    assert recorder.pending[next(iter(recorder.pending))].requests == 1
+
+
+@pytest.mark.asyncio
+async def test_middleware_records_annotated_requests(engine):
+    recorder = UsageRecorder(engine=engine, flush_interval=60)
+    paths = ["/api/v1/review-code"]
+
+    await _call(UsageStatsMiddleware(ReviewEndpoint(cached=True), recorder=recorder, paths=paths))
+    await _call(UsageStatsMiddleware(ReviewEndpoint(status=422), recorder=recorder, paths=paths))
+    await _call(UsageStatsMiddleware(ReviewEndpoint(), recorder=recorder, paths=paths), path="/api/v1/health")
+
+    (hour, endpoint, language), rollup = next(iter(recorder.pending.items()))
+    assert len(recorder.pending) == 1
+    assert (endpoint, language) == ("/api/v1/review-code", "python")
+    assert (rollup.requests, rollup.cache_hits, rollup.quality_sum) == (1, 1, 8.0)
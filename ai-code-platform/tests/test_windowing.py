@@ -0,0 +1,106 @@
+import ast
+import io
+import json
+import pytest
+from backend.services import code_reviewer
+from backend.services.code_reviewer import CodeReviewerService
+from backend.services.windowing import iter_windows
+
+
+def _python_file(functions=60, methods=200):
+    parts = ["import os\n\n"]
+    for i in range(functions):
+        parts.append(f'@decorator\ndef f{i}(x):\n    """Not a boundary:\n\ndef fake():\n"""\n    return (x +\n1)\n\n')
+    parts.append("class Big:\n" + "".join(f"    @property\n    def m{i}(self):\n        return {i}\n\n" for i in range(methods)))
+    parts.append("x = 1\nif x:\n    pass\nelse:\n    pass\n")
+    return "".join(parts)
+
+
+class FakeStreamingProvider:
+    """Reports one issue on line 1 of whatever code it is given"""
+
+    key = "fake"
+
+    def __init__(self):
+        self.prompts = []
+
+    async def stream(self, system, prompt, temperature=0.2, max_tokens=2000, **options):
+        self.prompts.append(prompt)
+        yield json.dumps({
+            "issues": [{"line_number": 1, "severity": "high", "category": "bug", "title": "AI", "description": "d", "suggestion": "s", "code_snippet": ""}],
+            "suggestions": ["Add tests"]
+        })
+
+
+class TestIterWindows:
+
+    def test_python_windows_parse_on_their_own(self):
+        code = _python_file()
+        lines = code.split("\n")
+
+        windows = list(iter_windows(io.StringIO(code), "python", 1000))
+
+        assert len(windows) > 5
+        assert windows[0].start_line == 1
+        for previous, window in zip(windows, windows[1:]):
+            assert window.start_line == previous.end_line + 1
+        for window in windows:
+            ast.parse(window.text)
+            assert window.text.split("\n")[0].strip() == lines[window.start_line - 1].strip()
+            assert not window.partial
+        # Cuts land on decorators, never between a decorator and its function
+        assert all(lines[w.start_line - 1].lstrip().startswith(("@", "import", "x =")) for w in windows)
+
+    def test_brace_windows_cut_between_declarations(self):
+        code = "".join(f"function f{i}(a) {{\n  if (a) {{\n    return '{{';\n  }}\n  return a;\n}}\n\n" for i in range(100))
+
+        windows = list(iter_windows(code.split("\n"), "javascript", 500))
+
+        assert len(windows) > 1
+        assert all(window.text.startswith("function") for window in windows)
+
+    def test_unbroken_code_is_cut_and_marked_partial(self):
+        code = "x = [\n" + "    1,\n" * 1000 + "]\n"
+
+        windows = list(iter_windows(code.split("\n"), "python", 500))
+
+        assert len(windows) > 1
+        assert all(window.partial for window in windows)
+        assert sum(window.line_count for window in windows) == code.count("\n") + 1
+
+
+class TestLargeFileReview:
+
+    @pytest.fixture
+    def reviewer(self, monkeypatch):
+        monkeypatch.setattr(code_reviewer.settings, "MAX_CODE_SIZE", 2000)
+        monkeypatch.setattr(code_reviewer.settings, "LARGE_FILE_WINDOW_BYTES", 1000)
+        monkeypatch.setattr(code_reviewer.settings, "LARGE_FILE_MAX_AI_WINDOWS", 1)
+        reviewer = CodeReviewerService()
+        reviewer.provider = FakeStreamingProvider()
+        return reviewer
+
+    @pytest.mark.asyncio
+    async def test_findings_use_file_line_numbers(self, reviewer):
+        code = _python_file(functions=60, methods=0) + "def run(cmd):\n    return eval(cmd)\n"
+        eval_line = code.split("\n").index("    return eval(cmd)") + 1
+
+        result = await reviewer.review_code(code, "python")
+
+        security = [issue for issue in result.issues if issue.category.value == "security"]
+        assert [issue.line_number for issue in security] == [eval_line]
+        # Only the window with the security hit is sent to the LLM, and its findings are offset too
+        assert len(reviewer.provider.prompts) == 1
+        assert "eval(cmd)" in reviewer.provider.prompts[0]
+        start, end = result.windows["ai_reviewed"][0]
+        assert start <= eval_line <= end
+        assert [issue.line_number for issue in result.issues if issue.title == "AI"] == [start]
+        assert result.windows["count"] > 1
+
+    @pytest.mark.asyncio
+    async def test_clean_large_file_skips_the_llm(self, reviewer):
+        events = [event async for event in reviewer.stream_review(_python_file(functions=60, methods=0), "python")]
+
+        assert reviewer.provider.prompts == []
+        assert events[0]["windows"]["ai_reviewed"] == []
+        assert events[-1]["event"] == "complete"